@@ -6,6 +6,8 @@ from flask import Flask
 from flask_cors import CORS
 
 from config.settings import config
+from models.base import begin_session, end_session, flush_session
+from models.user import User
 from routes.auth import auth_bp
 from routes.content import content_bp
 from routes.diagnostic import diagnostic_bp
@@ -16,9 +18,10 @@ from routes.session import session_bp
 from routes.fractions_tutor import fractions_tutor_bp
 from routes.learning_tutor import learning_tutor_bp
 from routes.ai_analysis import ai_analysis_bp
+from services.evaluation_cache import evaluation_cache
 
 # Import services to initialize them
-from services import problem_service
+from services import problem_service, progress_service
 
 def create_app(config_name='default'):
     """Application factory pattern."""
@@ -42,12 +45,30 @@ def create_app(config_name='default'):
     app.register_blueprint(learning_tutor_bp)
     app.register_blueprint(ai_analysis_bp)
     
+    # Request-scoped Datastore session: repeated reads are served from memory
+    # and staged writes go out in one batch before the response is sent
+    @app.before_request
+    def open_datastore_session():
+        begin_session()
+    
+    @app.after_request
+    def flush_datastore_session(response):
+        flush_session()
+        return response
+    
+    @app.teardown_request
+    def close_datastore_session(exc):
+        end_session()
+    
     @app.route('/health')
     def health_check():
         """Health check endpoint."""
         return {
             "status": "healthy", 
-            "problems_loaded": len(problem_service.get_practice_problems_dict())
+            "problems_loaded": len(problem_service.get_practice_problems_dict()),
+            "user_cache": User.cache_stats(),
+            "evaluation_cache": evaluation_cache.stats() if evaluation_cache else None,
+            "write_behind": progress_service.write_behind.stats() if progress_service.write_behind else None
         }
     
     return app
@@ -0,0 +1,163 @@
+"""
+Accuracy and latency benchmark for services/answer_equivalence.py.
+
+For every practice problem in problems/p6/*.json, derives student answers
+from the verified answer whose correctness is known: correct ones (the
+verified text, the bare number, the value in other units, as a decimal or
+an unsimplified fraction, terms of an expression reordered, "The answer is
+...") and incorrect ones (off by one, doubled, the reciprocal, a reversed
+ratio, a changed constant), plus explanations, which must be left to the
+model. Reports per topic how many answers check_answer decided, how many it
+got wrong (this must stay 0), and the time per check against the model round
+trips the answers decided correct avoid (answers decided wrong still get the
+examiner's feedback, told the verdict).
+
+Usage:
+    python -m benchmarks.bench_answer_equivalence [--repeat 200] [--model-ms 2500]
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from collections import defaultdict
+from decimal import Decimal
+from fractions import Fraction
+
+from config.settings import Config
+from services.answer_equivalence import UNITS, check_answer, parse_verified_answer
+
+
+def format_number(value: Fraction) -> str:
+    """Write a value as an integer or terminating decimal, or as a fraction."""
+    if value.denominator == 1:
+        return str(value.numerator)
+    denominator = value.denominator
+    for factor in (2, 5):
+        while denominator % factor == 0:
+            denominator //= factor
+    if denominator == 1:
+        return format(Decimal(value.numerator) / Decimal(value.denominator), 'f')
+    return f"{value.numerator}/{value.denominator}"
+
+
+def format_expression(coefficients, reverse=False) -> str:
+    terms = sorted(coefficients.items(), reverse=reverse)
+    text = ''
+    for monomial, coefficient in terms:
+        magnitude = abs(coefficient)
+        written = monomial if magnitude == 1 and monomial else f"{format_number(magnitude)}{monomial}"
+        text += (' - ' if coefficient < 0 else ' + ') + written
+    return text[3:] if text.startswith(' + ') else '-' + text[3:]
+
+
+def answer_variants(verified_answer):
+    """Return (correct, incorrect) answers derived from a verified answer."""
+    accepted = parse_verified_answer(verified_answer)
+    main = accepted[0]
+    written = str(verified_answer).split(' or ')[-1].split('(')[0].strip()
+    correct, incorrect = [written, f"The answer is {written}."], []
+    
+    if main.kind == 'number':
+        values = {quantity.value for quantity in accepted if quantity.kind == 'number'}
+        if main.dimension:
+            correct.append(format_number(main.number))
+            for unit, (dimension, size) in UNITS.items():
+                if dimension == main.dimension and unit != main.unit and unit.isascii() and len(unit) <= 4:
+                    correct.append(f"{format_number(main.value / size)} {unit}")
+        elif main.number.denominator != 1:
+            correct.append(format_number(main.value))
+            correct.append(f"{main.value.numerator * 2}/{main.value.denominator * 2}")
+        unit = f" {main.unit}" if main.dimension else ''
+        for wrong in (main.number + 1, main.number * 2, 1 / main.number if main.number else None):
+            if wrong is not None and wrong * (main.value / main.number if main.number else 1) not in values:
+                incorrect.append(f"{format_number(wrong)}{unit}")
+    elif main.kind == 'ratio':
+        correct.append(' : '.join(format_number(term) for term in main.value))
+        if len(set(main.value)) > 1:
+            incorrect.append(':'.join(format_number(term) for term in reversed(main.value)))
+        incorrect.append(':'.join(format_number(term + 1) for term in main.value))
+    elif main.kind == 'clock':
+        hour, minute = divmod(main.value, 60)
+        correct.append(f"{(hour - 1) % 12 + 1}:{minute:02d}")
+        incorrect.append(f"{(hour - 1) % 12 + 1}:{(minute + 5) % 60:02d} {'pm' if hour >= 12 else 'am'}")
+    elif main.kind == 'expression':
+        correct.append(format_expression(main.value, reverse=True))
+        constant = main.value.get('', Fraction(0))
+        incorrect.append(format_expression({**main.value, '': constant + 1}))
+        incorrect.append(format_expression({monomial: coefficient * 2 for monomial, coefficient in main.value.items()}))
+    return correct, incorrect
+
+
+def load_problems(pattern):
+    """Practice problems (entries with a verified_answer) of every topic file."""
+    problems = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, encoding='utf-8') as problem_file:
+            data = json.load(problem_file)
+        if isinstance(data, list):
+            problems.extend(problem for problem in data if isinstance(problem, dict) and 'verified_answer' in problem)
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--problems', default=os.path.join(Config.PROBLEMS_BASE_DIR, 'p6', '*.json'),
+                        help='glob of problem files')
+    parser.add_argument('--repeat', type=int, default=200, help='timed passes over every answer')
+    parser.add_argument('--model-ms', type=float, default=2500.0,
+                        help='round trip of one model call the local verdict replaces')
+    args = parser.parse_args()
+    
+    problems = load_problems(args.problems)
+    counts = defaultdict(lambda: defaultdict(int))
+    cases = []
+    for problem in problems:
+        topic = problem.get('topic', '?')
+        text = problem.get('problem_text', '')
+        verified = problem['verified_answer']
+        if not parse_verified_answer(verified):
+            counts[topic]['unparsed'] += 1
+            continue
+        correct, incorrect = answer_variants(verified)
+        explanations = [f"I multiplied first and then got {correct[0]}, is that right?"]
+        for expected, answers in ((True, correct), (False, incorrect), (None, explanations)):
+            for answer in answers:
+                verdict = check_answer(answer, verified, text)
+                cases.append((answer, verified, text))
+                counts[topic]['answers'] += 1
+                if verdict is None:
+                    counts[topic]['undecided'] += 1
+                elif expected is None or verdict != expected:
+                    counts[topic]['wrong'] += 1
+                    print(f"  WRONG {problem.get('id')}: {answer!r} vs {verified!r} -> {verdict}")
+                else:
+                    counts[topic]['decided'] += 1
+                    counts[topic]['decided_correct'] += verdict
+    
+    print(f"{len(problems)} problems, {len(cases)} answers")
+    print(f"{'topic':<14} {'answers':>7} {'decided':>8} {'undecided':>9} {'wrong':>6} {'unparsed':>8}")
+    totals = defaultdict(int)
+    for topic in sorted(counts):
+        row = counts[topic]
+        for key, value in row.items():
+            totals[key] += value
+        print(f"{topic:<14} {row['answers']:>7} {row['decided']:>8} {row['undecided']:>9} "
+              f"{row['wrong']:>6} {row['unparsed']:>8}")
+    print(f"{'total':<14} {totals['answers']:>7} {totals['decided']:>8} {totals['undecided']:>9} "
+          f"{totals['wrong']:>6} {totals['unparsed']:>8}")
+    
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for case in cases:
+            check_answer(*case)
+    per_check = (time.perf_counter() - started) / (args.repeat * len(cases))
+    decided_rate = totals['decided'] / totals['answers'] if totals['answers'] else 0.0
+    correct_rate = totals['decided_correct'] / totals['answers'] if totals['answers'] else 0.0
+    print(f"check_answer: {per_check * 1e6:.1f}us per answer; {decided_rate:.0%} decided locally; "
+          f"the {correct_rate:.0%} decided correct each skip 2 model calls (~{2 * args.model_ms:.0f}ms)")
+    assert totals['wrong'] == 0, "check_answer gave a wrong verdict"
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Micro-benchmark for hydrating models from Datastore entities.
+
+Builds ProblemProgress and ChatHistory entities in memory and measures how
+many models per second BaseModel._from_entity produces and how many bytes
+each hydrated model keeps alive. "before" hydrates through the generic
+kwargs constructor (models without a declared field schema, as these two
+were), "after" through the slotted models and their generated constructor.
+
+Usage:
+    python -m benchmarks.bench_model_hydration [--objects 20000] [--repeat 5]
+"""
+import argparse
+import datetime
+import gc
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from google.cloud import datastore
+
+from models.base import BaseModel
+from models.chat_history import ChatHistory
+from models.problem_progress import ProblemProgress
+
+
+class LegacyProblemProgress(BaseModel):
+    """ProblemProgress as it was before the field schema: kwargs loop plus reassignment."""
+    
+    _kind = 'ProblemProgress'
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.user_id: int = kwargs.get('user_id')
+        self.problem_id: str = kwargs.get('problem_id')
+        self.status: str = kwargs.get('status')
+        self.attempts: int = kwargs.get('attempts', 0)
+        self.last_attempt_at: Optional[datetime.datetime] = kwargs.get('last_attempt_at')
+    
+    @classmethod
+    def _get_required_fields(cls) -> List[str]:
+        return ['user_id', 'problem_id', 'status']
+    
+    @classmethod
+    def _get_excluded_indexes(cls) -> List[str]:
+        return []
+
+
+class LegacyChatHistory(BaseModel):
+    """ChatHistory head as it was before the field schema."""
+    
+    _kind = 'ChatHistory'
+    
+    def __init__(self, **kwargs):
+        self._messages = None
+        self._rewrite = False
+        self._chunks: Dict = {}
+        self._dirty_chunks = set()
+        super().__init__(**kwargs)
+        self.user_id: int = kwargs.get('user_id')
+        self.problem_id: str = kwargs.get('problem_id')
+        self.message_count: int = kwargs.get('message_count', 0)
+        self.chunk_count: int = kwargs.get('chunk_count', 0)
+        self.last_message_at: Optional[datetime.datetime] = kwargs.get('last_message_at')
+        self._stored_chunk_count = self.chunk_count
+    
+    @classmethod
+    def _get_required_fields(cls) -> List[str]:
+        return ['user_id', 'problem_id']
+    
+    @classmethod
+    def _get_excluded_indexes(cls) -> List[str]:
+        return []
+
+
+def progress_entities(count: int) -> List[datastore.Entity]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    entities = []
+    for index in range(count):
+        entity = datastore.Entity(key=datastore.Key('ProblemProgress', f"1-problem_{index}", project='benchmark'))
+        entity.update({'user_id': 1, 'problem_id': f"problem_{index}", 'status': 'in_progress',
+                       'attempts': index % 7, 'last_attempt_at': now, 'created_at': now, 'updated_at': now})
+        entities.append(entity)
+    return entities
+
+
+def chat_entities(count: int) -> List[datastore.Entity]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    entities = []
+    for index in range(count):
+        entity = datastore.Entity(key=datastore.Key('ChatHistory', f"1-problem_{index}", project='benchmark'))
+        entity.update({'user_id': 1, 'problem_id': f"problem_{index}", 'message_count': 42, 'chunk_count': 3,
+                       'last_message_at': now, 'created_at': now, 'updated_at': now})
+        entities.append(entity)
+    return entities
+
+
+def objects_per_second(model_cls, entities, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for entity in entities:
+            model_cls._from_entity(entity)
+        best = min(best, time.perf_counter() - started)
+    return len(entities) / best
+
+
+def bytes_per_object(model_cls, entities) -> float:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    models = [model_cls._from_entity(entity) for entity in entities]
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del models
+    return retained / len(entities)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--objects', type=int, default=20000, help='entities hydrated per run')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case (best is reported)')
+    args = parser.parse_args()
+    
+    cases = [
+        ('ProblemProgress', progress_entities(args.objects), LegacyProblemProgress, ProblemProgress),
+        ('ChatHistory', chat_entities(args.objects), LegacyChatHistory, ChatHistory),
+    ]
+    print(f"Hydrating {args.objects} entities per run, best of {args.repeat}")
+    for name, entities, before_cls, after_cls in cases:
+        for label, model_cls in (('before', before_cls), ('after', after_cls)):
+            rate = objects_per_second(model_cls, entities, args.repeat)
+            size = bytes_per_object(model_cls, entities)
+            print(f"{name:<16} {label:<7} {rate:>12,.0f} objects/s  {size:>7,.0f} bytes/object")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
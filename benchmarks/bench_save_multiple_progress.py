@@ -0,0 +1,127 @@
+"""
+Benchmark for ProgressService.save_multiple_progress.
+
+Replays a learning-tutor chat turn (messages + section completion + next
+section + tutor session status) against the in-memory storage backend
+configured with a fixed latency per RPC, and compares the previous sequential
+implementation with the batched transactional one.
+
+Usage:
+    python -m benchmarks.bench_save_multiple_progress [--turns 50] [--rpc-ms 8]
+"""
+import argparse
+import datetime
+import time
+
+from google.cloud import datastore
+
+from models.base import get_datastore_client, set_storage_backend
+from models.chat_history import ChatHistory, normalize_message
+from models.storage import MemoryBackend
+from services.progress_service import ProgressService
+
+
+def legacy_save_multiple_progress(save_operations):
+    """
+    The previous implementation: one read-modify-write per operation.
+    
+    Written against the storage client with plain, unversioned get and put
+    calls and the previous entity layout (the whole history in one ChatHistory
+    entity), so the current models' transactions and chunks don't leak into
+    the baseline.
+    """
+    client = get_datastore_client()
+    for operation in save_operations:
+        user_id = operation['user_id']
+        problem_id = operation['problem_id']
+        chat_history = operation.get('chat_history', [])
+        key_name = f"{user_id}-{problem_id}"
+        now = datetime.datetime.now(datetime.timezone.utc)
+        
+        # ProblemProgress.create_or_update_progress: get, then put
+        progress_key = client.key('ProblemProgress', key_name)
+        progress = client.get(progress_key)
+        if progress is None:
+            progress = datastore.Entity(key=progress_key)
+            progress.update({'user_id': user_id, 'problem_id': problem_id, 'attempts': 0, 'created_at': now})
+        progress.update({'status': operation['status'], 'attempts': progress['attempts'] + 1,
+                         'last_attempt_at': now, 'updated_at': now})
+        client.put(progress)
+        
+        if chat_history:
+            history_key = client.key('ChatHistory', key_name)
+            existing_chat = client.get(history_key)
+            combined_history = (existing_chat['history'] if existing_chat else []) + chat_history
+            
+            # create_or_update_history used to read the entity again before the put
+            chat = client.get(history_key)
+            if chat is None:
+                chat = datastore.Entity(key=history_key)
+                chat.update({'user_id': user_id, 'problem_id': problem_id, 'created_at': now})
+            chat.update({'history': combined_history, 'message_count': len(combined_history),
+                         'last_message_at': now, 'updated_at': now})
+            client.put(chat)
+
+
+def chat_turn_operations(user_id, turn):
+    """Save operations produced by one completed learning-tutor chat turn."""
+    section_id = f"p6_math_fractions_step1_{turn:03d}"
+    next_section_id = f"p6_math_fractions_step1_{turn + 1:03d}"
+    messages = [
+        {'sender': 'student', 'message': '1/2', 'section_id': section_id},
+        {'sender': 'tutor', 'message': 'Well done!', 'section_id': next_section_id},
+    ]
+    return [
+        {'user_id': user_id, 'problem_id': section_id, 'status': 'completed', 'chat_history': messages},
+        {'user_id': user_id, 'problem_id': section_id, 'status': 'completed', 'chat_history': []},
+        {'user_id': user_id, 'problem_id': next_section_id, 'status': 'in_progress', 'chat_history': []},
+        {'user_id': user_id, 'problem_id': 'fractions_tutor_session', 'status': 'in_progress', 'chat_history': []},
+    ]
+
+
+def run(label, save, turns, rpc_latency):
+    client = MemoryBackend(latency_ms=rpc_latency * 1000)
+    set_storage_backend(client)
+    
+    latencies = []
+    for turn in range(1, turns + 1):
+        operations = chat_turn_operations(user_id=1, turn=turn)
+        started = time.perf_counter()
+        save(operations)
+        latencies.append(time.perf_counter() - started)
+    
+    latencies.sort()
+    total_rpcs = sum(client.rpcs.values())
+    print(f"{label:<12} rpcs/turn={total_rpcs / turns:5.1f}  "
+          f"p50={latencies[len(latencies) // 2] * 1000:7.1f}ms  "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f}ms  "
+          f"breakdown={dict(client.rpcs)}")
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=50, help='chat turns to replay')
+    parser.add_argument('--rpc-ms', type=float, default=8.0, help='simulated latency per Datastore RPC')
+    args = parser.parse_args()
+    
+    rpc_latency = args.rpc_ms / 1000
+    print(f"Replaying {args.turns} chat turns with {args.rpc_ms}ms per RPC")
+    legacy = run('before', legacy_save_multiple_progress, args.turns, rpc_latency)
+    batched = run('after', ProgressService().save_multiple_progress, args.turns, rpc_latency)
+    
+    # Both paths must leave identical progress and messages behind (the batched backend is still installed)
+    def progress_rows(client):
+        return {entity.key.flat_path[-1]: (entity['status'], entity['attempts'])
+                for entity in client.entities.values() if entity.key.kind == 'ProblemProgress'}
+    
+    assert progress_rows(legacy) == progress_rows(batched), "batched save diverged from the sequential implementation"
+    for entity in legacy.entities.values():
+        if entity.key.kind == 'ChatHistory':
+            saved = ChatHistory.get_chat_history(entity['user_id'], entity['problem_id'])
+            assert saved.history == [normalize_message(message) for message in entity['history']], \
+                "batched save diverged from the sequential implementation"
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Latency benchmark for TutorService.evaluate_answer.
+
+Replays practice-mode answers that the local answer check leaves to the
+model (explanations) against the fake model backend with a fixed latency
+per call. It compares misconception prediction run before the examiner
+("sequential", the previous pipeline) with prediction run alongside it
+("parallel"), for answers the examiner judges incorrect and correct, and
+how soon the streamed variant (submit_answer/stream) shows the first piece
+of feedback.
+
+Usage:
+    python -m benchmarks.bench_tutor_latency [--answers 20] [--model-ms 300] [--first-token-ms 60]
+"""
+import argparse
+import json
+import time
+
+from services.llm_gateway import FakeLLMBackend, llm_gateway
+from services.tutor_service import TutorService
+
+PROBLEM = {
+    'id': 'FRAC-S1-E1',
+    'problem_text': 'Calculate the value of 1/5 ÷ 4.',
+    'verified_answer': '1/20',
+    'verified_methodology': ['Step 1: Multiply 1/5 by the reciprocal of 4, 1/4.'],
+    'solution_hints': ['What is the reciprocal of 4?'],
+}
+
+MISCONCEPTION_RESPONSE = json.dumps({
+    'misconceptions_detected': ['Multiplied by the divisor instead of its reciprocal'],
+    'risk_level': 'medium',
+    'preventive_guidance': 'Contrast dividing by 4 with multiplying by 4.',
+    'intervention_needed': True,
+    'student_tip': 'Remember that dividing by 4 makes a number smaller.',
+})
+
+
+def examiner_response(is_correct):
+    return json.dumps({'is_final_answer_correct': is_correct,
+                       'feedback': {'encouragement': 'Good thinking.',
+                                    'socratic_question': '' if is_correct else 'What is the reciprocal of 4?'}})
+
+
+def run(label, mode, is_correct, answers, model_ms, first_token_ms=0.0, stream=False):
+    backend = FakeLLMBackend(latency_ms=model_ms, first_token_ms=first_token_ms, responses={
+        'tutor.evaluate_answer': examiner_response(is_correct),
+        'tutor.predict_misconceptions': MISCONCEPTION_RESPONSE,
+    })
+    llm_gateway.set_backend(backend)
+    service = TutorService(misconception_mode=mode, misconception_wait=model_ms / 1000 * 2)
+    
+    latencies, first_deltas = [], []
+    for index in range(answers):
+        chat_history = [{'role': 'user', 'parts': [f"I did 1/5 times 4 and got 4/5, attempt {index}"]}]
+        started = time.perf_counter()
+        seen = []
+        
+        def on_delta(text, field=None):
+            if not seen:
+                seen.append(time.perf_counter() - started)
+        
+        result = service.evaluate_answer(PROBLEM, chat_history, on_delta=on_delta if stream else None)
+        latencies.append(time.perf_counter() - started)
+        first_deltas.extend(seen)
+        assert result['is_correct'] == is_correct
+    
+    latencies.sort()
+    first_deltas.sort()
+    first_delta = f"first delta p50={first_deltas[len(first_deltas) // 2] * 1000:7.1f}ms  " if first_deltas else ''
+    print(f"{label:<22} p50={latencies[len(latencies) // 2] * 1000:7.1f}ms  "
+          f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f}ms  {first_delta}calls={dict(backend.calls)}  "
+          f"encouragement={result['feedback']['encouragement']!r}")
+    return latencies[len(latencies) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', type=int, default=20, help='answers to evaluate per configuration')
+    parser.add_argument('--model-ms', type=float, default=300.0, help='simulated latency per model call')
+    parser.add_argument('--first-token-ms', type=float, default=60.0,
+                        help='simulated time to the first streamed piece of a model call')
+    args = parser.parse_args()
+    
+    print(f"Evaluating {args.answers} answers per configuration with {args.model_ms}ms per model call")
+    try:
+        for is_correct in (False, True):
+            verdict = 'correct' if is_correct else 'incorrect'
+            before = run(f"sequential/{verdict}", 'sequential', is_correct, args.answers, args.model_ms)
+            after = run(f"parallel/{verdict}", 'parallel', is_correct, args.answers, args.model_ms)
+            print(f"{'':<22} p50 {after / before:.0%} of sequential")
+        run('parallel/stream', 'parallel', False, args.answers, args.model_ms, args.first_token_ms, stream=True)
+    finally:
+        llm_gateway.set_backend(None)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
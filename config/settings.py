@@ -2,6 +2,7 @@
 Configuration settings for the AI Tutor application.
 """
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,6 +17,84 @@ class Config:
     # Google Cloud settings
     GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
     
+    # Generative model calls (services/llm_gateway.py): "gemini" or "fake" (deterministic, for tests and load runs)
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+    LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+    # Deadline of routes without their own in ROUTE_DEADLINES, and attempts per call
+    LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "20"))
+    LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+    # Calls in flight per process and per route; calls wait this long for a slot before being shed
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    LLM_ROUTE_MAX_CONCURRENCY = int(os.getenv("LLM_ROUTE_MAX_CONCURRENCY", "8"))
+    LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "2"))
+    # Simulated latency and random failure rate of the fake backend
+    LLM_FAKE_LATENCY_MS = float(os.getenv("LLM_FAKE_LATENCY_MS", "0"))
+    LLM_FAKE_FAILURE_RATE = float(os.getenv("LLM_FAKE_FAILURE_RATE", "0"))
+    # Time to the first streamed word of the fake backend (0: the whole latency)
+    LLM_FAKE_FIRST_TOKEN_MS = float(os.getenv("LLM_FAKE_FIRST_TOKEN_MS", "0"))
+    
+    # Practice-mode misconception prediction (services/tutor_service.py): "parallel" (alongside the
+    # examiner, merged afterwards), "sequential" (its findings go into the examiner prompt) or "off"
+    TUTOR_MISCONCEPTION_MODE = os.getenv("TUTOR_MISCONCEPTION_MODE", "parallel")
+    # Don't wait for the prediction once the examiner finds the answer correct
+    TUTOR_SKIP_MISCONCEPTIONS_IF_CORRECT = os.getenv("TUTOR_SKIP_MISCONCEPTIONS_IF_CORRECT", "true").lower() == "true"
+    # How long an incorrect verdict waits for a prediction still running, and threads running predictions
+    TUTOR_MISCONCEPTION_WAIT_SECONDS = float(os.getenv("TUTOR_MISCONCEPTION_WAIT_SECONDS", "2"))
+    TUTOR_MISCONCEPTION_WORKERS = int(os.getenv("TUTOR_MISCONCEPTION_WORKERS", "8"))
+    
+    # Streamed (server-sent events) tutor responses (services/streaming.py): threads generating them,
+    # and seconds between keep-alive comments while the model is quiet
+    STREAM_WORKERS = int(os.getenv("STREAM_WORKERS", "16"))
+    STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "10"))
+    
+    # Storage backend: "datastore" (Cloud Datastore), "memory" or "sqlite"
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "datastore")
+    SQLITE_PATH = os.getenv("SQLITE_PATH", "ai_tutor.sqlite3")
+    # Simulated per-RPC latency and random failure rate of the memory backend
+    MEMORY_BACKEND_LATENCY_MS = float(os.getenv("MEMORY_BACKEND_LATENCY_MS", "0"))
+    MEMORY_BACKEND_FAILURE_RATE = float(os.getenv("MEMORY_BACKEND_FAILURE_RATE", "0"))
+    
+    # Read-through entity cache (User): entries per process and lifetime in seconds
+    MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "1024"))
+    MODEL_CACHE_TTL_SECONDS = float(os.getenv("MODEL_CACHE_TTL_SECONDS", "300"))
+    # Shared cache that keeps worker caches coherent: "" (none), "local" (in-process stand-in, tests),
+    # "sqlite" (SHARED_CACHE_PATH; the workers of one host) or "redis" (SHARED_CACHE_URL; across hosts).
+    # Without one, other workers serve a stale User for up to MODEL_CACHE_TTL_SECONDS: with several
+    # workers or instances, keep that TTL small or set MODEL_CACHE_SIZE=0 to disable the cache
+    SHARED_CACHE = os.getenv("SHARED_CACHE", "")
+    SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH",
+                                  os.path.join(tempfile.gettempdir(), "ai_tutor_shared_cache.sqlite3"))
+    SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")
+    
+    # Learning-tutor answer evaluations (services/evaluation_cache.py): in-process entries, and the
+    # persistent tier: "sqlite" (EVALUATION_CACHE_PATH), "shared" (SHARED_CACHE) or "" (none). A verdict
+    # is cached once EVALUATION_CACHE_CONFIRMATIONS model calls in a row agree on it; purges reach
+    # other workers within EVALUATION_CACHE_MEMORY_TTL_SECONDS
+    EVALUATION_CACHE_ENABLED = os.getenv("EVALUATION_CACHE_ENABLED", "true").lower() == "true"
+    EVALUATION_CACHE_SIZE = int(os.getenv("EVALUATION_CACHE_SIZE", "10000"))
+    EVALUATION_CACHE_STORE = os.getenv("EVALUATION_CACHE_STORE", "sqlite")
+    EVALUATION_CACHE_PATH = os.getenv("EVALUATION_CACHE_PATH",
+                                      os.path.join(tempfile.gettempdir(), "ai_tutor_evaluations.sqlite3"))
+    EVALUATION_CACHE_TTL_SECONDS = float(os.getenv("EVALUATION_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    EVALUATION_CACHE_MEMORY_TTL_SECONDS = float(os.getenv("EVALUATION_CACHE_MEMORY_TTL_SECONDS", "300"))
+    EVALUATION_CACHE_CONFIRMATIONS = int(os.getenv("EVALUATION_CACHE_CONFIRMATIONS", "2"))
+    
+    # Write-behind queue for chat-turn progress saves (services/write_behind.py). Queued updates are
+    # only visible to the process that queued them: enable it only where every request of a user
+    # reaches one process (not for app.yaml's multi-worker gunicorn service)
+    WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+    WRITE_BEHIND_WORKERS = int(os.getenv("WRITE_BEHIND_WORKERS", "2"))
+    WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "1000"))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "25"))
+    WRITE_BEHIND_LINGER_MS = float(os.getenv("WRITE_BEHIND_LINGER_MS", "50"))
+    WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "3"))
+    # Journal of queued writes, replayed after a crash; must be on disk that outlives the process
+    # ("" disables it, so queued writes are lost with the process)
+    WRITE_BEHIND_JOURNAL_DIR = os.getenv("WRITE_BEHIND_JOURNAL_DIR", "")
+    # NDJSON file of writes given up on after WRITE_BEHIND_MAX_RETRIES ("": dead-letters.ndjson in
+    # the journal directory, or only kept in memory without a journal)
+    WRITE_BEHIND_DEAD_LETTER_PATH = os.getenv("WRITE_BEHIND_DEAD_LETTER_PATH", "")
+    
     # Curriculum configuration
     SUPPORTED_GRADES = ["p6"]
     SUPPORTED_SUBJECTS = ["math"]
@@ -2,12 +2,17 @@
 
 from .base import BaseModel
 from .user import User
+from .user_email_index import UserEmailIndex
 from .problem_progress import ProblemProgress
-from .chat_history import ChatHistory
+from .chat_history import ChatHistory, ChatHistoryChunk
+from .user_progress_summary import UserProgressSummary
 
 __all__ = [
     'BaseModel',
     'User',
+    'UserEmailIndex',
     'ProblemProgress', 
-    'ChatHistory'
+    'ChatHistory',
+    'ChatHistoryChunk',
+    'UserProgressSummary'
 ]
\ No newline at end of file
@@ -1,42 +1,567 @@
 """
 Base model class for data access layer.
 """
+import contextvars
+import copy
 import datetime
+import random
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Type, TypeVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, TypeVar
+from google.api_core import exceptions as api_exceptions
 from google.cloud import datastore
+from .cache import ModelCache, clear_model_caches
+from .codec import decode_value, encode_value, is_encoded
+from .storage import StorageBackend, create_backend
 
 # Type variable for generic model operations
 ModelType = TypeVar('ModelType', bound='BaseModel')
 
-# Shared Datastore client for performance
+# Shared storage backend (Datastore client by default) for performance
 _datastore_client = None
 
-def get_datastore_client():
-    """Get shared Datastore client instance."""
+# Maximum number of entities Datastore accepts in a single commit
+MAX_BATCH_SIZE = 500
+
+# Attempts made by run_in_transaction before giving up on contention
+TRANSACTION_ATTEMPTS = 3
+
+# Attempts made to write versioned models that concurrent writers keep changing
+CONFLICT_ATTEMPTS = 5
+
+# Upper bound of the random wait before the first retry after contention; doubles per retry
+RETRY_BACKOFF_SECONDS = 0.01
+
+# Default number of entities fetched per page by BaseModel.iter_query
+DEFAULT_PAGE_SIZE = 100
+
+# Marks current state the caller doesn't know and upsert_models must read
+UNKNOWN = object()
+
+# Property holding the stored format version of versioned models (see models/migrations.py)
+SCHEMA_VERSION_FIELD = 'schema_version'
+
+# Property holding the write counter of models with optimistic concurrency (_versioned)
+VERSION_FIELD = 'version'
+
+
+class ConcurrentUpdateError(Exception):
+    """Versioned entities were written by someone else since they were loaded."""
+    
+    def __init__(self, conflicts: List[Tuple['BaseModel', Optional[datastore.Entity]]]):
+        # (model, entity as now stored or None if deleted) for each stale model
+        self.conflicts = conflicts
+        names = ', '.join(f"{model._kind}:{model.id}" for model, _ in conflicts)
+        super().__init__(f"Concurrent update of {names}")
+
+
+def _wait_before_retry(attempt: int) -> None:
+    """Sleep a random (full jitter) exponentially growing time so contending writers spread out."""
+    time.sleep(random.uniform(0, RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)))
+
+
+def get_datastore_client() -> StorageBackend:
+    """Get the shared storage backend selected by STORAGE_BACKEND in config/settings.py."""
     global _datastore_client
     if _datastore_client is None:
-        _datastore_client = datastore.Client()
+        _datastore_client = create_backend()
     return _datastore_client
 
 
+def set_storage_backend(backend: Optional[StorageBackend]) -> None:
+    """Replace the shared storage backend (None goes back to the configured one)."""
+    global _datastore_client
+    _datastore_client = backend
+    # Cached entities came from the previous backend
+    clear_model_caches()
+
+
+def next_page_cursor(iterator) -> Optional[str]:
+    """
+    Return the cursor of the page after a query iterator's last one, or None at the end.
+    
+    Only the iterator decides: Datastore sets next_page_token to None once
+    more_results is NO_MORE_RESULTS, while a batch shorter than the limit can
+    still be followed by more (NOT_FINISHED).
+    """
+    cursor = iterator.next_page_token
+    if not cursor:
+        return None
+    return cursor.decode('ascii') if isinstance(cursor, bytes) else cursor
+
+
+class Session:
+    """
+    Request-scoped identity map and unit of work.
+    
+    While a session is active, every entity loaded through BaseModel is
+    remembered by key so repeated lookups in the same request are served from
+    memory. Saves of entities that already have a key are staged and written
+    together in one put_multi when the session is flushed.
+    """
+    
+    def __init__(self):
+        self._identity_map: Dict[Tuple, Optional['BaseModel']] = {}
+        self._dirty: Dict[Tuple, 'BaseModel'] = {}
+        self._query_cache: Dict[Tuple, List[Tuple]] = {}
+    
+    def lookup(self, identity: Tuple) -> Tuple[bool, Optional['BaseModel']]:
+        """Return (found, model); a found None means the key is known to be missing."""
+        if identity in self._identity_map:
+            return True, self._identity_map[identity]
+        return False, None
+    
+    def register(self, identity: Tuple, model: Optional['BaseModel']) -> Optional['BaseModel']:
+        """Remember a loaded model (or a known-missing key) and return the tracked instance."""
+        existing = self._identity_map.get(identity)
+        if existing is not None and model is not None:
+            # Keep the instance callers already hold so staged changes are not lost
+            return existing
+        self._identity_map[identity] = model
+        return model
+    
+    def refresh(self, identity: Tuple, model: 'BaseModel') -> None:
+        """Replace the tracked instance with one that was just written."""
+        self._identity_map[identity] = model
+        self._dirty.pop(identity, None)
+        self.invalidate_queries(identity[0])
+    
+    def add(self, model: 'BaseModel') -> None:
+        """Stage a model to be written on the next flush."""
+        identity = model._key_identity()
+        self._identity_map[identity] = model
+        self._dirty[identity] = model
+        self.invalidate_queries(model._kind)
+    
+    def discard(self, identity: Tuple) -> None:
+        """Forget a model, e.g. after it has been deleted."""
+        self._dirty.pop(identity, None)
+        self._identity_map[identity] = None
+        self.invalidate_queries(identity[0])
+    
+    def get_cached_query(self, signature: Tuple) -> Optional[List['BaseModel']]:
+        """Return cached query results, resolved through the identity map."""
+        identities = self._query_cache.get(signature)
+        if identities is None:
+            return None
+        return [self._identity_map[identity] for identity in identities
+                if self._identity_map.get(identity) is not None]
+    
+    def cache_query(self, signature: Tuple, models: List['BaseModel']) -> None:
+        """Remember which entities a query returned."""
+        self._query_cache[signature] = [model._key_identity() for model in models]
+    
+    def invalidate_queries(self, kind: str) -> None:
+        """Drop cached query results for a kind after one of its entities changes."""
+        for signature in [s for s in self._query_cache if s[0] == kind]:
+            del self._query_cache[signature]
+    
+    def has_pending(self, kind: str) -> bool:
+        """Check whether entities of a kind are waiting to be flushed."""
+        return any(identity[0] == kind for identity in self._dirty)
+    
+    def flush(self, kind: str = None) -> None:
+        """Write staged entities (optionally only one kind) in put_multi batches."""
+        pending = [(identity, model) for identity, model in self._dirty.items()
+                   if kind is None or identity[0] == kind]
+        if not pending:
+            return
+        
+        _write_models([model for _, model in pending])
+        
+        for identity, _ in pending:
+            del self._dirty[identity]
+
+
+def _write_models(models: List['BaseModel'], rebase: bool = True) -> None:
+    """
+    Write models (and the child models they carry) with put_multi batches.
+    
+    Versioned models are written with compare-and-swap: in the same
+    transaction as the write, the stored version of each one is checked
+    against the version it was loaded with. When another writer got there
+    first, each stale model re-applies its changes on top of the stored
+    entity (see BaseModel._rebase) and the write is retried, up to
+    CONFLICT_ATTEMPTS times. With rebase=False ConcurrentUpdateError is
+    raised instead, for callers that redo the whole update themselves.
+    """
+    client = get_datastore_client()
+    
+    for attempt in range(1, CONFLICT_ATTEMPTS + 1):
+        # Models unchanged since they were loaded or last written are skipped;
+        # each model is kept in one group with the children it carries
+        groups = [[written for written in model._models_to_write() if written._has_changes()] for model in models]
+        groups = [group for group in groups if group]
+        to_write = [model for group in groups for model in group]
+        if not to_write:
+            return
+        
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for model in to_write:
+            model._validate_required_fields()
+            if not model.created_at:
+                model.created_at = now
+            model.updated_at = now
+        
+        entities = {id(model): model._to_entity(client) for model in to_write}
+        try:
+            _put_groups(client, [[(model, entities[id(model)]) for model in group] for group in groups])
+            break
+        except ConcurrentUpdateError as error:
+            if not rebase or attempt == CONFLICT_ATTEMPTS:
+                raise
+            for model, entity in error.conflicts:
+                model._rebase(model._from_entity(entity) if entity is not None else None)
+            _wait_before_retry(attempt)
+        except (api_exceptions.Aborted, api_exceptions.Conflict):
+            # Another transaction committed first; the versions are compared again
+            if attempt == CONFLICT_ATTEMPTS or client.current_transaction is not None:
+                raise
+            _wait_before_retry(attempt)
+    
+    for model in to_write:
+        entity = entities[id(model)]
+        # Pick up IDs Datastore allocated for new entities
+        if not model.id and not entity.key.is_partial:
+            model.id = entity.key.id
+        if model._versioned:
+            model._version = entity[VERSION_FIELD]
+        model._invalidate_cache()
+        model._mark_clean()
+        model._after_write()
+
+
+def _put_groups(client, groups: List[List[Tuple['BaseModel', datastore.Entity]]]) -> None:
+    """Write groups of (model, entity) in batches, comparing and bumping the versions of versioned models."""
+    batches = [[]]
+    for group in groups:
+        if batches[-1] and len(batches[-1]) + len(group) > MAX_BATCH_SIZE:
+            batches.append([])
+        batches[-1].extend(group)
+    
+    for batch in batches:
+        versioned = [(model, entity) for model, entity in batch if model._versioned]
+        if not versioned:
+            client.put_multi([entity for _, entity in batch])
+        elif client.current_transaction is not None:
+            _compare_and_put(client, versioned, batch)
+        else:
+            with client.transaction():
+                _compare_and_put(client, versioned, batch)
+
+
+def _compare_and_put(client, versioned: List[Tuple['BaseModel', datastore.Entity]],
+                     batch: List[Tuple['BaseModel', datastore.Entity]]) -> None:
+    """Inside a transaction, check the stored versions of versioned models and write the batch."""
+    # Versions read earlier in this transaction are still current at commit; only look up the rest
+    reads = _transaction_reads.get() or {}
+    unchecked = [(model, entity) for model, entity in versioned
+                 if entity.key.is_partial or reads.get(entity.key.flat_path, UNKNOWN) != model._version]
+    keys = [entity.key for _, entity in unchecked if not entity.key.is_partial]
+    stored = {entity.key.flat_path: entity for entity in client.get_multi(keys)} if keys else {}
+    conflicts = []
+    for model, entity in unchecked:
+        current = stored.get(entity.key.flat_path)
+        # Models never loaded (version None) expect no stored entity; legacy entities count as version 0
+        current_version = (current.get(VERSION_FIELD) or 0) if current is not None else None
+        if current_version != model._version:
+            conflicts.append((model, current))
+    for model, entity in versioned:
+        entity[VERSION_FIELD] = (model._version or 0) + 1
+    if conflicts:
+        raise ConcurrentUpdateError(conflicts)
+    client.put_multi([entity for _, entity in batch])
+
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar('datastore_session', default=None)
+# Stored versions (None for missing entities) by key path, read inside the running run_in_transaction
+_transaction_reads: contextvars.ContextVar = contextvars.ContextVar('transaction_reads', default=None)
+
+
+def get_current_session() -> Optional[Session]:
+    """Get the session bound to the current request, if any."""
+    return _current_session.get()
+
+
+def begin_session() -> Session:
+    """Start a new session for the current request."""
+    session = Session()
+    _current_session.set(session)
+    return session
+
+
+def flush_session() -> None:
+    """Write all staged changes of the current session."""
+    session = _current_session.get()
+    if session is not None:
+        session.flush()
+
+
+def end_session() -> None:
+    """Detach the current session; unflushed changes are discarded."""
+    _current_session.set(None)
+
+
+def run_in_transaction(callback: Callable[[], Any], attempts: int = TRANSACTION_ATTEMPTS) -> Any:
+    """
+    Run callback inside a Datastore transaction, retrying on contention.
+    
+    Reads made through get_multi_models inside the callback are transactional
+    and writes made through put_multi_models are committed atomically.
+    """
+    client = get_datastore_client()
+    for attempt in range(1, attempts + 1):
+        reads = _transaction_reads.set({})
+        try:
+            with client.transaction():
+                return callback()
+        except (api_exceptions.Aborted, api_exceptions.Conflict):
+            if attempt == attempts:
+                raise
+            _wait_before_retry(attempt)
+        finally:
+            _transaction_reads.reset(reads)
+
+
+def get_multi_models(model_keys: List[Tuple]) -> List[Optional['BaseModel']]:
+    """
+    Look up models of any kinds with a single get_multi.
+    
+    Each item is (model_cls, key) or (model_cls, key, parent_path) for child
+    entities. Results are aligned with model_keys (None for missing entities).
+    Reads go to Datastore (inside the current transaction, if any) rather than
+    the session, after flushing any staged writes for the kinds involved.
+    """
+    if not model_keys:
+        return []
+    
+    paths = [tuple(item[2]) + (item[0]._kind, item[1]) if len(item) > 2 else (item[0]._kind, item[1])
+             for item in model_keys]
+    
+    session = get_current_session()
+    if session is not None:
+        for kind in {item[0]._kind for item in model_keys}:
+            if session.has_pending(kind):
+                session.flush(kind)
+    
+    client = get_datastore_client()
+    found = {}
+    for entity in client.get_multi([client.key(*path) for path in paths]):
+        found[entity.key.flat_path] = entity
+    
+    reads = _transaction_reads.get()
+    if reads is not None and client.current_transaction is not None:
+        for path in paths:
+            entity = found.get(path)
+            reads[path] = (entity.get(VERSION_FIELD) or 0) if entity is not None else None
+    
+    return [item[0]._from_entity(found.get(path)) for item, path in zip(model_keys, paths)]
+
+
+def _item_identity(item: Tuple) -> Tuple:
+    """Return the identity map key for a (model_cls, key[, parent_path]) item."""
+    return item[0]._identity(item[1], item[2] if len(item) > 2 else ())
+
+
+def preload_models(model_keys: List[Tuple]) -> List[Optional['BaseModel']]:
+    """
+    Load models of any kinds into the current session with a single get_multi.
+    
+    Takes the same items as get_multi_models. Keys the session already knows
+    are not read again, and everything loaded (including missing keys) is
+    registered so later reads and upserts in the request can skip Datastore.
+    """
+    session = get_current_session()
+    results: List[Any] = [UNKNOWN] * len(model_keys)
+    if session is not None:
+        for index, item in enumerate(model_keys):
+            found, model = session.lookup(_item_identity(item))
+            if found:
+                results[index] = model
+    
+    missing = [index for index, model in enumerate(results) if model is UNKNOWN]
+    if missing:
+        loaded = get_multi_models([model_keys[index] for index in missing])
+        for index, model in zip(missing, loaded):
+            item = model_keys[index]
+            if session is not None:
+                model = session.register(_item_identity(item), model)
+            results[index] = model
+    
+    return results
+
+
+def put_multi_models(models: List['BaseModel'], rebase: bool = True) -> None:
+    """Write models of any kinds with put_multi and record them in the session (see _write_models for rebase)."""
+    if not models:
+        return
+    
+    _write_models(models, rebase)
+    
+    session = get_current_session()
+    if session is not None:
+        for model in models:
+            session.refresh(model._key_identity(), model)
+
+
+def upsert_models(model_keys: List[Tuple], apply: Callable[[List[Optional['BaseModel']]], List['BaseModel']],
+                  known: Optional[List[Any]] = None) -> List['BaseModel']:
+    """
+    Read-modify-write models of any kinds, skipping reads for state already known.
+    
+    model_keys takes the same items as get_multi_models. apply receives the
+    current models aligned with model_keys (None for missing entities) and
+    returns the models to write. Current state is taken from `known` (aligned
+    with model_keys, UNKNOWN where not known), then from the session identity
+    map, and only the rest is read from Datastore, inside a transaction.
+    
+    When every state is known the read is skipped entirely. Versioned models
+    are still written with compare-and-swap, and if any of them changed
+    since its state was loaded, everything is read and apply runs again
+    (so apply may be called more than once), up to CONFLICT_ATTEMPTS times.
+    Unversioned models written this way overwrite concurrent updates.
+    """
+    known = list(known) if known is not None else [UNKNOWN] * len(model_keys)
+    session = get_current_session()
+    if session is not None:
+        for index, item in enumerate(model_keys):
+            if known[index] is UNKNOWN:
+                found, model = session.lookup(_item_identity(item))
+                if found:
+                    known[index] = model
+    
+    unknown = [index for index, model in enumerate(known) if model is UNKNOWN]
+    attempts = []
+    if not unknown:
+        attempts.append(1)
+        try:
+            models = apply(known)
+            put_multi_models(models, rebase=False)
+            return models
+        except ConcurrentUpdateError:
+            # Some known state was stale; the transactional retries below read everything
+            pass
+    
+    def read_modify_write():
+        # An aborted attempt may have modified the known models; read everything on retries
+        attempts.append(1)
+        indexes = unknown if len(attempts) == 1 else list(range(len(model_keys)))
+        current = list(known)
+        for index, model in zip(indexes, get_multi_models([model_keys[index] for index in indexes])):
+            current[index] = model
+        models = apply(current)
+        put_multi_models(models, rebase=False)
+        return models
+    
+    # Contention shows up as a version conflict or as an aborted commit; both get the same retries
+    while True:
+        try:
+            return run_in_transaction(read_modify_write, attempts=1)
+        except (ConcurrentUpdateError, api_exceptions.Aborted, api_exceptions.Conflict):
+            if len(attempts) >= CONFLICT_ATTEMPTS:
+                raise
+            _wait_before_retry(len(attempts))
+
+
+def _snapshot_value(value: Any) -> Any:
+    """Copy a field value for a change-tracking snapshot (containers can be mutated in place)."""
+    if isinstance(value, (list, dict)):
+        return copy.deepcopy(value)
+    return value
+
+
+def _build_field_assigner(fields: Dict[str, Any]) -> Callable[[Any, Dict[str, Any]], None]:
+    """
+    Generate a function that assigns declared fields from a mapping.
+    
+    The function is straight-line code, one line per field, so hydrating a
+    model costs no loop, no kwargs dict and no setattr calls. Missing fields
+    get their declared default; list, dict and set defaults are copied.
+    """
+    lines = ['def assign_fields(self, data):']
+    for name, default in fields.items():
+        if isinstance(default, (list, dict, set)):
+            fallback = f'{type(default).__name__}(_defaults[{name!r}])'
+        else:
+            fallback = f'_defaults[{name!r}]'
+        lines.append(f'    self.{name} = data[{name!r}] if {name!r} in data else {fallback}')
+    if not fields:
+        lines.append('    pass')
+    
+    namespace = {'_defaults': dict(fields)}
+    exec('\n'.join(lines), namespace)
+    return namespace['assign_fields']
+
+
 class BaseModel(ABC):
-    """Base class for all data models with common CRUD operations."""
+    """
+    Base class for all data models with common CRUD operations.
+    
+    Models either keep their fields in the instance __dict__ (assigned from
+    kwargs in __init__), or declare them: a `_fields` mapping of field name to
+    default plus `__slots__` listing those fields (and any private state).
+    Declared models are hydrated by a generated constructor and take much
+    less memory per instance.
+    """
+    
+    __slots__ = ('id', 'created_at', 'updated_at', '_parent_path', '_snapshot', '_encoded_values', '_version')
     
     # Subclasses must define the Datastore kind
     _kind: str = None
     
+    # Declared field schema (name -> default); None for models with dynamic fields
+    _fields: Optional[Dict[str, Any]] = None
+    
+    # Optional read-through cache for get_by_id/get_by_key (see models/cache.py)
+    _cache: Optional[ModelCache] = None
+    
+    # Stored format version written with new entities; 0 for unversioned models.
+    # Loaded entities keep the version they were stored with until migrated
+    # (supported for models with dynamic fields).
+    _schema_version: int = 0
+    
+    # Versioned models carry a write counter and are written with compare-and-swap
+    # (see _write_models); counter fields are merged as increments on conflicts
+    _versioned: bool = False
+    _counter_fields: Tuple[str, ...] = ()
+    
+    def __init_subclass__(cls, **kwargs):
+        """Generate the field assigner of models that declare a schema."""
+        super().__init_subclass__(**kwargs)
+        if '_fields' in cls.__dict__ and cls._fields is not None:
+            cls._assign_fields = _build_field_assigner(cls._fields)
+    
     def __init__(self, **kwargs):
         """Initialize model with provided data."""
-        self.id: Optional[int] = kwargs.get('id')
-        self.created_at: Optional[datetime.datetime] = kwargs.get('created_at')
-        self.updated_at: Optional[datetime.datetime] = kwargs.get('updated_at')
+        self._init_base(kwargs.get('id'), kwargs.get('created_at'), kwargs.get('updated_at'))
+        
+        if self._fields is not None:
+            self._assign_fields(kwargs)
+            self._init_state(kwargs)
+            return
         
         # Set additional attributes from kwargs
         for key, value in kwargs.items():
             if not key.startswith('_') and key not in ['id', 'created_at', 'updated_at']:
                 setattr(self, key, value)
     
+    def _init_base(self, model_id: Any, created_at: Optional[datetime.datetime],
+                   updated_at: Optional[datetime.datetime]) -> None:
+        """Set the attributes every model has."""
+        self.id = model_id
+        self.created_at = created_at
+        self.updated_at = updated_at
+        # Flat key path of the parent entity, for models stored as child entities
+        self._parent_path: Tuple = ()
+        self._snapshot = None
+        self._encoded_values: Optional[Dict[str, bytes]] = None
+        # Version the entity was loaded with (None if not loaded from Datastore)
+        self._version: Optional[int] = None
+    
+    def _init_state(self, data: Dict[str, Any]) -> None:
+        """Hook for declared models to set up private state after their fields are assigned."""
+        pass
+    
     @classmethod
     @abstractmethod
     def _get_required_fields(cls) -> List[str]:
@@ -49,6 +574,20 @@ class BaseModel(ABC):
         """Return list of fields to exclude from Datastore indexes."""
         pass
     
+    @classmethod
+    def _get_encoded_fields(cls) -> List[str]:
+        """Return list of unindexed fields stored as compressed blobs (opt-in)."""
+        return []
+    
+    @classmethod
+    def _identity(cls, model_id: Any, parent_path: Tuple = ()) -> Tuple:
+        """Return the identity map key for an entity of this kind."""
+        return (cls._kind, tuple(parent_path), model_id)
+    
+    def _key_identity(self) -> Tuple:
+        """Return the identity map key for this model."""
+        return self._identity(self.id, self._parent_path)
+    
     def _validate_required_fields(self) -> None:
         """Validate that all required fields are present."""
         required_fields = self._get_required_fields()
@@ -59,28 +598,204 @@ class BaseModel(ABC):
     def _to_entity_dict(self) -> Dict[str, Any]:
         """Convert model to dictionary for Datastore entity."""
         data = {}
-        for key, value in self.__dict__.items():
-            if not key.startswith('_') and key != 'id':
-                data[key] = value
+        encoded_fields = self._get_encoded_fields()
+        for key, value in self._field_values().items():
+            data[key] = encode_value(value) if key in encoded_fields else value
+        
+        # Blobs that were never decoded (or replaced) are written back as they are
+        for key, blob in (self._encoded_values or {}).items():
+            data.setdefault(key, blob)
         
         # Set timestamps
         now = datetime.datetime.now(datetime.timezone.utc)
-        if not self.created_at:
-            data['created_at'] = now
-        if not self.updated_at:
-            data['updated_at'] = now
+        data['created_at'] = self.created_at or now
+        data['updated_at'] = self.updated_at or now
+        
+        if self._schema_version:
+            data.setdefault(SCHEMA_VERSION_FIELD, self._schema_version)
         
         return data
     
+    def _to_entity(self, client) -> datastore.Entity:
+        """Build the Datastore entity for this model."""
+        if self.id:
+            key = client.key(*self._parent_path, self._kind, self.id)
+        else:
+            key = client.key(*self._parent_path, self._kind)
+        
+        exclude_from_indexes = set(self._get_excluded_indexes()) | set(self._get_encoded_fields())
+        if self._schema_version:
+            exclude_from_indexes.add(SCHEMA_VERSION_FIELD)
+        if self._versioned:
+            exclude_from_indexes.add(VERSION_FIELD)
+        entity = datastore.Entity(key=key, exclude_from_indexes=list(exclude_from_indexes))
+        entity.update(self._to_entity_dict())
+        return entity
+    
     @classmethod
     def _from_entity(cls: Type[ModelType], entity: datastore.Entity) -> ModelType:
         """Create model instance from Datastore entity."""
         if not entity:
             return None
         
-        data = dict(entity)
-        data['id'] = entity.key.id or entity.key.name
-        return cls(**data)
+        # Encoded blobs are kept aside and only decoded when first accessed;
+        # values stored before a field was encoded are used as they are
+        encoded_values = {}
+        for field in cls._get_encoded_fields():
+            if is_encoded(entity.get(field)):
+                encoded_values[field] = entity[field]
+        
+        # flat_path is cached on the key; .id, .name and .parent copy the path on every access
+        flat_path = entity.key.flat_path
+        model_id = flat_path[-1]
+        if cls._fields is not None:
+            # Declared models are filled straight from the entity, bypassing __init__
+            model = cls.__new__(cls)
+            model._init_base(model_id, entity.get('created_at'), entity.get('updated_at'))
+            model._assign_fields(entity)
+            model._init_state(entity)
+        else:
+            data = dict(entity)
+            data['id'] = model_id
+            data.pop(VERSION_FIELD, None)
+            if cls._schema_version:
+                # Entities written before the model was versioned have no stamp
+                data.setdefault(SCHEMA_VERSION_FIELD, 0)
+            for field in encoded_values:
+                del data[field]
+            model = cls(**data)
+        
+        if encoded_values:
+            for field in encoded_values:
+                if field in model._field_values():
+                    delattr(model, field)
+            model._encoded_values = encoded_values
+        if len(flat_path) > 2:
+            model._parent_path = flat_path[:-2]
+        model._version = entity.get(VERSION_FIELD) or 0
+        model._mark_clean()
+        return model
+    
+    def __getattr__(self, name: str) -> Any:
+        """Decode an encoded field on first access."""
+        # Only reached for missing attributes; the guard keeps half-built copies from recursing
+        if name.startswith('__') or name == '_encoded_values':
+            raise AttributeError(name)
+        encoded_values = self._encoded_values
+        if encoded_values and name in encoded_values:
+            value = decode_value(encoded_values.pop(name))
+            setattr(self, name, value)
+            if self._snapshot is not None:
+                self._snapshot[name] = _snapshot_value(value)
+            return value
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+    
+    @classmethod
+    def _track(cls: Type[ModelType], entity: datastore.Entity) -> ModelType:
+        """Hydrate an entity and register it with the current session."""
+        model = cls._from_entity(entity)
+        session = get_current_session()
+        if session is not None:
+            model = session.register(model._key_identity(), model)
+        return model
+    
+    def _field_values(self) -> Dict[str, Any]:
+        """Return the stored fields held in memory (no timestamps or undecoded blobs)."""
+        if self._fields is not None:
+            values = {}
+            for name in self._fields:
+                # object.__getattribute__ skips __getattr__, so undecoded blobs stay encoded
+                try:
+                    values[name] = object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
+            return values
+        return {key: value for key, value in self.__dict__.items()
+                if not key.startswith('_') and key not in ('id', 'created_at', 'updated_at')}
+    
+    def _mark_clean(self) -> None:
+        """Snapshot the field values as stored, to diff against on save."""
+        self._snapshot = {key: _snapshot_value(value) for key, value in self._field_values().items()}
+    
+    def get_changed_fields(self) -> List[str]:
+        """Return the fields changed since the model was loaded or last saved (all fields if new)."""
+        values = self._field_values()
+        snapshot = self._snapshot
+        if snapshot is None:
+            return list(values)
+        
+        changed = [key for key, value in values.items() if key not in snapshot or snapshot[key] != value]
+        changed.extend(key for key in snapshot if key not in values)
+        return changed
+    
+    def _has_changes(self) -> bool:
+        """Check whether saving the model would write anything."""
+        return self._snapshot is None or bool(self.get_changed_fields())
+    
+    @classmethod
+    def _get_cached(cls: Type[ModelType], cache_key: Any) -> Optional[ModelType]:
+        """Return a private copy of a cached model, or None."""
+        if cls._cache is None:
+            return None
+        cached = cls._cache.get(cache_key)
+        return copy.deepcopy(cached) if cached is not None else None
+    
+    def _put_cached(self, cache_key: Any) -> None:
+        """Cache a copy of this model as loaded."""
+        if self._cache is not None:
+            self._cache.put(cache_key, copy.deepcopy(self))
+    
+    def _cache_keys(self) -> List[Any]:
+        """Return the cache keys that may hold this model."""
+        return [self.id]
+    
+    def _invalidate_cache(self) -> None:
+        """Drop this model from the read-through cache after a write or delete."""
+        if self._cache is not None:
+            for cache_key in self._cache_keys():
+                self._cache.invalidate(cache_key)
+    
+    def _models_to_write(self) -> List['BaseModel']:
+        """Return the models written when this one is saved (children first)."""
+        return [self]
+    
+    def _after_write(self) -> None:
+        """Hook called after the model's entity has been written."""
+        pass
+    
+    def _rebase(self, stored: Optional['BaseModel']) -> None:
+        """
+        Re-apply unsaved changes on top of the entity a concurrent writer stored.
+        
+        stored is the model as now stored (None if it was deleted). Fields
+        changed here keep their new value, counter fields add this model's
+        increment to the stored count, and all other fields take the stored
+        value; the model then counts as loaded from the stored version.
+        """
+        if stored is None:
+            # Deleted meanwhile: write this model as a new entity
+            self._version = None
+            self._snapshot = None
+            return
+        
+        changed = set(self.get_changed_fields())
+        base = self._snapshot or {}
+        for name, value in stored._field_values().items():
+            if name not in changed:
+                setattr(self, name, value)
+            elif name in self._counter_fields:
+                setattr(self, name, value + getattr(self, name) - base.get(name, 0))
+        
+        # Blobs of unchanged fields that the stored model hasn't decoded
+        encoded_values = {name: blob for name, blob in (stored._encoded_values or {}).items() if name not in changed}
+        for name in encoded_values:
+            if name in self._field_values():
+                delattr(self, name)
+        self._encoded_values = encoded_values or None
+        
+        self.created_at = stored.created_at
+        self._version = stored._version
+        self._snapshot = stored._snapshot
     
     def save(self) -> 'BaseModel':
         """Save the model to Datastore."""
@@ -89,46 +804,80 @@ class BaseModel(ABC):
         
         self._validate_required_fields()
         
-        client = get_datastore_client()
+        # Nothing changed since the model was loaded or last saved
+        if not self._has_changes():
+            return self
         
-        # Create or update entity
-        if self.id:
-            key = client.key(self._kind, self.id)
-        else:
-            key = client.key(self._kind)
-        
-        entity = datastore.Entity(key=key, exclude_from_indexes=self._get_excluded_indexes())
-        entity.update(self._to_entity_dict())
+        # Inside a request session, defer writes of keyed entities to the flush
+        session = get_current_session()
+        if session is not None and self.id:
+            session.add(self)
+            return self
         
-        client.put(entity)
+        # Write the entity; new entities get their generated ID back
+        _write_models([self])
         
-        # Update the model with the generated ID
-        if not self.id:
-            self.id = entity.key.id
+        if session is not None:
+            session.register(self._key_identity(), self)
+            session.invalidate_queries(self._kind)
         
         return self
     
     @classmethod
-    def get_by_id(cls: Type[ModelType], model_id: int) -> Optional[ModelType]:
-        """Get model by ID."""
+    def _get(cls: Type[ModelType], model_id: Any) -> Optional[ModelType]:
+        """Get a model by ID or key name, consulting the session first."""
         if not cls._kind:
             raise NotImplementedError("Model must define _kind class attribute")
         
+        session = get_current_session()
+        identity = cls._identity(model_id)
+        if session is not None:
+            found, model = session.lookup(identity)
+            if found:
+                return model
+        
+        cached = cls._get_cached(model_id)
+        if cached is not None:
+            return session.register(identity, cached) if session is not None else cached
+        
         client = get_datastore_client()
         key = client.key(cls._kind, model_id)
         entity = client.get(key)
-        return cls._from_entity(entity)
+        if entity is None:
+            if session is not None:
+                session.register(identity, None)
+            return None
+        
+        model = cls._track(entity)
+        model._put_cached(model_id)
+        return model
     
     @classmethod
-    def get_by_key(cls: Type[ModelType], key_name: str) -> Optional[ModelType]:
-        """Get model by key name."""
-        if not cls._kind:
-            raise NotImplementedError("Model must define _kind class attribute")
+    def upsert(cls: Type[ModelType], key_name: Any, apply: Callable[[Optional[ModelType]], ModelType],
+               current: Any = UNKNOWN) -> ModelType:
+        """
+        Create or update one model with apply(existing_or_None) and write it.
         
+        Pass current (the model, or None if it is known not to exist) when the
+        state is already loaded to skip the read; see upsert_models.
+        """
+        return upsert_models([(cls, key_name)], lambda models: [apply(models[0])], known=[current])[0]
+    
+    @classmethod
+    def allocate_id(cls) -> int:
+        """Reserve a numeric ID so a new entity can be referenced before it is written."""
         client = get_datastore_client()
-        key = client.key(cls._kind, key_name)
-        entity = client.get(key)
-        return cls._from_entity(entity)
+        return client.allocate_ids(client.key(cls._kind), 1)[0].id
+    
+    @classmethod
+    def get_by_id(cls: Type[ModelType], model_id: int) -> Optional[ModelType]:
+        """Get model by ID."""
+        return cls._get(model_id)
+    
+    @classmethod
+    def get_by_key(cls: Type[ModelType], key_name: str) -> Optional[ModelType]:
+        """Get model by key name."""
+        return cls._get(key_name)
     
     @classmethod
     def query(cls: Type[ModelType]) -> datastore.Query:
@@ -139,17 +888,128 @@ class BaseModel(ABC):
         client = get_datastore_client()
         return client.query(kind=cls._kind)
     
+    @classmethod
+    def fetch(cls: Type[ModelType], query: datastore.Query, limit: int = None) -> List[ModelType]:
+        """Run a query and return hydrated models, reusing session results."""
+        session = get_current_session()
+        if session is None:
+            return [cls._from_entity(entity) for entity in query.fetch(limit=limit)]
+        
+        signature = (cls._kind, tuple(repr(f) for f in query.filters), tuple(query.order), limit)
+        cached = session.get_cached_query(signature)
+        if cached is not None:
+            return cached
+        
+        # Staged writes must be visible to the query
+        if session.has_pending(cls._kind):
+            session.flush(cls._kind)
+        
+        models = [cls._track(entity) for entity in query.fetch(limit=limit)]
+        session.cache_query(signature, models)
+        return models
+    
+    @classmethod
+    def fetch_page(cls, query: datastore.Query, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                   projection: Optional[List[str]] = None) -> Tuple[List[Any], Optional[str]]:
+        """
+        Fetch one page of a query starting at cursor.
+        
+        Returns (items, next_cursor), where next_cursor is an opaque URL-safe
+        string to pass back for the following page (None when exhausted).
+        Items are models, or plain dict rows (with 'id') for a projection.
+        Paged models are not tracked by the session.
+        """
+        # Staged writes must be visible to the query
+        session = get_current_session()
+        if session is not None and session.has_pending(cls._kind):
+            session.flush(cls._kind)
+        
+        if projection:
+            query.projection = list(projection)
+        iterator = query.fetch(limit=page_size, start_cursor=cursor)
+        items = []
+        for entity in next(iterator.pages, []):
+            if projection:
+                item = dict(entity)
+                item['id'] = entity.key.flat_path[-1]
+            else:
+                item = cls._from_entity(entity)
+            items.append(item)
+        
+        return items, next_page_cursor(iterator)
+    
+    @classmethod
+    def iter_query(cls, query: datastore.Query, page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                   projection: Optional[List[str]] = None) -> Iterator[Any]:
+        """Yield a query's results lazily, fetching page_size entities at a time with cursors."""
+        while True:
+            items, cursor = cls.fetch_page(query, page_size, cursor, projection)
+            yield from items
+            if cursor is None:
+                return
+    
+    @classmethod
+    def fetch_projection(cls, query: datastore.Query, fields: List[str], limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Run a projection query and return lightweight rows instead of models.
+        
+        Each row is a dict of the projected fields plus 'id'. Projected fields
+        must be indexed, and queries that combine them with filters need a
+        matching composite index in index.yaml.
+        """
+        # Staged writes must be visible to the query
+        session = get_current_session()
+        if session is not None and session.has_pending(cls._kind):
+            session.flush(cls._kind)
+        
+        query.projection = list(fields)
+        rows = []
+        for entity in query.fetch(limit=limit):
+            row = dict(entity)
+            row['id'] = entity.key.flat_path[-1]
+            rows.append(row)
+        return rows
+    
+    @classmethod
+    def fetch_keys(cls, query: datastore.Query, limit: int = None) -> List[Any]:
+        """Run a keys-only query and return the matching IDs or key names."""
+        session = get_current_session()
+        if session is not None and session.has_pending(cls._kind):
+            session.flush(cls._kind)
+        
+        query.keys_only()
+        return [entity.key.flat_path[-1] for entity in query.fetch(limit=limit)]
+    
     @classmethod
     def get_multi(cls: Type[ModelType], keys: List[str]) -> List[Optional[ModelType]]:
-        """Get multiple models by keys."""
+        """Get multiple models by keys, returned in the same order as keys."""
         if not cls._kind:
             raise NotImplementedError("Model must define _kind class attribute")
         
-        client = get_datastore_client()
-        datastore_keys = [client.key(cls._kind, key) for key in keys]
-        entities = client.get_multi(datastore_keys)
+        session = get_current_session()
+        results: Dict[Any, Optional[ModelType]] = {}
+        missing_keys = []
+        for key in keys:
+            found, model = session.lookup(cls._identity(key)) if session is not None else (False, None)
+            if found:
+                results[key] = model
+            elif key not in missing_keys:
+                missing_keys.append(key)
+        
+        if missing_keys:
+            client = get_datastore_client()
+            datastore_keys = [client.key(cls._kind, key) for key in missing_keys]
+            for entity in client.get_multi(datastore_keys):
+                model = cls._track(entity)
+                results[model.id] = model
+            
+            for key in missing_keys:
+                if key not in results:
+                    results[key] = None
+                    if session is not None:
+                        session.register(cls._identity(key), None)
         
-        return [cls._from_entity(entity) for entity in entities]
+        return [results[key] for key in keys]
     
     def delete(self) -> None:
         """Delete the model from Datastore."""
@@ -157,8 +1017,13 @@ class BaseModel(ABC):
             raise ValueError("Cannot delete model without ID")
         
         client = get_datastore_client()
-        key = client.key(self._kind, self.id)
+        key = client.key(*self._parent_path, self._kind, self.id)
         client.delete(key)
+        self._invalidate_cache()
+        
+        session = get_current_session()
+        if session is not None:
+            session.discard(self._key_identity())
     
     def __repr__(self) -> str:
         """String representation of the model."""
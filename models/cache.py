@@ -0,0 +1,264 @@
+"""
+Read-through caches for rarely changing entities.
+
+A ModelCache is a bounded per-process LRU cache whose entries expire after a
+TTL. With a SharedCache attached, invalidations are published as version
+numbers in the shared cache, so every worker drops its stale copy on the
+next read instead of waiting for the TTL. SHARED_CACHE selects it: "sqlite"
+for the workers of one host, "redis" across hosts (App Engine instances).
+Without one, a write in one worker leaves the other workers serving their
+copy for up to MODEL_CACHE_TTL_SECONDS, so deployments with several workers
+must keep that TTL small or disable the cache (MODEL_CACHE_SIZE=0).
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Hashable, Optional, Tuple
+from cachetools import TTLCache
+
+
+class SharedCache(ABC):
+    """Adapter for a cache shared between worker processes (memcached, Redis, ...)."""
+    
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value, or None if missing or expired."""
+    
+    @abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, expiring after ttl seconds if given."""
+    
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a value."""
+    
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        """Atomically increment an integer value (missing counts as 0) and return it."""
+
+
+class LocalSharedCache(SharedCache):
+    """In-process stand-in for a shared cache, for development and tests."""
+    
+    def __init__(self):
+        self._values: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value, expires_at = self._values.get(key, (None, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._values[key]
+                return None
+            return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[key] = (value, time.monotonic() + ttl if ttl else None)
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+    
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = (self._values.get(key, (0, None))[0] or 0) + 1
+            self._values[key] = (value, None)
+            return value
+
+
+class SQLiteSharedCache(SharedCache):
+    """Shared cache in a SQLite file, for the worker processes of one host; survives restarts."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                                 'expires_at REAL)')
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            # Expiry is wall-clock time, since the file outlives the process
+            if row[1] is not None and row[1] <= time.time():
+                self._connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+                return None
+            return pickle.loads(row[0])
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                                     (key, pickle.dumps(value), time.time() + ttl if ttl else None))
+    
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+    
+    def incr(self, key: str) -> int:
+        with self._lock:
+            # The write lock makes the read and the write one step for every process
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._connection.execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+                value = (pickle.loads(row[0]) if row else 0) + 1
+                self._connection.execute('INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, NULL)',
+                                         (key, pickle.dumps(value)))
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+            return value
+
+
+class RedisSharedCache(SharedCache):
+    """Shared cache in Redis (or Memorystore), for workers on several hosts; needs the redis package."""
+    
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("SHARED_CACHE=redis needs the redis package (pip install redis)")
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+    
+    def get(self, key: str) -> Optional[Any]:
+        value = self._client.get(key)
+        if value is None:
+            return None
+        # incr stores plain ASCII digits; everything else is a pickle, which never starts with a digit
+        return int(value) if value.isdigit() else pickle.loads(value)
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._client.set(key, pickle.dumps(value), px=int(ttl * 1000) if ttl else None)
+    
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+    
+    def incr(self, key: str) -> int:
+        return self._client.incr(key)
+
+
+class ModelCache:
+    """
+    Bounded LRU + TTL cache with hit/miss counters.
+    
+    Entries are stamped with the shared version of their key when stored and
+    only served while that version is current. A read racing with a write in
+    another worker can still cache the old value; it then lives at most ttl
+    seconds.
+    """
+    
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300,
+                 shared: Optional[SharedCache] = None):
+        self.name = name
+        self.shared = shared
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def _version(self, key: Hashable) -> int:
+        if self.shared is None:
+            return 0
+        return self.shared.get(f"{self.name}:version:{key!r}") or 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached value, or None on a miss."""
+        version = self._version(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """Cache a value under the key's current version (nothing when maxsize is 0)."""
+        if not self._entries.maxsize:
+            return
+        version = self._version(key)
+        with self._lock:
+            self._entries[key] = (version, value)
+    
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a key here and, through the shared cache, in every other worker."""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.incr(f"{self.name}:version:{key!r}")
+    
+    def clear(self) -> None:
+        """Drop every local entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self._entries.maxsize,
+            }
+
+
+# Names accepted by SHARED_CACHE
+SHARED_CACHES = ('', 'local', 'sqlite', 'redis')
+
+# Process-wide stand-in used when SHARED_CACHE is "local"
+_local_shared_cache = LocalSharedCache()
+
+# The SQLite or Redis shared cache of this process, opened on first use
+_shared_cache: Optional[SharedCache] = None
+
+# Every cache made by create_model_cache, so they can be cleared together
+_model_caches = []
+
+
+def clear_model_caches() -> None:
+    """Empty every model cache, e.g. after switching storage backends."""
+    for cache in _model_caches:
+        cache.clear()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """Return the shared cache selected by SHARED_CACHE in config/settings.py, if any."""
+    global _shared_cache
+    from config.settings import Config
+    
+    name = Config.SHARED_CACHE.lower()
+    if not name:
+        return None
+    if name == 'local':
+        return _local_shared_cache
+    if name not in SHARED_CACHES:
+        raise ValueError(f"Unknown shared cache {name!r}; "
+                         f"expected one of {', '.join(repr(name) for name in SHARED_CACHES)}")
+    if _shared_cache is None:
+        if name == 'sqlite':
+            _shared_cache = SQLiteSharedCache(Config.SHARED_CACHE_PATH)
+        else:
+            _shared_cache = RedisSharedCache(Config.SHARED_CACHE_URL)
+    return _shared_cache
+
+
+def create_model_cache(name: str) -> ModelCache:
+    """Create a cache sized and shared as configured in config/settings.py."""
+    from config.settings import Config
+    
+    cache = ModelCache(name, maxsize=Config.MODEL_CACHE_SIZE, ttl=Config.MODEL_CACHE_TTL_SECONDS,
+                       shared=get_shared_cache())
+    _model_caches.append(cache)
+    return cache
\ No newline at end of file
@@ -1,26 +1,120 @@
 """
 Chat history model for storing conversation history between user and AI tutor.
+
+Messages are stored append-only in fixed-size ChatHistoryChunk child entities
+under a small ChatHistory head entity that holds the message and chunk counts.
+Appending only rewrites the tail chunk (and the head), and reading the last few
+messages only fetches the chunks that contain them.
+
+Messages are stored as {'role': 'user' | 'model', 'parts': [text], ...}.
+Chunks written before schema version 1 may still hold tutor-mode messages as
+{'sender': 'student' | 'tutor', 'message': text, ...} until the migration in
+models/migrations.py has run; read messages through message_role and
+message_text to accept both.
 """
 import datetime
-from typing import Dict, List, Optional
-from .base import BaseModel
+from typing import Dict, Iterable, List, Optional
+from .base import UNKNOWN, BaseModel, get_datastore_client, get_multi_models
 
+# Number of messages stored per chunk entity
+CHUNK_SIZE = 20
 
-class ChatHistory(BaseModel):
-    """Model for storing chat history between user and AI tutor."""
+# Roles of the tutor-mode senders used before schema version 1
+_ROLES_BY_SENDER = {'student': 'user', 'tutor': 'model'}
+
+
+def message_role(message: Dict) -> Optional[str]:
+    """Return 'user' or 'model' for a message in either stored format."""
+    role = message.get('role')
+    if role is None:
+        return _ROLES_BY_SENDER.get(message.get('sender'))
+    return role
+
+
+def message_text(message: Dict) -> str:
+    """Return the text of a message in either stored format."""
+    parts = message.get('parts')
+    if parts is None:
+        return message.get('message') or ''
+    return parts[0] if parts else ''
+
+
+def normalize_message(message: Dict) -> Dict:
+    """Return the message in the {role, parts} format, as-is if it already is."""
+    if 'sender' not in message or 'role' in message:
+        return message
+    extra = {key: value for key, value in message.items() if key not in ('sender', 'message')}
+    return {'role': message_role(message), 'parts': [message.get('message') or ''], **extra}
+
+
+class ChatHistoryChunk(BaseModel):
+    """A fixed-size segment of a chat history, stored as a child of ChatHistory."""
     
-    _kind = 'ChatHistory'
+    _kind = 'ChatHistoryChunk'
+    _schema_version = 1
     
     def __init__(self, **kwargs):
-        """Initialize ChatHistory model."""
+        """Initialize ChatHistoryChunk model."""
         super().__init__(**kwargs)
         
-        # Chat history specific fields
+        # Chunk IDs are 1-based positions within the parent history
         self.user_id: int = kwargs.get('user_id')
         self.problem_id: str = kwargs.get('problem_id')
-        self.history: List[Dict] = kwargs.get('history', [])
-        self.message_count: int = kwargs.get('message_count', 0)
-        self.last_message_at: Optional[datetime.datetime] = kwargs.get('last_message_at')
+        self.messages: List[Dict] = kwargs.get('messages', [])
+    
+    @classmethod
+    def _get_required_fields(cls) -> List[str]:
+        """Return list of required field names."""
+        return ['user_id', 'problem_id']
+    
+    @classmethod
+    def _get_excluded_indexes(cls) -> List[str]:
+        """Return list of fields to exclude from Datastore indexes."""
+        # Chunks are only read by key; nothing about them is queried
+        return ['messages', 'user_id', 'problem_id', 'created_at', 'updated_at']
+    
+    @classmethod
+    def _get_encoded_fields(cls) -> List[str]:
+        """Return list of fields stored as compressed blobs."""
+        return ['messages']
+
+
+class ChatHistory(BaseModel):
+    """Model for storing chat history between user and AI tutor."""
+    
+    _kind = 'ChatHistory'
+    _versioned = True
+    
+    # Chat history specific fields and their defaults
+    _fields = {
+        'user_id': None,
+        'problem_id': None,
+        'message_count': 0,
+        'chunk_count': 0,
+        'last_message_at': None,
+    }
+    __slots__ = tuple(_fields) + ('_messages', '_rewrite', '_chunks', '_dirty_chunks', '_stored_chunk_count',
+                                  '_appended')
+    
+    user_id: int
+    problem_id: str
+    message_count: int
+    chunk_count: int
+    last_message_at: Optional[datetime.datetime]
+    
+    def _init_state(self, data: Dict) -> None:
+        """Set up the chunk state."""
+        self._messages: Optional[List[Dict]] = None
+        self._rewrite = False
+        self._chunks: Dict[int, ChatHistoryChunk] = {}
+        self._dirty_chunks = set()
+        self._stored_chunk_count = self.chunk_count
+        # Messages appended since the last write, re-applied if a concurrent append wins
+        self._appended: List[Dict] = []
+        
+        # Inline history (legacy records, or a full list passed in) is rewritten as chunks on save
+        if 'history' in data:
+            self.history = data['history']
     
     @classmethod
     def _get_required_fields(cls) -> List[str]:
@@ -30,13 +124,160 @@ class ChatHistory(BaseModel):
     @classmethod
     def _get_excluded_indexes(cls) -> List[str]:
         """Return list of fields to exclude from Datastore indexes."""
-        return ['history']  # Don't index large chat history data
+        # Only user_id and last_message_at are queried (get_user_chat_histories)
+        return ['problem_id', 'message_count', 'chunk_count', 'created_at', 'updated_at']
     
     @classmethod
     def _generate_key_name(cls, user_id: int, problem_id: str) -> str:
         """Generate unique key name for user-problem combination."""
         return f"{user_id}-{problem_id}"
     
+    @property
+    def history(self) -> List[Dict]:
+        """All messages in the conversation, loading every chunk on first access."""
+        if self._messages is None:
+            chunks = self._load_chunks(range(1, self.chunk_count + 1))
+            self._messages = [message for chunk in chunks for message in chunk.messages]
+        return self._messages
+    
+    @history.setter
+    def history(self, messages: List[Dict]) -> None:
+        """Replace the whole conversation; chunks are rebuilt on the next save."""
+        self._messages = [normalize_message(message) for message in messages or []]
+        self._rewrite = True
+        self._chunks = {}
+        self._dirty_chunks = set()
+        self.message_count = len(self._messages)
+    
+    def _chunk_parent_path(self) -> tuple:
+        """Return the key path chunks of this history are stored under."""
+        if not self.id:
+            self.id = self._generate_key_name(self.user_id, self.problem_id)
+        return (self._kind, self.id)
+    
+    def _new_chunk(self, index: int, messages: List[Dict]) -> ChatHistoryChunk:
+        """Build a chunk entity for this history."""
+        chunk = ChatHistoryChunk(id=index, user_id=self.user_id, problem_id=self.problem_id, messages=messages)
+        chunk._parent_path = self._chunk_parent_path()
+        return chunk
+    
+    def _load_chunks(self, indexes: Iterable[int]) -> List[ChatHistoryChunk]:
+        """Return the given chunks in order, fetching the ones not yet loaded in one get_multi."""
+        indexes = list(indexes)
+        missing = [index for index in indexes if index not in self._chunks]
+        if missing:
+            parent_path = self._chunk_parent_path()
+            loaded = get_multi_models([(ChatHistoryChunk, index, parent_path) for index in missing])
+            for index, chunk in zip(missing, loaded):
+                self._chunks[index] = chunk or self._new_chunk(index, [])
+        return [self._chunks[index] for index in indexes]
+    
+    def _tail_needs_loading(self) -> bool:
+        """Return True if appending would need the stored tail chunk."""
+        return (not self._rewrite and self.message_count % CHUNK_SIZE != 0
+                and self.chunk_count not in self._chunks)
+    
+    @classmethod
+    def load_tail_chunks(cls, histories: List[Optional['ChatHistory']]) -> None:
+        """Fetch the tail chunks of several histories with a single get_multi before appending."""
+        pending = [history for history in histories if history and history._tail_needs_loading()]
+        if not pending:
+            return
+        
+        loaded = get_multi_models([(ChatHistoryChunk, history.chunk_count, history._chunk_parent_path())
+                                   for history in pending])
+        for history, chunk in zip(pending, loaded):
+            history._chunks[history.chunk_count] = chunk or history._new_chunk(history.chunk_count, [])
+    
+    def _append(self, messages: List[Dict]) -> None:
+        """Append messages to the tail chunk, opening new chunks as they fill up."""
+        messages = [normalize_message(message) for message in messages]
+        if self._messages is not None:
+            self._messages.extend(messages)
+        
+        if not self._rewrite:
+            self._appended.extend(messages)
+            remaining = messages
+            while remaining:
+                if self.message_count % CHUNK_SIZE == 0:
+                    self.chunk_count += 1
+                    tail = self._new_chunk(self.chunk_count, [])
+                    self._chunks[self.chunk_count] = tail
+                else:
+                    tail = self._load_chunks([self.chunk_count])[0]
+                
+                space = CHUNK_SIZE - len(tail.messages)
+                tail.messages = tail.messages + remaining[:space]
+                self._dirty_chunks.add(tail.id)
+                self.message_count += len(remaining[:space])
+                remaining = remaining[space:]
+        else:
+            self.message_count = len(self._messages)
+        
+        self.last_message_at = datetime.datetime.now(datetime.timezone.utc)
+    
+    def get_recent_messages(self, limit: int) -> List[Dict]:
+        """Return the last `limit` messages, fetching only the chunks that hold them."""
+        if limit <= 0:
+            return []
+        if self._messages is not None:
+            return self._messages[-limit:]
+        
+        first_index = max(0, self.message_count - limit) // CHUNK_SIZE + 1
+        chunks = self._load_chunks(range(first_index, self.chunk_count + 1))
+        return [message for chunk in chunks for message in chunk.messages][-limit:]
+    
+    def _has_changes(self) -> bool:
+        """Chunk updates count as changes of the history."""
+        return self._rewrite or bool(self._dirty_chunks) or super()._has_changes()
+    
+    def _models_to_write(self) -> List[BaseModel]:
+        """Return the chunks touched since the last write followed by the head."""
+        if self._rewrite:
+            messages = self._messages or []
+            self._chunks = {}
+            for start in range(0, len(messages), CHUNK_SIZE):
+                index = start // CHUNK_SIZE + 1
+                self._chunks[index] = self._new_chunk(index, messages[start:start + CHUNK_SIZE])
+            self._dirty_chunks = set(self._chunks)
+            self.chunk_count = len(self._chunks)
+            self.message_count = len(messages)
+        
+        return [self._chunks[index] for index in sorted(self._dirty_chunks)] + [self]
+    
+    def _after_write(self) -> None:
+        """Drop chunks left over from a longer history and reset the write state."""
+        if self._stored_chunk_count > self.chunk_count:
+            client = get_datastore_client()
+            parent_path = self._chunk_parent_path()
+            client.delete_multi([client.key(*parent_path, ChatHistoryChunk._kind, index)
+                                 for index in range(self.chunk_count + 1, self._stored_chunk_count + 1)])
+        
+        self._stored_chunk_count = self.chunk_count
+        self._rewrite = False
+        self._dirty_chunks = set()
+        self._appended = []
+    
+    def _rebase(self, stored: Optional['ChatHistory']) -> None:
+        """Append this history's new messages after the ones a concurrent writer stored."""
+        if self._rewrite:
+            # Replacing the whole conversation wins; chunks the stored history has beyond ours are dropped
+            self._stored_chunk_count = stored.chunk_count if stored else 0
+            self._version = stored._version if stored else None
+            self._snapshot = stored._snapshot if stored else None
+            return
+        
+        appended = self._appended
+        super()._rebase(stored)
+        self.message_count = stored.message_count if stored else 0
+        self.chunk_count = stored.chunk_count if stored else 0
+        self._messages = None
+        self._chunks = {}
+        self._dirty_chunks = set()
+        self._stored_chunk_count = self.chunk_count
+        self._appended = []
+        self._append(appended)
+    
     @classmethod
     def get_chat_history(cls, user_id: int, problem_id: str) -> Optional['ChatHistory']:
         """Get chat history for a specific user and problem."""
@@ -50,44 +291,51 @@ class ChatHistory(BaseModel):
         query.add_filter('user_id', '=', user_id)
         query.order = ['-last_message_at']
         
-        entities = list(query.fetch(limit=limit))
-        return [cls._from_entity(entity) for entity in entities]
+        return cls.fetch(query, limit=limit)
     
     @classmethod
-    def create_or_update_history(cls, user_id: int, problem_id: str, 
-                                history: List[Dict]) -> 'ChatHistory':
-        """Create new chat history or update existing one."""
-        key_name = cls._generate_key_name(user_id, problem_id)
+    def create_or_update_history(cls, user_id: int, problem_id: str,
+                                history: List[Dict], current=UNKNOWN) -> 'ChatHistory':
+        """
+        Create new chat history or replace the messages of an existing one.
         
-        # Try to get existing history
-        chat_history = cls.get_by_key(key_name)
+        Pass current (the loaded history, or None if there is none) to skip
+        the read, see BaseModel.upsert.
+        """
+        def apply_history(chat_history):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if chat_history:
+                # Update existing history
+                chat_history.history = history
+                chat_history.last_message_at = now
+            else:
+                # Create new history
+                chat_history = cls(
+                    user_id=user_id,
+                    problem_id=problem_id,
+                    history=history,
+                    last_message_at=now
+                )
+                # Set the ID to the key name for composite key
+                chat_history.id = cls._generate_key_name(user_id, problem_id)
+            return chat_history
         
-        if chat_history:
-            # Update existing history
-            chat_history.history = history
-            chat_history.message_count = len(history)
-            chat_history.last_message_at = datetime.datetime.now(datetime.timezone.utc)
-            chat_history.updated_at = datetime.datetime.now(datetime.timezone.utc)
-        else:
-            # Create new history
-            chat_history = cls(
-                user_id=user_id,
-                problem_id=problem_id,
-                history=history,
-                message_count=len(history),
-                last_message_at=datetime.datetime.now(datetime.timezone.utc)
-            )
-            # Set the ID to the key name for composite key
-            chat_history.id = key_name
-        
-        return chat_history.save()
+        return cls.upsert(cls._generate_key_name(user_id, problem_id), apply_history, current=current)
+    
+    @classmethod
+    def append_messages(cls, chat_history: Optional['ChatHistory'], user_id: int,
+                        problem_id: str, messages: List[Dict]) -> 'ChatHistory':
+        """Append messages to an existing history (or start a new one) without saving."""
+        if not chat_history:
+            chat_history = cls(user_id=user_id, problem_id=problem_id)
+            chat_history.id = cls._generate_key_name(user_id, problem_id)
+        
+        chat_history._append(messages)
+        return chat_history
     
     def add_message(self, message: Dict) -> 'ChatHistory':
         """Add a single message to the chat history."""
-        self.history.append(message)
-        self.message_count = len(self.history)
-        self.last_message_at = datetime.datetime.now(datetime.timezone.utc)
-        self.updated_at = datetime.datetime.now(datetime.timezone.utc)
+        self._append([message])
         return self.save()
     
     def add_user_message(self, message: str) -> 'ChatHistory':
@@ -111,8 +359,8 @@ class ChatHistory(BaseModel):
     
     def get_conversation_summary(self) -> Dict:
         """Get a summary of the conversation."""
-        user_messages = [msg for msg in self.history if msg.get('role') == 'user']
-        model_messages = [msg for msg in self.history if msg.get('role') == 'model']
+        user_messages = [msg for msg in self.history if message_role(msg) == 'user']
+        model_messages = [msg for msg in self.history if message_role(msg) == 'model']
         correct_responses = [msg for msg in model_messages if msg.get('is_correct')]
         
         return {
@@ -127,9 +375,7 @@ class ChatHistory(BaseModel):
     def clear_history(self) -> 'ChatHistory':
         """Clear the chat history."""
         self.history = []
-        self.message_count = 0
         self.last_message_at = None
-        self.updated_at = datetime.datetime.now(datetime.timezone.utc)
         return self.save()
     
     def save(self) -> 'ChatHistory':
@@ -138,6 +384,15 @@ class ChatHistory(BaseModel):
             self.id = self._generate_key_name(self.user_id, self.problem_id)
         return super().save()
     
+    def delete(self) -> None:
+        """Delete the chat history together with its chunks."""
+        if self.id and self._stored_chunk_count:
+            client = get_datastore_client()
+            parent_path = self._chunk_parent_path()
+            client.delete_multi([client.key(*parent_path, ChatHistoryChunk._kind, index)
+                                 for index in range(1, self._stored_chunk_count + 1)])
+        super().delete()
+    
     def to_dict(self, include_history: bool = True) -> dict:
         """Convert chat history to dictionary for API responses."""
         data = {
@@ -0,0 +1,60 @@
+"""
+Compact binary encoding for large unindexed model properties.
+
+Values are stored as a version byte followed by zlib-compressed compact JSON.
+Anything that is not a blob with a known version byte (e.g. records written
+before a property was encoded) is returned unchanged, so old data reads
+transparently.
+
+Datetimes, which Datastore stores natively, are written as
+{"$datetime": ISO 8601} and decoded back to datetimes. Other values JSON
+can't represent raise TypeError when encoded.
+"""
+import datetime
+import json
+import zlib
+from typing import Any, Dict
+
+# Version byte prefixed to every encoded blob
+CODEC_VERSION = 1
+
+_COMPRESSION_LEVEL = 6
+
+# Key of the object a datetime is written as
+_DATETIME_KEY = '$datetime'
+
+
+def _encode_default(value: Any) -> Dict[str, str]:
+    """Write datetimes as tagged ISO 8601 strings; reject anything else JSON can't hold."""
+    if isinstance(value, datetime.datetime):
+        return {_DATETIME_KEY: value.isoformat()}
+    raise TypeError(f"Cannot encode {type(value).__name__} value {value!r}; "
+                    f"encoded fields take JSON values and datetimes")
+
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and _DATETIME_KEY in obj:
+        return datetime.datetime.fromisoformat(obj[_DATETIME_KEY])
+    return obj
+
+
+def encode_value(value: Any) -> bytes:
+    """Encode a JSON-compatible value (datetimes included) as a versioned compressed blob."""
+    payload = json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=_encode_default).encode('utf-8')
+    return bytes([CODEC_VERSION]) + zlib.compress(payload, _COMPRESSION_LEVEL)
+
+
+def is_encoded(value: Any) -> bool:
+    """Return True if value is a blob produced by encode_value."""
+    return isinstance(value, bytes) and len(value) > 1 and value[0] == CODEC_VERSION
+
+
+def decode_value(value: Any) -> Any:
+    """Decode a blob produced by encode_value; other values are returned as-is."""
+    if not is_encoded(value):
+        return value
+    payload = zlib.decompress(value[1:]).decode('utf-8')
+    # Only blobs holding datetimes pay for the object hook
+    if _DATETIME_KEY in payload:
+        return json.loads(payload, object_hook=_decode_object)
+    return json.loads(payload)
\ No newline at end of file
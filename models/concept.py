@@ -3,13 +3,14 @@ Concept model for AI-guided learning pathways.
 """
 import datetime
 from typing import Dict, List, Optional
-from models.base import BaseModel
+from models.base import UNKNOWN, BaseModel
 
 
 class Concept(BaseModel):
     """Model for mathematical concepts that students learn before solving problems."""
     
     _kind = 'Concept'
+    _schema_version = 1
     
     @classmethod
     def _get_required_fields(cls) -> List[str]:
@@ -19,7 +20,9 @@ class Concept(BaseModel):
     @classmethod
     def _get_excluded_indexes(cls) -> List[str]:
         """Return list of fields to exclude from Datastore indexes."""
-        return ['description', 'visual_elements', 'real_world_examples', 'interactive_activities']
+        # Only concept_id, topic, grade and difficulty_level are queried
+        return ['title', 'description', 'prerequisites', 'learning_objectives', 'visual_elements',
+                'real_world_examples', 'interactive_activities', 'created_at', 'updated_at']
     
     def __init__(self, concept_id: str = None, title: str = None, topic: str = None,
                  grade: str = None, description: str = None, prerequisites: List[str] = None,
@@ -38,16 +41,17 @@ class Concept(BaseModel):
         self.visual_elements = visual_elements or {}
         self.real_world_examples = real_world_examples or []
         self.interactive_activities = interactive_activities or []
-        self.created_at = datetime.datetime.now().isoformat()
+        if self.created_at is None:
+            self.created_at = datetime.datetime.now(datetime.timezone.utc)
     
     @classmethod
     def get_by_concept_id(cls, concept_id: str) -> Optional['Concept']:
         """Get a concept by its concept_id."""
         query = cls.query()
         query.add_filter('concept_id', '=', concept_id)
-        entities = list(query.fetch(limit=1))
-        if entities:
-            return cls._from_entity(entities[0])
+        results = cls.fetch(query, limit=1)
+        if results:
+            return results[0]
         return None
     
     @classmethod
@@ -58,8 +62,7 @@ class Concept(BaseModel):
         query.add_filter('grade', '=', grade)
         query.order = ['difficulty_level']
         
-        entities = list(query.fetch())
-        return [cls._from_entity(entity) for entity in entities]
+        return cls.fetch(query)
     
     @classmethod
     def get_prerequisite_concepts(cls, concept_id: str) -> List['Concept']:
@@ -83,12 +86,9 @@ class Concept(BaseModel):
         """Get all concepts that require this concept as a prerequisite."""
         query = cls.query()
         # Note: This would require a more complex query in production
-        # For now, we'll fetch all and filter in memory
-        all_concepts = list(query.fetch())
-        
+        # For now, we'll stream all concepts page by page and filter in memory
         requiring_concepts = []
-        for entity in all_concepts:
-            concept = cls._from_entity(entity)
+        for concept in cls.iter_query(query):
             if concept_id in concept.prerequisites:
                 requiring_concepts.append(concept)
         
@@ -108,7 +108,8 @@ class Concept(BaseModel):
             'visual_elements': self.visual_elements,
             'real_world_examples': self.real_world_examples,
             'interactive_activities': self.interactive_activities,
-            'created_at': self.created_at
+            # Concepts stored before schema version 1 hold an ISO string
+            'created_at': self.created_at.isoformat() if isinstance(self.created_at, datetime.datetime) else self.created_at
         }
 
 
@@ -116,6 +117,7 @@ class ConceptProgress(BaseModel):
     """Model for tracking student progress through concepts."""
     
     _kind = 'ConceptProgress'
+    _schema_version = 1
     
     @classmethod
     def _get_required_fields(cls) -> List[str]:
@@ -125,12 +127,14 @@ class ConceptProgress(BaseModel):
     @classmethod
     def _get_excluded_indexes(cls) -> List[str]:
         """Return list of fields to exclude from Datastore indexes."""
-        return ['notes']
+        # Only user_id is queried
+        return ['concept_id', 'understanding_level', 'confidence_score', 'time_spent_minutes',
+                'attempts_count', 'last_interaction', 'notes', 'created_at', 'updated_at']
     
     def __init__(self, user_id: int = None, concept_id: str = None, 
                  understanding_level: str = 'not_started', confidence_score: int = 0,
                  time_spent_minutes: int = 0, attempts_count: int = 0,
-                 last_interaction: str = None, notes: str = None, **kwargs):
+                 last_interaction: datetime.datetime = None, notes: str = None, **kwargs):
         super().__init__(**kwargs)
         self.user_id = user_id
         self.concept_id = concept_id
@@ -138,20 +142,27 @@ class ConceptProgress(BaseModel):
         self.confidence_score = confidence_score  # 0-100
         self.time_spent_minutes = time_spent_minutes
         self.attempts_count = attempts_count
-        self.last_interaction = last_interaction or datetime.datetime.now().isoformat()
+        self.last_interaction = last_interaction or datetime.datetime.now(datetime.timezone.utc)
         self.notes = notes or ""
-        self.updated_at = datetime.datetime.now().isoformat()
+    
+    @classmethod
+    def _generate_key_name(cls, user_id: int, concept_id: str) -> str:
+        """Generate unique key name for user-concept combination."""
+        return f"{user_id}-{concept_id}"
     
     @classmethod
     def get_user_concept_progress(cls, user_id: int, concept_id: str) -> Optional['ConceptProgress']:
         """Get progress for a specific user and concept."""
-        query = cls.query()
-        query.add_filter('user_id', '=', user_id)
-        query.add_filter('concept_id', '=', concept_id)
-        entities = list(query.fetch(limit=1))
-        if entities:
-            return cls._from_entity(entities[0])
-        return None
+        return cls.get_by_key(cls._generate_key_name(user_id, concept_id))
+    
+    @classmethod
+    def get_progress_for_concepts(cls, user_id: int, concept_ids: List[str]) -> Dict[str, 'ConceptProgress']:
+        """Get progress for multiple concepts with a single batched lookup."""
+        key_names = [cls._generate_key_name(user_id, concept_id) for concept_id in concept_ids]
+        progress_list = cls.get_multi(key_names)
+        
+        # Create a mapping of concept_id to progress
+        return {concept_id: progress for concept_id, progress in zip(concept_ids, progress_list) if progress}
     
     @classmethod
     def get_user_topic_progress(cls, user_id: int, topic: str) -> List['ConceptProgress']:
@@ -160,12 +171,10 @@ class ConceptProgress(BaseModel):
         # For now, we'll implement a simpler version
         query = cls.query()
         query.add_filter('user_id', '=', user_id)
-        entities = list(query.fetch())
         
         # Filter by topic (requires concept lookup)
         progress_list = []
-        for entity in entities:
-            progress = cls._from_entity(entity)
+        for progress in cls.iter_query(query):
             concept = Concept.get_by_concept_id(progress.concept_id)
             if concept and concept.topic == topic:
                 progress_list.append(progress)
@@ -175,23 +184,20 @@ class ConceptProgress(BaseModel):
     @classmethod
     def create_or_update_progress(cls, user_id: int, concept_id: str, 
                                 understanding_level: str, confidence_score: int = None,
-                                time_spent_minutes: int = None) -> 'ConceptProgress':
+                                time_spent_minutes: int = None, current=UNKNOWN) -> 'ConceptProgress':
         """Create or update concept progress for a user."""
-        existing = cls.get_user_concept_progress(user_id, concept_id)
-        
-        if existing:
-            # Update existing progress
-            existing.understanding_level = understanding_level
-            if confidence_score is not None:
-                existing.confidence_score = confidence_score
-            if time_spent_minutes is not None:
-                existing.time_spent_minutes += time_spent_minutes
-            existing.attempts_count += 1
-            existing.last_interaction = datetime.datetime.now().isoformat()
-            existing.updated_at = datetime.datetime.now().isoformat()
-            existing.save()
-            return existing
-        else:
+        def apply_progress(existing):
+            if existing:
+                # Update existing progress
+                existing.understanding_level = understanding_level
+                if confidence_score is not None:
+                    existing.confidence_score = confidence_score
+                if time_spent_minutes is not None:
+                    existing.time_spent_minutes += time_spent_minutes
+                existing.attempts_count += 1
+                existing.last_interaction = datetime.datetime.now(datetime.timezone.utc)
+                return existing
+            
             # Create new progress
             progress = cls(
                 user_id=user_id,
@@ -201,8 +207,16 @@ class ConceptProgress(BaseModel):
                 time_spent_minutes=time_spent_minutes or 0,
                 attempts_count=1
             )
-            progress.save()
+            progress.id = cls._generate_key_name(user_id, concept_id)
             return progress
+        
+        return cls.upsert(cls._generate_key_name(user_id, concept_id), apply_progress, current=current)
+    
+    def save(self) -> 'ConceptProgress':
+        """Override save to handle composite key."""
+        if not self.id:
+            self.id = self._generate_key_name(self.user_id, self.concept_id)
+        return super().save()
     
     def to_dict(self) -> Dict:
         """Convert progress to dictionary for API responses."""
@@ -213,7 +227,9 @@ class ConceptProgress(BaseModel):
             'confidence_score': self.confidence_score,
             'time_spent_minutes': self.time_spent_minutes,
             'attempts_count': self.attempts_count,
-            'last_interaction': self.last_interaction,
+            # Records stored before schema version 1 hold ISO strings
+            'last_interaction': (self.last_interaction.isoformat()
+                                 if isinstance(self.last_interaction, datetime.datetime) else self.last_interaction),
             'notes': self.notes,
-            'updated_at': self.updated_at
+            'updated_at': self.updated_at.isoformat() if isinstance(self.updated_at, datetime.datetime) else self.updated_at
         }
\ No newline at end of file
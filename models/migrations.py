@@ -0,0 +1,109 @@
+"""
+Versioned transforms of stored entities, applied online by scripts/migrate.py.
+
+A model whose stored format changes sets `_schema_version`; the entities it
+writes carry that version in the schema_version property, and entities stored
+before carry the version they were written with (no property at all means 0).
+Each migration upgrades one kind from version - 1 to version by editing the
+raw entity in place. Readers of a kind accept every version that may still be
+stored until its migration has run, so formats converge without downtime.
+"""
+import datetime
+from typing import Callable, Dict, List
+
+from google.cloud import datastore
+
+from .base import SCHEMA_VERSION_FIELD
+from .chat_history import ChatHistoryChunk, normalize_message
+from .codec import decode_value, encode_value
+from .concept import Concept, ConceptProgress
+
+
+class Migration:
+    """One versioned transform of the entities of a kind."""
+    
+    __slots__ = ('model_cls', 'version', 'description', 'transform')
+    
+    def __init__(self, model_cls: type, version: int, description: str,
+                 transform: Callable[[datastore.Entity], None]):
+        self.model_cls = model_cls
+        self.version = version
+        self.description = description
+        self.transform = transform
+    
+    def __repr__(self) -> str:
+        return f"Migration({self.model_cls._kind} v{self.version}: {self.description})"
+
+
+# Registered migrations by kind, then version
+MIGRATIONS: Dict[str, Dict[int, Migration]] = {}
+
+
+def migration(model_cls: type, version: int, description: str):
+    """Register the decorated function as the transform upgrading model_cls entities to version."""
+    def register(transform: Callable[[datastore.Entity], None]) -> Callable[[datastore.Entity], None]:
+        versions = MIGRATIONS.setdefault(model_cls._kind, {})
+        if version in versions:
+            raise ValueError(f"{model_cls._kind} already has a version {version} migration")
+        versions[version] = Migration(model_cls, version, description, transform)
+        return transform
+    return register
+
+
+def migrations_for(model_cls: type) -> List[Migration]:
+    """Return the migrations leading up to the model's current schema version, in order."""
+    versions = MIGRATIONS.get(model_cls._kind, {})
+    missing = [version for version in range(1, model_cls._schema_version + 1) if version not in versions]
+    if missing:
+        raise ValueError(f"{model_cls._kind} is at schema version {model_cls._schema_version} "
+                         f"but has no migration to version {missing[0]}")
+    return [versions[version] for version in range(1, model_cls._schema_version + 1)]
+
+
+def entity_version(entity: datastore.Entity) -> int:
+    """Return the schema version an entity was stored with."""
+    return entity.get(SCHEMA_VERSION_FIELD) or 0
+
+
+def migrate_entity(entity: datastore.Entity, steps: List[Migration]) -> bool:
+    """Apply the steps the entity hasn't had yet; return True if it needs to be written."""
+    version = entity_version(entity)
+    pending = [step for step in steps if step.version > version]
+    if not pending:
+        return False
+    
+    for step in pending:
+        step.transform(entity)
+    entity[SCHEMA_VERSION_FIELD] = pending[-1].version
+    entity.exclude_from_indexes.add(SCHEMA_VERSION_FIELD)
+    return True
+
+
+def _parse_timestamp(value):
+    """Parse an ISO timestamp string; naive values were written in server (UTC) time."""
+    if not isinstance(value, str):
+        return value
+    parsed = datetime.datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=datetime.timezone.utc)
+
+
+def _parse_timestamps(entity: datastore.Entity, fields: List[str]) -> None:
+    for field in fields:
+        if isinstance(entity.get(field), str):
+            entity[field] = _parse_timestamp(entity[field])
+
+
+@migration(ChatHistoryChunk, 1, "store tutor-mode {sender, message} chat messages as {role, parts}")
+def _chat_messages_as_role_parts(entity: datastore.Entity) -> None:
+    messages = decode_value(entity.get('messages')) or []
+    entity['messages'] = encode_value([normalize_message(message) for message in messages])
+
+
+@migration(Concept, 1, "store created_at and updated_at ISO strings as timestamps")
+def _concept_timestamps(entity: datastore.Entity) -> None:
+    _parse_timestamps(entity, ['created_at', 'updated_at'])
+
+
+@migration(ConceptProgress, 1, "store last_interaction, created_at and updated_at ISO strings as timestamps")
+def _concept_progress_timestamps(entity: datastore.Entity) -> None:
+    _parse_timestamps(entity, ['last_interaction', 'created_at', 'updated_at'])
\ No newline at end of file
@@ -2,25 +2,35 @@
 Problem progress model for tracking user progress on problems.
 """
 import datetime
-from typing import Dict, List, Optional
-from .base import BaseModel
+from typing import Dict, Iterator, List, Optional, Tuple
+from .base import DEFAULT_PAGE_SIZE, UNKNOWN, BaseModel, upsert_models
+from .user_progress_summary import UserProgressSummary
 
 
 class ProblemProgress(BaseModel):
     """Model for tracking user progress on individual problems."""
     
     _kind = 'ProblemProgress'
+    _versioned = True
+    _counter_fields = ('attempts',)
     
-    def __init__(self, **kwargs):
-        """Initialize ProblemProgress model."""
-        super().__init__(**kwargs)
-        
-        # Progress-specific fields
-        self.user_id: int = kwargs.get('user_id')
-        self.problem_id: str = kwargs.get('problem_id')
-        self.status: str = kwargs.get('status')  # 'in_progress', 'mastered'
-        self.attempts: int = kwargs.get('attempts', 0)
-        self.last_attempt_at: Optional[datetime.datetime] = kwargs.get('last_attempt_at')
+    # Progress-specific fields and their defaults
+    _fields = {
+        'user_id': None,
+        'problem_id': None,
+        'status': None,  # 'in_progress', 'mastered'
+        'topic': None,  # topic the problem counts towards in UserProgressSummary
+        'attempts': 0,
+        'last_attempt_at': None,
+    }
+    __slots__ = tuple(_fields)
+    
+    user_id: int
+    problem_id: str
+    status: str
+    topic: Optional[str]
+    attempts: int
+    last_attempt_at: Optional[datetime.datetime]
     
     @classmethod
     def _get_required_fields(cls) -> List[str]:
@@ -30,7 +40,8 @@ class ProblemProgress(BaseModel):
     @classmethod
     def _get_excluded_indexes(cls) -> List[str]:
         """Return list of fields to exclude from Datastore indexes."""
-        return []  # Index all fields for querying
+        # Queries filter on user_id/status, project problem_id/status and sort by updated_at
+        return ['topic', 'attempts', 'last_attempt_at', 'created_at']
     
     @classmethod
     def _generate_key_name(cls, user_id: int, problem_id: str) -> str:
@@ -49,8 +60,34 @@ class ProblemProgress(BaseModel):
         query = cls.query()
         query.add_filter('user_id', '=', user_id)
         
-        entities = list(query.fetch())
-        return [cls._from_entity(entity) for entity in entities]
+        return cls.fetch(query)
+    
+    @classmethod
+    def iter_user_progress(cls, user_id: int, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator['ProblemProgress']:
+        """Yield all progress records for a user, one cursor page at a time."""
+        query = cls.query()
+        query.add_filter('user_id', '=', user_id)
+        
+        return cls.iter_query(query, page_size)
+    
+    @classmethod
+    def get_status_page(cls, user_id: int, page_size: int = DEFAULT_PAGE_SIZE,
+                        cursor: Optional[str] = None) -> Tuple[Dict[str, str], Optional[str]]:
+        """Get one page of a user's problem_id -> status map and the cursor for the next page."""
+        query = cls.query()
+        query.add_filter('user_id', '=', user_id)
+        
+        rows, next_cursor = cls.fetch_page(query, page_size, cursor, projection=['problem_id', 'status'])
+        return {row['problem_id']: row['status'] for row in rows}, next_cursor
+    
+    @classmethod
+    def get_status_map(cls, user_id: int) -> Dict[str, str]:
+        """Get a map of problem_id -> status for all of a user's progress (projection query)."""
+        query = cls.query()
+        query.add_filter('user_id', '=', user_id)
+        
+        rows = cls.fetch_projection(query, ['problem_id', 'status'])
+        return {row['problem_id']: row['status'] for row in rows}
     
     @classmethod
     def get_user_progress_by_status(cls, user_id: int, status: str) -> List['ProblemProgress']:
@@ -59,8 +96,7 @@ class ProblemProgress(BaseModel):
         query.add_filter('user_id', '=', user_id)
         query.add_filter('status', '=', status)
         
-        entities = list(query.fetch())
-        return [cls._from_entity(entity) for entity in entities]
+        return cls.fetch(query)
     
     @classmethod
     def get_recent_user_progress(cls, user_id: int, limit: int = 5) -> List['ProblemProgress']:
@@ -69,8 +105,7 @@ class ProblemProgress(BaseModel):
         query.add_filter('user_id', '=', user_id)
         query.order = ['-updated_at']
         
-        entities = list(query.fetch(limit=limit))
-        return [cls._from_entity(entity) for entity in entities]
+        return cls.fetch(query, limit=limit)
     
     @classmethod
     def get_progress_for_problems(cls, user_id: int, problem_ids: List[str]) -> Dict[str, 'ProblemProgress']:
@@ -87,32 +122,66 @@ class ProblemProgress(BaseModel):
         return progress_map
     
     @classmethod
-    def create_or_update_progress(cls, user_id: int, problem_id: str, status: str) -> 'ProblemProgress':
-        """Create new progress or update existing one."""
-        key_name = cls._generate_key_name(user_id, problem_id)
+    def create_or_update_progress(cls, user_id: int, problem_id: str, status: str,
+                                  topic: Optional[str] = None, current=UNKNOWN,
+                                  current_summary=UNKNOWN) -> 'ProblemProgress':
+        """
+        Create new progress or update existing one.
         
-        # Try to get existing progress
-        progress = cls.get_by_key(key_name)
+        topic is stored with the progress for the per-topic counts (existing
+        progress keeps its topic when None). The user's UserProgressSummary
+        is updated in the same write, or its unbuilt placeholder is created
+        or bumped (see UserProgressSummary). Callers that already hold the
+        current progress and summary (None if missing) can pass them to skip
+        the read, see upsert_models.
+        """
+        def apply_attempt(models):
+            progress, summary = models
+            previous_status = progress.status if progress else None
+            progress = cls.record_attempt(progress, user_id, problem_id, status, topic)
+            return [progress, cls.apply_to_summary(summary, progress, previous_status)]
+        
+        return upsert_models([
+            (cls, cls._generate_key_name(user_id, problem_id)),
+            (UserProgressSummary, UserProgressSummary._generate_key_name(user_id))
+        ], apply_attempt, known=[current, current_summary])[0]
+    
+    @classmethod
+    def record_attempt(cls, progress: Optional['ProblemProgress'], user_id: int,
+                       problem_id: str, status: str, topic: Optional[str] = None) -> 'ProblemProgress':
+        """Apply one attempt to existing progress (or start new progress) without saving."""
+        now = datetime.datetime.now(datetime.timezone.utc)
         
         if progress:
             # Update existing progress
             progress.status = status
             progress.attempts += 1
-            progress.last_attempt_at = datetime.datetime.now(datetime.timezone.utc)
-            progress.updated_at = datetime.datetime.now(datetime.timezone.utc)
+            progress.last_attempt_at = now
+            if topic:
+                progress.topic = topic
         else:
             # Create new progress
             progress = cls(
                 user_id=user_id,
                 problem_id=problem_id,
                 status=status,
+                topic=topic,
                 attempts=1,
-                last_attempt_at=datetime.datetime.now(datetime.timezone.utc)
+                last_attempt_at=now
             )
             # Set the ID to the key name for composite key
-            progress.id = key_name
+            progress.id = cls._generate_key_name(user_id, problem_id)
         
-        return progress.save()
+        return progress
+    
+    @staticmethod
+    def apply_to_summary(summary: Optional[UserProgressSummary], progress: 'ProblemProgress',
+                         previous_status: Optional[str]) -> UserProgressSummary:
+        """Count an attempt in the user's summary, or in its unbuilt placeholder (created if missing)."""
+        if summary is None or not summary.built:
+            return UserProgressSummary.mark_unbuilt_write(summary, progress.user_id)
+        return summary.record_status_change(progress.problem_id, progress.topic, previous_status,
+                                            progress.status, progress.last_attempt_at)
     
     @classmethod
     def get_topic_summary(cls, user_id: int, problem_ids: List[str]) -> Dict[str, int]:
@@ -0,0 +1,31 @@
+"""
+Pluggable storage backends for the data access layer.
+
+BaseModel talks to storage through the StorageBackend interface; which
+engine it uses is chosen by STORAGE_BACKEND in config/settings.py.
+"""
+from .base import StorageBackend
+from .memory import MemoryBackend
+from .sqlite import SQLiteBackend
+
+# Names accepted by STORAGE_BACKEND
+BACKENDS = ('datastore', 'memory', 'sqlite')
+
+
+def create_backend(name: str = None) -> StorageBackend:
+    """Create the storage backend configured in config/settings.py (or the one named)."""
+    from config.settings import Config
+    
+    name = (name or Config.STORAGE_BACKEND).lower()
+    if name == 'datastore':
+        from google.cloud import datastore
+        return datastore.Client()
+    if name == 'memory':
+        return MemoryBackend(latency_ms=Config.MEMORY_BACKEND_LATENCY_MS,
+                             failure_rate=Config.MEMORY_BACKEND_FAILURE_RATE)
+    if name == 'sqlite':
+        return SQLiteBackend(Config.SQLITE_PATH)
+    raise ValueError(f"Unknown storage backend {name!r}; expected one of {', '.join(BACKENDS)}")
+
+
+__all__ = ['StorageBackend', 'MemoryBackend', 'SQLiteBackend', 'create_backend', 'BACKENDS']
\ No newline at end of file
@@ -0,0 +1,231 @@
+"""
+Storage backend interface and the query engine shared by the local backends.
+"""
+import base64
+import copy
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from google.cloud import datastore
+
+# Project name put on keys created by the local backends
+LOCAL_PROJECT = 'local'
+
+# Filter operators the local backends evaluate
+_OPERATORS = {
+    '=': lambda value, target: value == target,
+    '!=': lambda value, target: value != target,
+    '<': lambda value, target: value < target,
+    '<=': lambda value, target: value <= target,
+    '>': lambda value, target: value > target,
+    '>=': lambda value, target: value >= target,
+    'in': lambda value, target: value in target,
+    'not_in': lambda value, target: value not in target,
+}
+
+
+class StorageBackend(ABC):
+    """
+    Storage engine behind BaseModel.
+    
+    The interface is the subset of google.cloud.datastore.Client that the
+    models use: key, get/get_multi, put/put_multi, delete/delete_multi,
+    query(kind=...) with filters, order, projection, keys-only and cursors,
+    allocate_ids and transaction(). Entities and keys are google.cloud.datastore objects
+    for every backend, so models don't know which engine they run on.
+    """
+    
+    def __init__(self, project: str = LOCAL_PROJECT):
+        self.project = project
+        self._thread_state = threading.local()
+    
+    @property
+    def current_transaction(self):
+        """The transaction open in the calling thread, like the Datastore client's batch stack."""
+        return getattr(self._thread_state, 'transaction', None)
+    
+    @current_transaction.setter
+    def current_transaction(self, transaction) -> None:
+        self._thread_state.transaction = transaction
+    
+    def key(self, *path_args) -> datastore.Key:
+        """Create a key; pass kind/id pairs, ending with a kind for a partial key."""
+        return datastore.Key(*path_args, project=self.project)
+    
+    def get(self, key: datastore.Key) -> Optional[datastore.Entity]:
+        """Get one entity, or None if it doesn't exist."""
+        found = self.get_multi([key])
+        return found[0] if found else None
+    
+    @abstractmethod
+    def get_multi(self, keys: List[datastore.Key]) -> List[datastore.Entity]:
+        """Get the entities that exist for keys, in no particular order."""
+    
+    def put(self, entity: datastore.Entity) -> None:
+        """Write one entity."""
+        self.put_multi([entity])
+    
+    @abstractmethod
+    def put_multi(self, entities: List[datastore.Entity]) -> None:
+        """Write entities, completing partial keys in place."""
+    
+    def delete(self, key: datastore.Key) -> None:
+        """Delete one entity."""
+        self.delete_multi([key])
+    
+    @abstractmethod
+    def delete_multi(self, keys: List[datastore.Key]) -> None:
+        """Delete entities; missing keys are ignored."""
+    
+    @abstractmethod
+    def allocate_ids(self, incomplete_key: datastore.Key, num_ids: int) -> List[datastore.Key]:
+        """Reserve num_ids complete keys for a partial key."""
+    
+    @abstractmethod
+    def transaction(self):
+        """Return a context manager that commits the writes made inside it atomically."""
+    
+    def query(self, kind: str) -> 'Query':
+        """Create a query over one kind."""
+        return Query(self, kind)
+    
+    @abstractmethod
+    def _run_query(self, query: 'Query', offset: int, limit: Optional[int]) -> List[datastore.Entity]:
+        """Return the window [offset, offset + limit) of a query's sorted, filtered results."""
+
+
+# The Datastore client already implements the interface
+StorageBackend.register(datastore.Client)
+
+
+class Query:
+    """Datastore-compatible query evaluated by a local backend."""
+    
+    def __init__(self, backend: StorageBackend, kind: str):
+        self._backend = backend
+        self.kind = kind
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.order: List[str] = []
+        self.projection: List[str] = []
+        self._keys_only = False
+    
+    def add_filter(self, property_name: str, operator: str, value: Any) -> 'Query':
+        """Add a property filter; operators are those of Datastore."""
+        if operator not in _OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {operator}")
+        self.filters.append((property_name, operator, value))
+        return self
+    
+    def keys_only(self) -> None:
+        """Return only keys from this query."""
+        self.projection = ['__key__']
+        self._keys_only = True
+    
+    def fetch(self, limit: Optional[int] = None, start_cursor: Any = None) -> 'QueryIterator':
+        """Run the query from start_cursor, returning at most limit entities."""
+        offset = decode_cursor(start_cursor)
+        entities = self._backend._run_query(self, offset, limit)
+        return QueryIterator(self, entities, offset, limit)
+
+
+class QueryIterator:
+    """Results of one Query.fetch, iterable directly or page by page."""
+    
+    def __init__(self, query: Query, entities: List[datastore.Entity], offset: int, limit: Optional[int]):
+        self._entities = [project_entity(entity, query) for entity in entities]
+        self.next_page_token = None
+        # A full page may be followed by more results
+        if limit is not None and len(entities) == limit:
+            self.next_page_token = encode_cursor(offset + len(entities))
+    
+    def __iter__(self) -> Iterator[datastore.Entity]:
+        return iter(self._entities)
+    
+    @property
+    def pages(self) -> Iterator[List[datastore.Entity]]:
+        """Yield the fetched entities as a single page."""
+        yield self._entities
+
+
+def encode_cursor(offset: int) -> bytes:
+    """Encode a result offset as an opaque URL-safe cursor."""
+    return base64.urlsafe_b64encode(str(offset).encode('ascii'))
+
+
+def decode_cursor(cursor: Any) -> int:
+    """Decode a cursor made by encode_cursor (None starts at the beginning)."""
+    if not cursor:
+        return 0
+    if isinstance(cursor, str):
+        cursor = cursor.encode('ascii')
+    try:
+        return int(base64.urlsafe_b64decode(cursor).decode('ascii'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid query cursor")
+
+
+def is_indexed(entity: datastore.Entity, property_name: str) -> bool:
+    """Whether Datastore has an index entry for the property: it is set and not excluded from indexes."""
+    return property_name in entity and property_name not in entity.exclude_from_indexes
+
+
+def matches(entity: datastore.Entity, filters: Iterable[Tuple[str, str, Any]]) -> bool:
+    """Check an entity against property filters; a missing or unindexed property never matches."""
+    for property_name, operator, target in filters:
+        if not is_indexed(entity, property_name):
+            return False
+        value = entity[property_name]
+        try:
+            # List properties match when any of their values does
+            values = value if isinstance(value, list) else [value]
+            if not any(_OPERATORS[operator](item, target) for item in values):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def sort_entities(entities: List[datastore.Entity], order: Iterable[str]) -> List[datastore.Entity]:
+    """Sort entities by Datastore order strings ('-' for descending), then by key."""
+    order = list(order)
+    # Datastore leaves out entities that don't have an ordered property in its index
+    entities = [entity for entity in entities if all(is_indexed(entity, name.lstrip('-')) for name in order)]
+    entities.sort(key=lambda entity: tuple(_sort_value(part) for part in entity.key.flat_path))
+    for name in reversed(order):
+        entities.sort(key=lambda entity: _sort_value(entity[name.lstrip('-')]), reverse=name.startswith('-'))
+    return entities
+
+
+def _sort_value(value: Any) -> Tuple:
+    """Sort key that keeps None and values of different types comparable."""
+    if value is None:
+        return (0, '')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (1, value)
+    return (2, type(value).__name__, value)
+
+
+def in_projection(entity: datastore.Entity, query: Query) -> bool:
+    """Whether a projection query returns the entity: it is answered from the index of every projected property."""
+    if query._keys_only or not query.projection:
+        return True
+    return all(is_indexed(entity, name) for name in query.projection)
+
+
+def project_entity(entity: datastore.Entity, query: Query) -> datastore.Entity:
+    """Copy an entity for a query result, keeping only projected properties."""
+    result = datastore.Entity(key=entity.key, exclude_from_indexes=tuple(entity.exclude_from_indexes))
+    if query._keys_only:
+        return result
+    if query.projection:
+        result.update({name: entity[name] for name in query.projection if name in entity})
+    else:
+        result.update(entity)
+    return result
+
+
+def copy_entity(entity: datastore.Entity) -> datastore.Entity:
+    """Deep-copy an entity so stored and returned values never alias."""
+    result = datastore.Entity(key=entity.key, exclude_from_indexes=tuple(entity.exclude_from_indexes))
+    result.update(copy.deepcopy(dict(entity)))
+    return result
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+In-memory storage backend for benchmarks, load tests and local development.
+"""
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from google.api_core import exceptions as api_exceptions
+from google.cloud import datastore
+from .base import LOCAL_PROJECT, Query, StorageBackend, copy_entity, in_projection, matches, sort_entities
+
+
+class MemoryTransaction:
+    """Optimistic transaction: buffers writes and aborts if anything it read has changed."""
+    
+    def __init__(self, backend: 'MemoryBackend'):
+        self._backend = backend
+        self._read_versions: Dict[Tuple, int] = {}
+        self._writes: List[datastore.Entity] = []
+        self._deletes: List[datastore.Key] = []
+    
+    def __enter__(self) -> 'MemoryTransaction':
+        if self._backend.current_transaction is not None:
+            raise ValueError("Nested transactions are not supported")
+        self._backend._rpc('begin_transaction')
+        self._backend.current_transaction = self
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._backend.current_transaction = None
+        if exc_type:
+            self._backend._rpc('rollback')
+            return False
+        self._backend._commit(self._writes, self._deletes, self._read_versions)
+        return False
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Storage backend that keeps entities in a dict.
+    
+    Every call that would be an RPC on Datastore is counted in `rpcs`, waits
+    `latency_ms`, and fails with ServiceUnavailable with probability
+    `failure_rate`; inject_failure makes specific RPCs fail deterministically.
+    """
+    
+    def __init__(self, latency_ms: float = 0.0, failure_rate: float = 0.0,
+                 seed: Optional[int] = None, project: str = LOCAL_PROJECT):
+        super().__init__(project)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.rpcs: Counter = Counter()
+        self.entities: Dict[Tuple, datastore.Entity] = {}
+        self._versions: Dict[Tuple, int] = {}
+        self._injected: Dict[str, List[Exception]] = {}
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+    
+    def inject_failure(self, rpc: str, exception: Optional[Exception] = None, times: int = 1) -> None:
+        """Make the next `times` calls of an RPC ('lookup', 'commit', 'run_query', ...) raise."""
+        exception = exception or api_exceptions.ServiceUnavailable(f"Injected {rpc} failure")
+        self._injected.setdefault(rpc, []).extend([exception] * times)
+    
+    def _rpc(self, name: str) -> None:
+        """Account for one RPC: count it, wait the configured latency and maybe fail."""
+        self.rpcs[name] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if self._injected.get(name):
+            raise self._injected[name].pop(0)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise api_exceptions.ServiceUnavailable(f"Injected {name} failure")
+    
+    def get_multi(self, keys: List[datastore.Key]) -> List[datastore.Entity]:
+        """Get the entities that exist for keys."""
+        self._rpc('lookup')
+        transaction = self.current_transaction
+        found = []
+        with self._lock:
+            if transaction is not None:
+                # Datastore reads a transaction from one snapshot; abort as soon as that no longer holds
+                for path, version in transaction._read_versions.items():
+                    if self._versions.get(path, 0) != version:
+                        raise api_exceptions.Aborted(f"Entity {path} changed during the transaction")
+            for key in keys:
+                path = key.flat_path
+                if transaction is not None:
+                    transaction._read_versions.setdefault(path, self._versions.get(path, 0))
+                if path in self.entities:
+                    found.append(copy_entity(self.entities[path]))
+        return found
+    
+    def put_multi(self, entities: List[datastore.Entity]) -> None:
+        """Write entities, or buffer them until commit inside a transaction."""
+        for entity in entities:
+            if entity.key.is_partial:
+                entity.key = entity.key.completed_key(next(self._ids))
+        if self.current_transaction is not None:
+            self.current_transaction._writes.extend(copy_entity(entity) for entity in entities)
+            return
+        self._commit([copy_entity(entity) for entity in entities], [], {})
+    
+    def delete_multi(self, keys: List[datastore.Key]) -> None:
+        """Delete entities, or buffer the deletes until commit inside a transaction."""
+        if self.current_transaction is not None:
+            self.current_transaction._deletes.extend(keys)
+            return
+        self._commit([], keys, {})
+    
+    def allocate_ids(self, incomplete_key: datastore.Key, num_ids: int) -> List[datastore.Key]:
+        """Reserve numeric IDs for a partial key."""
+        self._rpc('allocate_ids')
+        return [incomplete_key.completed_key(next(self._ids)) for _ in range(num_ids)]
+    
+    def transaction(self) -> MemoryTransaction:
+        """Start an optimistic transaction."""
+        return MemoryTransaction(self)
+    
+    def _commit(self, writes: List[datastore.Entity], deletes: List[datastore.Key],
+                read_versions: Dict[Tuple, int]) -> None:
+        """Apply writes and deletes atomically, aborting if a read entity changed since."""
+        self._rpc('commit')
+        with self._lock:
+            for path, version in read_versions.items():
+                if self._versions.get(path, 0) != version:
+                    raise api_exceptions.Aborted(f"Entity {path} changed during the transaction")
+            for entity in writes:
+                path = entity.key.flat_path
+                self.entities[path] = entity
+                self._versions[path] = self._versions.get(path, 0) + 1
+            for key in deletes:
+                path = key.flat_path
+                if self.entities.pop(path, None) is not None:
+                    self._versions[path] = self._versions.get(path, 0) + 1
+    
+    def _run_query(self, query: Query, offset: int, limit: Optional[int]) -> List[datastore.Entity]:
+        """Scan the kind, then filter, sort and window the results."""
+        self._rpc('run_query')
+        with self._lock:
+            candidates = [copy_entity(entity) for entity in self.entities.values()
+                          if entity.key.flat_path[-2] == query.kind and matches(entity, query.filters)
+                          and in_projection(entity, query)]
+        results = sort_entities(candidates, query.order)
+        end = offset + limit if limit is not None else None
+        return results[offset:end]
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+SQLite storage backend for single-node deployments.
+"""
+import datetime
+import json
+import pickle
+import sqlite3
+import threading
+from typing import Any, List, Optional, Tuple
+from google.cloud import datastore
+from .base import LOCAL_PROJECT, Query, StorageBackend, in_projection, is_indexed, matches, sort_entities
+
+# Entity properties copied into their own indexed columns (NULL where the entity doesn't index them)
+INDEXED_COLUMNS = ('user_id', 'updated_at')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    path TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id,
+    updated_at TEXT,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entities_kind_user_updated ON entities (kind, user_id, updated_at);
+CREATE INDEX IF NOT EXISTS entities_kind_updated ON entities (kind, updated_at);
+CREATE TABLE IF NOT EXISTS id_sequences (
+    kind TEXT PRIMARY KEY,
+    next_id INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteTransaction:
+    """Serializable transaction: holds the database write lock until it ends."""
+    
+    def __init__(self, backend: 'SQLiteBackend'):
+        self._backend = backend
+    
+    def __enter__(self) -> 'SQLiteTransaction':
+        if self._backend.current_transaction is not None:
+            raise ValueError("Nested transactions are not supported")
+        self._backend._lock.acquire()
+        self._backend._connection.execute('BEGIN IMMEDIATE')
+        self._backend.current_transaction = self
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._backend.current_transaction = None
+        try:
+            self._backend._connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self._backend._lock.release()
+        return False
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Storage backend that keeps entities in one SQLite table.
+    
+    Properties are pickled into a single column; user_id and updated_at are
+    also stored in indexed columns so per-user queries and updated_at
+    ordering are answered by SQLite. Other filters, orders and projections
+    are applied in Python to the rows of the kind (narrowed by user_id when
+    filtered). Like Datastore, queries skip entities whose filtered, ordered
+    or projected properties are excluded from indexes; the columns are only
+    set where the entity indexes the property.
+    """
+    
+    def __init__(self, path: str = 'ai_tutor.sqlite3', project: str = LOCAL_PROJECT):
+        super().__init__(project)
+        self.path = path
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.executescript(_SCHEMA)
+    
+    def _execute(self, sql: str, parameters: Tuple = ()) -> List[Tuple]:
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+    
+    def _write(self, statements: List[Tuple[str, Tuple]]) -> None:
+        """Run write statements atomically, joining the current transaction if any."""
+        with self._lock:
+            if self.current_transaction is not None:
+                for sql, parameters in statements:
+                    self._connection.execute(sql, parameters)
+                return
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                for sql, parameters in statements:
+                    self._connection.execute(sql, parameters)
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+    
+    def get_multi(self, keys: List[datastore.Key]) -> List[datastore.Entity]:
+        """Get the entities that exist for keys."""
+        if not keys:
+            return []
+        paths = [_path_text(key) for key in keys]
+        placeholders = ','.join('?' * len(paths))
+        rows = self._execute(f'SELECT path, data FROM entities WHERE path IN ({placeholders})', tuple(paths))
+        return [self._to_entity(path, data) for path, data in rows]
+    
+    def put_multi(self, entities: List[datastore.Entity]) -> None:
+        """Write entities, completing partial keys in place."""
+        statements = []
+        for entity in entities:
+            if entity.key.is_partial:
+                entity.key = entity.key.completed_key(self._allocate_id(entity.key.kind))
+            data = pickle.dumps((dict(entity), list(entity.exclude_from_indexes)), pickle.HIGHEST_PROTOCOL)
+            user_id, updated_at = (_column_value(entity[name]) if is_indexed(entity, name) else None
+                                   for name in INDEXED_COLUMNS)
+            statements.append((
+                'INSERT OR REPLACE INTO entities (path, kind, user_id, updated_at, data) VALUES (?, ?, ?, ?, ?)',
+                (_path_text(entity.key), entity.key.kind, user_id, updated_at, data)))
+        self._write(statements)
+    
+    def delete_multi(self, keys: List[datastore.Key]) -> None:
+        """Delete entities; missing keys are ignored."""
+        self._write([('DELETE FROM entities WHERE path = ?', (_path_text(key),)) for key in keys])
+    
+    def allocate_ids(self, incomplete_key: datastore.Key, num_ids: int) -> List[datastore.Key]:
+        """Reserve numeric IDs for a partial key."""
+        return [incomplete_key.completed_key(self._allocate_id(incomplete_key.kind)) for _ in range(num_ids)]
+    
+    def transaction(self) -> SQLiteTransaction:
+        """Start a transaction."""
+        return SQLiteTransaction(self)
+    
+    def _allocate_id(self, kind: str) -> int:
+        """Allocate the next numeric ID for a kind."""
+        with self._lock:
+            rows = self._execute('SELECT next_id FROM id_sequences WHERE kind = ?', (kind,))
+            next_id = rows[0][0] if rows else 1
+            self._execute('INSERT OR REPLACE INTO id_sequences (kind, next_id) VALUES (?, ?)', (kind, next_id + 1))
+        return next_id
+    
+    def _run_query(self, query: Query, offset: int, limit: Optional[int]) -> List[datastore.Entity]:
+        """Push user_id filters and updated_at ordering down to SQLite, evaluate the rest in Python."""
+        where = ['kind = ?']
+        parameters: List[Any] = [query.kind]
+        remaining = []
+        for property_name, operator, value in query.filters:
+            if property_name in INDEXED_COLUMNS and operator == '=':
+                where.append(f'{property_name} = ?')
+                parameters.append(_column_value(value))
+            else:
+                remaining.append((property_name, operator, value))
+        
+        sql = f"SELECT path, data FROM entities WHERE {' AND '.join(where)}"
+        pushed_down = (not remaining and [name.lstrip('-') for name in query.order] in ([], ['updated_at'])
+                       and (query._keys_only or not query.projection))
+        if pushed_down:
+            if query.order:
+                direction = 'DESC' if query.order[0].startswith('-') else 'ASC'
+                sql += f' AND updated_at IS NOT NULL ORDER BY updated_at {direction}, path'
+            else:
+                sql += ' ORDER BY path'
+            sql += ' LIMIT ? OFFSET ?'
+            parameters.extend([limit if limit is not None else -1, offset])
+            return [self._to_entity(path, data) for path, data in self._execute(sql, tuple(parameters))]
+        
+        entities = [self._to_entity(path, data) for path, data in self._execute(sql, tuple(parameters))]
+        results = sort_entities([entity for entity in entities
+                                 if matches(entity, remaining) and in_projection(entity, query)], query.order)
+        end = offset + limit if limit is not None else None
+        return results[offset:end]
+    
+    def _to_entity(self, path: str, data: bytes) -> datastore.Entity:
+        properties, exclude_from_indexes = pickle.loads(data)
+        entity = datastore.Entity(key=self.key(*json.loads(path)), exclude_from_indexes=tuple(exclude_from_indexes))
+        entity.update(properties)
+        return entity
+
+
+def _path_text(key: datastore.Key) -> str:
+    """Serialize a key path to the primary key column."""
+    return json.dumps(list(key.flat_path), separators=(',', ':'))
+
+
+def _column_value(value: Any) -> Any:
+    """Convert a property value for an indexed column so SQLite orders it correctly."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value.isoformat(sep=' ', timespec='microseconds')
+    return value
\ No newline at end of file
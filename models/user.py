@@ -1,10 +1,11 @@
 """
 User model for authentication and user management.
 """
-import datetime
 from typing import List, Optional
 from werkzeug.security import generate_password_hash, check_password_hash
-from .base import BaseModel
+from .base import BaseModel, get_current_session, get_multi_models, put_multi_models, run_in_transaction
+from .cache import create_model_cache
+from .user_email_index import UserEmailIndex, normalize_email
 
 
 class User(BaseModel):
@@ -12,6 +13,9 @@ class User(BaseModel):
     
     _kind = 'User'
     
+    # Users are read on every session start and dashboard load but rarely change
+    _cache = create_model_cache('User')
+    
     def __init__(self, **kwargs):
         """Initialize User model."""
         super().__init__(**kwargs)
@@ -32,7 +36,9 @@ class User(BaseModel):
     @classmethod
     def _get_excluded_indexes(cls) -> List[str]:
         """Return list of fields to exclude from Datastore indexes."""
-        return ['password_hash']  # Don't index sensitive data
+        # Only email is queried (legacy lookup); never index the password hash
+        return ['password_hash', 'first_name', 'last_name', 'recommended_topic', 'is_new_user',
+                'created_at', 'updated_at']
     
     def set_password(self, password: str) -> None:
         """Set password hash from plain text password."""
@@ -44,22 +50,59 @@ class User(BaseModel):
             return False
         return check_password_hash(self.password_hash, password)
     
+    def _cache_keys(self) -> List:
+        """Users are cached by ID and by email (including the email before a change)."""
+        keys = [self.id, ('email', normalize_email(self.email))]
+        previous_email = (self._snapshot or {}).get('email')
+        if previous_email and normalize_email(previous_email) != normalize_email(self.email):
+            keys.append(('email', normalize_email(previous_email)))
+        return keys
+    
     @classmethod
     def get_by_email(cls, email: str) -> Optional['User']:
-        """Get user by email address."""
+        """Get user by email address through the email index (two key lookups)."""
+        cache_key = ('email', normalize_email(email))
+        cached = cls._get_cached(cache_key)
+        if cached is not None:
+            session = get_current_session()
+            return session.register(cached._key_identity(), cached) if session is not None else cached
+        
+        user_id = UserEmailIndex.get_user_id(email)
+        user = cls.get_by_id(user_id) if user_id is not None else cls._get_by_email_query(email)
+        if user:
+            user._put_cached(cache_key)
+        return user
+    
+    @classmethod
+    def _get_by_email_query(cls, email: str) -> Optional['User']:
+        """Find a user created before the email index existed and backfill its entry."""
         query = cls.query()
         query.add_filter('email', '=', email)
         
-        results = list(query.fetch(limit=1))
-        if results:
-            return cls._from_entity(results[0])
-        return None
+        results = cls.fetch(query, limit=1)
+        if not results:
+            return None
+        
+        user = results[0]
+        UserEmailIndex.for_user(user.email, user.id).save()
+        return user
+    
+    @classmethod
+    def cache_stats(cls) -> dict:
+        """Return hit/miss counters of the user cache."""
+        return cls._cache.stats()
     
     @classmethod
     def create_user(cls, email: str, password: str, first_name: str, 
                    last_name: str = '', recommended_topic: str = None) -> 'User':
-        """Create a new user with password hashing."""
-        # Check if user already exists
+        """
+        Create a new user with password hashing.
+        
+        The User and its email index entry are written in one transaction that
+        first checks the entry is free, so concurrent signups with the same
+        email cannot both succeed.
+        """
+        # Check if user already exists (also finds and indexes pre-index users)
         if cls.get_by_email(email):
             raise ValueError("Email already exists")
         
@@ -71,18 +114,26 @@ class User(BaseModel):
             is_new_user=True
         )
         user.set_password(password)
-        return user.save()
+        user._validate_required_fields()
+        user.id = cls.allocate_id()
+        email_entry = UserEmailIndex.for_user(email, user.id)
+        
+        def create():
+            if get_multi_models([(UserEmailIndex, email_entry.id)])[0]:
+                raise ValueError("Email already exists")
+            put_multi_models([email_entry, user])
+        
+        run_in_transaction(create)
+        return user
     
     def mark_as_returning_user(self) -> 'User':
         """Mark user as no longer new."""
         self.is_new_user = False
-        self.updated_at = datetime.datetime.now(datetime.timezone.utc)
         return self.save()
     
     def update_recommended_topic(self, topic: str) -> 'User':
         """Update user's recommended topic."""
         self.recommended_topic = topic
-        self.updated_at = datetime.datetime.now(datetime.timezone.utc)
         return self.save()
     
     def get_full_name(self) -> str:
@@ -106,7 +157,7 @@ class User(BaseModel):
         
         if include_sensitive:
             data['password_hash'] = self.password_hash
-            
+        
         return data
     
     def __repr__(self) -> str:
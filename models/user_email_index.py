@@ -0,0 +1,58 @@
+"""
+Email lookup index for users.
+"""
+from typing import List, Optional
+from .base import BaseModel
+
+
+def normalize_email(email: str) -> str:
+    """Normalize an email address for lookups (trimmed, lower case)."""
+    return (email or '').strip().lower()
+
+
+class UserEmailIndex(BaseModel):
+    """
+    Maps a normalized email address to a user ID.
+    
+    Keyed by the normalized email, so login resolves a user with key lookups
+    instead of a property query, and a transaction that creates the index
+    entry together with the User rejects duplicate signups atomically.
+    """
+    
+    _kind = 'UserEmailIndex'
+    
+    def __init__(self, **kwargs):
+        """Initialize UserEmailIndex model."""
+        super().__init__(**kwargs)
+        
+        # Index-specific fields
+        self.email: str = kwargs.get('email')
+        self.user_id: int = kwargs.get('user_id')
+    
+    @classmethod
+    def _get_required_fields(cls) -> List[str]:
+        """Return list of required field names."""
+        return ['email', 'user_id']
+    
+    @classmethod
+    def _get_excluded_indexes(cls) -> List[str]:
+        """Return list of fields to exclude from Datastore indexes."""
+        # Read by key only
+        return ['email', 'user_id', 'created_at', 'updated_at']
+    
+    @classmethod
+    def for_user(cls, email: str, user_id: int) -> 'UserEmailIndex':
+        """Build the index entry for a user without saving."""
+        entry = cls(email=email, user_id=user_id)
+        entry.id = normalize_email(email)
+        return entry
+    
+    @classmethod
+    def get_user_id(cls, email: str) -> Optional[int]:
+        """Get the ID of the user registered with an email, if indexed."""
+        entry = cls.get_by_key(normalize_email(email))
+        return entry.user_id if entry else None
+    
+    def __repr__(self) -> str:
+        """String representation of the index entry."""
+        return f"UserEmailIndex(email={self.id}, user_id={self.user_id})"
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Per-user progress summary model, maintained alongside ProblemProgress writes.
+"""
+import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+from .base import BaseModel
+
+# Problem IDs ending with this suffix track a learning-tutor session
+TUTOR_SESSION_SUFFIX = '_tutor_session'
+
+
+class UserProgressSummary(BaseModel):
+    """
+    Denormalized progress counts for one user.
+    
+    Holds status counts per topic and overall, the status of each learning
+    tutor session, and the time of the last progress update, so dashboards
+    read a single entity instead of scanning every ProblemProgress record.
+    Counts go to the topic stored with each ProblemProgress record: practice
+    problems count under their topic ("Fractions"), learning-tutor sections
+    under the tutor's topic key ("fractions").
+    
+    A summary is only complete once it has been built from a scan of the
+    user's progress (`built`). Until then, progress writes keep an unbuilt
+    placeholder in the same transaction and bump its `unbuilt_writes`, so a
+    build that raced with a write fails its compare-and-swap and runs again.
+    """
+    
+    _kind = 'UserProgressSummary'
+    _versioned = True
+    
+    def __init__(self, **kwargs):
+        """Initialize UserProgressSummary model."""
+        super().__init__(**kwargs)
+        
+        # Summary-specific fields
+        self.user_id: int = kwargs.get('user_id')
+        self.topics: Dict[str, Dict[str, int]] = kwargs.get('topics', {})  # topic -> status -> count
+        self.status_counts: Dict[str, int] = kwargs.get('status_counts', {})  # status -> count, all records
+        self.total_attempted: int = kwargs.get('total_attempted', 0)
+        self.tutor_sessions: Dict[str, str] = kwargs.get('tutor_sessions', {})  # session problem ID -> status
+        self.last_activity_at: Optional[datetime.datetime] = kwargs.get('last_activity_at')
+        # Summaries written before placeholders existed were always built
+        self.built: bool = kwargs.get('built', True)
+        self.unbuilt_writes: int = kwargs.get('unbuilt_writes', 0)
+    
+    @classmethod
+    def _get_required_fields(cls) -> List[str]:
+        """Return list of required field names."""
+        return ['user_id']
+    
+    @classmethod
+    def _get_excluded_indexes(cls) -> List[str]:
+        """Return list of fields to exclude from Datastore indexes."""
+        # Read by key only
+        return ['topics', 'status_counts', 'tutor_sessions', 'user_id', 'total_attempted',
+                'last_activity_at', 'built', 'unbuilt_writes', 'created_at', 'updated_at']
+    
+    @classmethod
+    def _generate_key_name(cls, user_id: int) -> str:
+        """Generate key name for a user's summary."""
+        return str(user_id)
+    
+    @classmethod
+    def get_for_user(cls, user_id: int) -> Optional['UserProgressSummary']:
+        """Get the progress summary for a user."""
+        return cls.get_by_key(cls._generate_key_name(user_id))
+    
+    @classmethod
+    def build(cls, user_id: int, progress_records: Iterable,
+              topic_for_problem: Callable[[str], Optional[str]],
+              summary: Optional['UserProgressSummary'] = None) -> 'UserProgressSummary':
+        """
+        Build a summary from a user's ProblemProgress records without saving.
+        
+        Records without a stored topic take topic_for_problem(problem_id).
+        Pass the stored summary (built or a placeholder) to build onto it, so
+        that writing it compares against the version it was read at.
+        """
+        if summary is None:
+            summary = cls(user_id=user_id)
+            summary.id = cls._generate_key_name(user_id)
+        summary.topics, summary.status_counts, summary.tutor_sessions = {}, {}, {}
+        summary.total_attempted = 0
+        summary.last_activity_at = None
+        for progress in progress_records:
+            summary.record_status_change(progress.problem_id, progress.topic or topic_for_problem(progress.problem_id),
+                                         None, progress.status, progress.last_attempt_at or progress.updated_at)
+        summary.built = True
+        summary.unbuilt_writes = 0
+        return summary
+    
+    @classmethod
+    def mark_unbuilt_write(cls, summary: Optional['UserProgressSummary'], user_id: int) -> 'UserProgressSummary':
+        """Record a progress write on a summary that isn't built yet, creating the placeholder if missing."""
+        if summary is None:
+            summary = cls(user_id=user_id, built=False)
+            summary.id = cls._generate_key_name(user_id)
+        summary.unbuilt_writes += 1
+        return summary
+    
+    def record_status_change(self, problem_id: str, topic: Optional[str], old_status: Optional[str],
+                             new_status: str, at: Optional[datetime.datetime] = None) -> 'UserProgressSummary':
+        """Move one problem from old_status (None if new) to new_status without saving."""
+        if old_status is None:
+            self.total_attempted += 1
+        else:
+            self.status_counts[old_status] = max(0, self.status_counts.get(old_status, 0) - 1)
+        self.status_counts[new_status] = self.status_counts.get(new_status, 0) + 1
+        
+        if topic:
+            topic_counts = self.topics.setdefault(topic, {})
+            if old_status is not None:
+                topic_counts[old_status] = max(0, topic_counts.get(old_status, 0) - 1)
+            topic_counts[new_status] = topic_counts.get(new_status, 0) + 1
+        
+        if problem_id.endswith(TUTOR_SESSION_SUFFIX):
+            self.tutor_sessions[problem_id] = new_status
+        
+        if at and (not self.last_activity_at or at > self.last_activity_at):
+            self.last_activity_at = at
+        return self
+    
+    def get_topic_counts(self, topic: str) -> Dict[str, int]:
+        """Get mastered and in-progress counts for a topic."""
+        topic_counts = self.topics.get(topic, {})
+        return {
+            'mastered_count': topic_counts.get('mastered', 0),
+            'in_progress_count': topic_counts.get('in_progress', 0)
+        }
+    
+    def save(self) -> 'UserProgressSummary':
+        """Override save to key the summary by user ID."""
+        if not self.id:
+            self.id = self._generate_key_name(self.user_id)
+        return super().save()
+    
+    def to_dict(self) -> dict:
+        """Convert summary to dictionary for API responses."""
+        return {
+            'user_id': self.user_id,
+            'topics': self.topics,
+            'status_counts': self.status_counts,
+            'total_attempted': self.total_attempted,
+            'tutor_sessions': self.tutor_sessions,
+            'last_activity_at': self.last_activity_at.isoformat() if self.last_activity_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+    
+    def __repr__(self) -> str:
+        """String representation of the summary."""
+        return f"UserProgressSummary(user_id={self.user_id}, attempted={self.total_attempted})"
\ No newline at end of file
@@ -2,16 +2,11 @@
 AI Analysis Routes - Pure AI-driven analysis endpoints
 """
 from flask import Blueprint, request, jsonify
-import google.generativeai as genai
-from config.settings import Config
+from services.llm_gateway import llm_gateway
 import json
 
 ai_analysis_bp = Blueprint('ai_analysis', __name__, url_prefix='/api/ai')
 
-# Configure AI model
-genai.configure(api_key=Config.GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-2.5-flash')
-
 @ai_analysis_bp.route('/analyze-confidence', methods=['POST'])
 def analyze_confidence():
     """
@@ -54,10 +49,9 @@ Examples:
 """
 
         # Get AI analysis
-        response = model.generate_content(prompt)
+        response_text = llm_gateway.generate(prompt, 'ai.analyze_confidence').strip()
         
         # Parse AI response
-        response_text = response.text.strip()
         if response_text.startswith('```json'):
             response_text = response_text[7:]
         if response_text.endswith('```'):
@@ -77,7 +71,7 @@ Examples:
         
     except json.JSONDecodeError as e:
         print(f"JSON parsing error in AI confidence analysis: {e}")
-        print(f"Raw AI response: {response.text if 'response' in locals() else 'No response'}")
+        print(f"Raw AI response: {response_text}")
         return jsonify({
             'confidence_level': 'medium',
             'reasoning': ['json_parse_error'],
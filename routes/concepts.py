@@ -324,10 +324,13 @@ def get_topic_concept_map(current_user_id, grade, subject, topic):
             "relationships": []
         }
         
+        # Get user progress for all concepts in one batched lookup
+        from models.concept import ConceptProgress
+        progress_map = ConceptProgress.get_progress_for_concepts(
+            current_user_id, [concept.concept_id for concept in concepts])
+        
         for concept in concepts:
-            # Get user progress for this concept
-            from models.concept import ConceptProgress
-            progress = ConceptProgress.get_user_concept_progress(current_user_id, concept.concept_id)
+            progress = progress_map.get(concept.concept_id)
             
             concept_map["concepts"].append({
                 "concept_id": concept.concept_id,
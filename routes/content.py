@@ -163,7 +163,7 @@ def get_topic_summary(current_user_id, grade, subject, topic_name):
             })
 
         # Get topic summary using progress service
-        summary = progress_service.get_topic_summary(current_user_id, problem_ids)
+        summary = progress_service.get_topic_summary(current_user_id, problem_ids, topic=topic_name)
         summary["topic"] = topic_name
         
         return jsonify(summary)
@@ -126,8 +126,8 @@ def fractions_tutor_chat(user_id, grade, subject):
             updated_section_id = current_section_id
         
         # Create message objects
-        student_message = {'sender': 'student', 'message': student_answer, 'section_id': current_section_id}
-        tutor_message = {'sender': 'tutor', 'message': tutor_response, 'section_id': updated_section_id}
+        student_message = {'role': 'user', 'parts': [student_answer], 'section_id': current_section_id}
+        tutor_message = {'role': 'model', 'parts': [tutor_response], 'section_id': updated_section_id}
         
         # Calculate response data
         all_sections = fractions_service.get_all_section_ids()
@@ -137,27 +137,31 @@ def fractions_tutor_chat(user_id, grade, subject):
         
         ready_for_problems = completed_sections_count >= len(all_sections)
         
-        # Save progress asynchronously
-        from threading import Thread
-        
-        def save_progress_async():
-            try:
-                if section_completed and current_section_id:
-                    progress_service.save_progress(user_id, current_section_id, 'completed', [])
-                
-                section_messages = [student_message, tutor_message]
-                message_save_status = 'completed' if (section_completed and current_section_id) else 'in_progress'
-                progress_service.save_progress(user_id, current_section_id, message_save_status, section_messages)
-                
-                if section_completed and updated_section_id and updated_section_id != current_section_id:
-                    progress_service.save_progress(user_id, updated_section_id, 'in_progress', [])
-                
-                progress_status = 'mastered' if ready_for_problems else ('in_progress' if completed_sections_count > 0 else 'pending')
-                progress_service.save_progress(user_id, "fractions_tutor_session", progress_status, [])
-            except Exception as e:
-                print(f"Background save error: {e}")
-        
-        Thread(target=save_progress_async, daemon=True).start()
+        # Queue the saves for the write-behind workers (or save now when write-behind is off);
+        # the next turn reads queued saves back only if it reaches this process
+        try:
+            save_operations = []
+            if section_completed and current_section_id:
+                save_operations.append({'user_id': user_id, 'problem_id': current_section_id,
+                                        'status': 'completed', 'chat_history': [], 'topic': 'fractions'})
+            
+            section_messages = [student_message, tutor_message]
+            message_save_status = 'completed' if (section_completed and current_section_id) else 'in_progress'
+            save_operations.append({'user_id': user_id, 'problem_id': current_section_id,
+                                    'status': message_save_status, 'chat_history': section_messages,
+                                    'topic': 'fractions'})
+            
+            if section_completed and updated_section_id and updated_section_id != current_section_id:
+                save_operations.append({'user_id': user_id, 'problem_id': updated_section_id,
+                                        'status': 'in_progress', 'chat_history': [], 'topic': 'fractions'})
+            
+            progress_status = 'mastered' if ready_for_problems else ('in_progress' if completed_sections_count > 0 else 'pending')
+            save_operations.append({'user_id': user_id, 'problem_id': "fractions_tutor_session",
+                                    'status': progress_status, 'chat_history': []})
+            
+            progress_service.queue_multiple_progress(save_operations)
+        except Exception as e:
+            print(f"Save error: {e}")
         
         return jsonify({
             'success': True,
@@ -184,7 +188,7 @@ def get_fractions_tutor_status(user_id, grade, subject):
         fractions_tutor_id = "fractions_tutor_session"
         
         # Get existing progress
-        existing_history = progress_service.get_chat_history(user_id, fractions_tutor_id)
+        message_count = progress_service.get_chat_message_count(user_id, fractions_tutor_id)
         progress_map = progress_service.get_all_user_progress(user_id)
         
         # Get all section progress dynamically for ALL steps
@@ -260,8 +264,8 @@ def get_fractions_tutor_status(user_id, grade, subject):
             'completed_steps': len(completed_steps),
             'is_completed': is_completed,
             'progress_status': progress_status,
-            'has_history': len(existing_history) > 0 if existing_history else False,
-            'message_count': len(existing_history) if existing_history else 0,
+            'has_history': message_count > 0,
+            'message_count': message_count,
             'completed_step_list': completed_steps,
             'total_steps': len(sorted_steps),
             **step_progress
@@ -283,6 +287,9 @@ def reset_fractions_tutor_progress(user_id, grade, subject):
         
         fractions_tutor_id = "fractions_tutor_session"
         
+        # Queued chat-turn saves must land before the reset, not after it
+        progress_service.flush_queued_progress()
+        
         # Delete existing records
         chat_history = ChatHistory.get_chat_history(user_id, fractions_tutor_id)
         if chat_history:
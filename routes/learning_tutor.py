@@ -2,9 +2,10 @@
 Generic Learning Tutor Routes - Works for any topic (fractions, algebra, geometry, etc.)
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from services.tutor_factory import get_tutor_service, TutorServiceFactory
 from services.progress_service import progress_service
+from services.streaming import SSE_HEADERS, stream_events
 from routes.auth import token_required
 
 learning_tutor_bp = Blueprint('learning_tutor', __name__)
@@ -30,8 +31,8 @@ def start_learning_tutor(user_id, grade, subject, topic):
         # Use a topic-specific problem ID for tutoring sessions
         tutor_session_id = f"{topic}_tutor_session"
         
-        # Get user progress to determine current section
-        user_progress = progress_service.get_all_user_progress(user_id)
+        # Get this topic's section progress to determine current section
+        user_progress = progress_service.get_tutor_topic_progress(user_id, topic, tutor_service.get_all_section_ids())
         current_section_id = tutor_service.get_current_section_for_user(user_progress)
         
         # Load conversation history from current section + previous section for context
@@ -60,8 +61,7 @@ def start_learning_tutor(user_id, grade, subject, topic):
         if existing_history:
             # Resume existing session
             # Check if student has completed all steps (mastered status)
-            progress_map = progress_service.get_all_user_progress(user_id)
-            tutor_progress_status = progress_map.get(tutor_session_id, 'pending')
+            tutor_progress_status = user_progress.get(tutor_session_id, 'pending')
             
             if tutor_progress_status == 'mastered':
                 # Student has completed all steps - check if they're practicing
@@ -192,153 +192,229 @@ def learning_tutor_chat(user_id, grade, subject, topic):
         if not student_answer:
             return jsonify({'error': 'Student answer is required'}), 400
         
-        # Get user progress for section tracking
-        user_progress = progress_service.get_all_user_progress(user_id)
-        current_section_id = tutor_service.get_current_section_for_user(user_progress)
+        turn = _load_chat_turn(user_id, topic, tutor_service, conversation_history)
+        response_data, save_operations = _run_chat_turn(
+            turn, tutor_service, student_answer, conversation_history, emotional_intelligence)
         
+        # Queue the saves for the write-behind workers (or save now when write-behind is off);
+        # the next request reads queued saves back only if it reaches this process
+        _queue_chat_turn_saves(save_operations)
         
-        # Load full conversation context from multiple sections for AI processing
-        full_conversation_context = []
-        current_section_only_context = []
+        return jsonify(response_data)
         
-        if current_section_id:
-            all_sections = tutor_service.get_all_section_ids()
-            current_index = all_sections.index(current_section_id) if current_section_id in all_sections else 0
-            
-            # Load messages from current section and a few previous sections for AI context
-            sections_to_load = all_sections[max(0, current_index-2):current_index+1]
-            
-            for section_id in sections_to_load:
-                section_history = progress_service.get_chat_history(user_id, section_id)
-                if section_history:
-                    full_conversation_context.extend(section_history)
-                    # Separate current section context for attempt counting
-                    if section_id == current_section_id:
-                        current_section_only_context.extend(section_history)
+    except Exception as e:
+        print(f"Error in {topic} tutor chat: {e}")
+        return jsonify({'error': 'Could not process your response'}), 500
+
+@learning_tutor_bp.route('/api/grades/<grade>/subjects/<subject>/<topic>-tutor/chat/stream', methods=['POST'])
+@token_required
+def learning_tutor_chat_stream(user_id, grade, subject, topic):
+    """
+    Streaming variant of the learning tutor chat: takes the same request and
+    answers with server-sent events, a `delta` event for each piece of the
+    tutor response as it is generated, then a `done` event with the body the
+    chat endpoint returns. The deltas join to its tutor_response, except when
+    the model failed mid-stream and a fallback message replaced the text, so
+    clients replace what they showed with tutor_response on `done`. Progress
+    is saved after the stream is closed.
+    """
+    try:
+        # Validate topic is supported
+        if not TutorServiceFactory.is_topic_supported(topic):
+            available_topics = TutorServiceFactory.get_available_topics()
+            return jsonify({
+                'error': f'Topic "{topic}" is not supported',
+                'available_topics': available_topics
+            }), 400
         
-        # Use full context for AI processing (includes conversation_history + previous sections)
-        ai_conversation_context = full_conversation_context + conversation_history
+        # Get the appropriate service for this topic
+        tutor_service = get_tutor_service(topic)
         
-        # Use ONLY current section database context for attempt counting (NO frontend history)
-        # Frontend history would double-count previous attempts that were already saved to database
-        attempt_counting_context = current_section_only_context
-        
-        # Generate tutor response using the service with full conversation context
-        # Pass both AI context (for better responses) and attempt counting context (for accurate counts)
-        result = tutor_service.generate_tutor_response(
-            student_answer, ai_conversation_context, 1, emotional_intelligence, 
-            user_progress, current_section_id, attempt_counting_context)
-        
-        # Handle different return formats
-        if len(result) == 3:
-            # Old format: (tutor_response, new_step, shows_understanding)
-            tutor_response, new_step, shows_understanding = result
-            section_completed = False
-            updated_section_id = current_section_id
-        elif len(result) == 6:
-            # New format: (tutor_response, new_step, shows_understanding, section_completed, current_section_id, next_section_id)
-            tutor_response, new_step, shows_understanding, section_completed, _, next_section_id = result
-            # Use next_section_id if section completed, otherwise stay in current section
-            updated_section_id = next_section_id if section_completed else current_section_id
-        else:
-            # Legacy format with asked_question
-            tutor_response, new_step, shows_understanding, asked_question = result
-            section_completed = False
-            updated_section_id = current_section_id
-        
-        # Create message objects with section tracking
-        student_message = {
-            'sender': 'student', 
-            'message': student_answer, 
-            'section_id': current_section_id
-        }
-        tutor_message = {
-            'sender': 'tutor', 
-            'message': tutor_response, 
-            'section_id': updated_section_id
-        }
-        
-        
-        # Section progression is handled by the service, no need for step logic here
-        updated_history = conversation_history + [student_message, tutor_message]
-        
-        # Calculate response data BEFORE database operations
-        all_sections = tutor_service.get_all_section_ids()
-        # Count completed sections (including the one we just completed)
-        completed_sections_count = len([sid for sid in all_sections if user_progress.get(sid) == 'completed'])
-        if section_completed and current_section_id:
-            completed_sections_count += 1  # Add the current section that was just completed
+        data = request.get_json()
+        student_answer = data.get('student_answer', '').strip()
+        conversation_history = data.get('conversation_history', [])
+        emotional_intelligence = data.get('emotional_intelligence', {})
         
-        ready_for_problems = completed_sections_count >= len(all_sections)
+        if not student_answer:
+            return jsonify({'error': 'Student answer is required'}), 400
         
-
-        response_data = {
-            'success': True,
-            'tutor_response': tutor_response,
-            'current_section_id': updated_section_id or current_section_id,
-            'shows_understanding': shows_understanding,
-            'section_completed': section_completed,
-            'ready_for_problems': ready_for_problems,
-            'completed_sections_count': completed_sections_count,
-            'total_sections': len(all_sections)
-        }
-        
-        # SYNCHRONOUS SAVE - ensure messages are saved before next request
-        try:
-            # Prepare all save operations to batch them (reduces datastore latency)
-            save_operations = []
-            section_messages = [student_message, tutor_message]
-            message_save_status = 'completed' if (section_completed and current_section_id) else 'in_progress'
-            
-            # Main save: messages to current section - CRITICAL FOR ATTEMPT COUNTING
-            save_operations.append({
-                'user_id': user_id,
-                'problem_id': current_section_id,
-                'status': message_save_status,
-                'chat_history': section_messages
-            })
-            
-            # Save section completion if needed
-            if section_completed and current_section_id:
-                save_operations.append({
-                    'user_id': user_id,
-                    'problem_id': current_section_id,
-                    'status': 'completed',
-                    'chat_history': []
-                })
-            
-            # Position user in new section if completed
-            if section_completed and updated_section_id and updated_section_id != current_section_id:
-                save_operations.append({
-                    'user_id': user_id,
-                    'problem_id': updated_section_id,
-                    'status': 'in_progress',
-                    'chat_history': []
-                })
-            
-            # Save overall progress
-            progress_status = 'mastered' if ready_for_problems else ('in_progress' if completed_sections_count > 0 else 'pending')
-            tutor_session_id = f"{topic}_tutor_session"
-            save_operations.append({
-                'user_id': user_id,
-                'problem_id': tutor_session_id,
-                'status': progress_status,
-                'chat_history': []
-            })
-            
-            # Execute all saves (maintains all existing logic but batched)
-            progress_service.save_multiple_progress(save_operations)
-            
-        except Exception as e:
-            print(f"Save error: {e}")
-            # Continue anyway to not break user experience
+        # Read the learner's position before the stream starts, so errors still get a JSON answer
+        turn = _load_chat_turn(user_id, topic, tutor_service, conversation_history)
+        save_operations = []
         
-        return jsonify(response_data)
+        def respond(emit):
+            response_data, operations = _run_chat_turn(
+                turn, tutor_service, student_answer, conversation_history, emotional_intelligence, emit)
+            save_operations.extend(operations)
+            return response_data
+        
+        return Response(stream_events(respond, on_complete=lambda _: _queue_chat_turn_saves(save_operations)),
+                        mimetype='text/event-stream', headers=SSE_HEADERS)
         
     except Exception as e:
-        print(f"Error in {topic} tutor chat: {e}")
+        print(f"Error in {topic} tutor chat stream: {e}")
         return jsonify({'error': 'Could not process your response'}), 500
 
+def _load_chat_turn(user_id, topic, tutor_service, conversation_history):
+    """Load the section progress and conversation context a chat turn is evaluated against."""
+    # Get this topic's section progress for section tracking
+    user_progress = progress_service.get_tutor_topic_progress(user_id, topic, tutor_service.get_all_section_ids())
+    current_section_id = tutor_service.get_current_section_for_user(user_progress)
+    
+    
+    # Load full conversation context from multiple sections for AI processing
+    full_conversation_context = []
+    current_section_only_context = []
+    
+    if current_section_id:
+        all_sections = tutor_service.get_all_section_ids()
+        current_index = all_sections.index(current_section_id) if current_section_id in all_sections else 0
+        
+        # Load messages from current section and a few previous sections for AI context
+        sections_to_load = all_sections[max(0, current_index-2):current_index+1]
+        
+        for section_id in sections_to_load:
+            section_history = progress_service.get_chat_history(user_id, section_id)
+            if section_history:
+                full_conversation_context.extend(section_history)
+                # Separate current section context for attempt counting
+                if section_id == current_section_id:
+                    current_section_only_context.extend(section_history)
+    
+    return {
+        'user_id': user_id,
+        'topic': topic,
+        'user_progress': user_progress,
+        'current_section_id': current_section_id,
+        # Use full context for AI processing (includes conversation_history + previous sections)
+        'ai_conversation_context': full_conversation_context + conversation_history,
+        # Use ONLY current section database context for attempt counting (NO frontend history)
+        # Frontend history would double-count previous attempts that were already saved to database
+        'attempt_counting_context': current_section_only_context,
+    }
+
+def _run_chat_turn(turn, tutor_service, student_answer, conversation_history, emotional_intelligence, on_delta=None):
+    """Generate the tutor response of a chat turn; returns the response body and the progress saves."""
+    user_id = turn['user_id']
+    topic = turn['topic']
+    user_progress = turn['user_progress']
+    current_section_id = turn['current_section_id']
+    
+    # Generate tutor response using the service with full conversation context
+    # Pass both AI context (for better responses) and attempt counting context (for accurate counts)
+    result = tutor_service.generate_tutor_response(
+        student_answer, turn['ai_conversation_context'], 1, emotional_intelligence, 
+        user_progress, current_section_id, turn['attempt_counting_context'], on_delta=on_delta)
+    
+    # Handle different return formats
+    if len(result) == 3:
+        # Old format: (tutor_response, new_step, shows_understanding)
+        tutor_response, new_step, shows_understanding = result
+        section_completed = False
+        updated_section_id = current_section_id
+    elif len(result) == 6:
+        # New format: (tutor_response, new_step, shows_understanding, section_completed, current_section_id, next_section_id)
+        tutor_response, new_step, shows_understanding, section_completed, _, next_section_id = result
+        # Use next_section_id if section completed, otherwise stay in current section
+        updated_section_id = next_section_id if section_completed else current_section_id
+    else:
+        # Legacy format with asked_question
+        tutor_response, new_step, shows_understanding, asked_question = result
+        section_completed = False
+        updated_section_id = current_section_id
+    
+    # Create message objects with section tracking
+    student_message = {
+        'role': 'user', 
+        'parts': [student_answer], 
+        'section_id': current_section_id
+    }
+    tutor_message = {
+        'role': 'model', 
+        'parts': [tutor_response], 
+        'section_id': updated_section_id
+    }
+    
+    
+    # Section progression is handled by the service, no need for step logic here
+    updated_history = conversation_history + [student_message, tutor_message]
+    
+    # Calculate response data BEFORE database operations
+    all_sections = tutor_service.get_all_section_ids()
+    # Count completed sections (including the one we just completed)
+    completed_sections_count = len([sid for sid in all_sections if user_progress.get(sid) == 'completed'])
+    if section_completed and current_section_id:
+        completed_sections_count += 1  # Add the current section that was just completed
+    
+    ready_for_problems = completed_sections_count >= len(all_sections)
+    
+
+    response_data = {
+        'success': True,
+        'tutor_response': tutor_response,
+        'current_section_id': updated_section_id or current_section_id,
+        'shows_understanding': shows_understanding,
+        'section_completed': section_completed,
+        'ready_for_problems': ready_for_problems,
+        'completed_sections_count': completed_sections_count,
+        'total_sections': len(all_sections)
+    }
+    
+    # Prepare all save operations to batch them (reduces datastore latency)
+    save_operations = []
+    section_messages = [student_message, tutor_message]
+    message_save_status = 'completed' if (section_completed and current_section_id) else 'in_progress'
+    
+    # Main save: messages to current section - CRITICAL FOR ATTEMPT COUNTING
+    save_operations.append({
+        'user_id': user_id,
+        'problem_id': current_section_id,
+        'status': message_save_status,
+        'chat_history': section_messages,
+        'topic': topic
+    })
+    
+    # Save section completion if needed
+    if section_completed and current_section_id:
+        save_operations.append({
+            'user_id': user_id,
+            'problem_id': current_section_id,
+            'status': 'completed',
+            'chat_history': [],
+            'topic': topic
+        })
+    
+    # Position user in new section if completed
+    if section_completed and updated_section_id and updated_section_id != current_section_id:
+        save_operations.append({
+            'user_id': user_id,
+            'problem_id': updated_section_id,
+            'status': 'in_progress',
+            'chat_history': [],
+            'topic': topic
+        })
+    
+    # Save overall progress
+    progress_status = 'mastered' if ready_for_problems else ('in_progress' if completed_sections_count > 0 else 'pending')
+    tutor_session_id = f"{topic}_tutor_session"
+    save_operations.append({
+        'user_id': user_id,
+        'problem_id': tutor_session_id,
+        'status': progress_status,
+        'chat_history': []
+    })
+    
+    return response_data, save_operations
+
+def _queue_chat_turn_saves(save_operations):
+    """Queue the progress saves of a chat turn; a failure is logged, not passed on to the student."""
+    try:
+        # Coalesced with other pending updates and written in one batch
+        progress_service.queue_multiple_progress(save_operations)
+    except Exception as e:
+        print(f"Save error: {e}")
+        # Continue anyway to not break user experience
+
 @learning_tutor_bp.route('/api/grades/<grade>/subjects/<subject>/<topic>-tutor/status', methods=['GET'])
 @token_required
 def get_learning_tutor_status(user_id, grade, subject, topic):
@@ -360,11 +436,10 @@ def get_learning_tutor_status(user_id, grade, subject, topic):
         tutor_session_id = f"{topic}_tutor_session"
         
         # Get existing progress
-        existing_history = progress_service.get_chat_history(user_id, tutor_session_id)
-        progress_map = progress_service.get_all_user_progress(user_id)
-        
+        message_count = progress_service.get_chat_message_count(user_id, tutor_session_id)
         # Get all section progress dynamically for ALL steps
         all_sections = tutor_service.get_all_section_ids()
+        progress_map = progress_service.get_tutor_topic_progress(user_id, topic, all_sections)
         
         # Dynamically detect all step sequences
         step_data = {}
@@ -453,8 +528,8 @@ def get_learning_tutor_status(user_id, grade, subject, topic):
             'completed_steps': len(completed_steps),  # Frontend expects number of completed steps
             'is_completed': is_completed,
             'progress_status': progress_status,
-            'has_history': len(existing_history) > 0 if existing_history else False,
-            'message_count': len(existing_history) if existing_history else 0,
+            'has_history': message_count > 0,
+            'message_count': message_count,
             'completed_step_list': completed_steps,  # Keep the original list too
             'total_steps': len(sorted_steps),  # Total number of steps available
             **step_progress  # Dynamically include all step progress data
@@ -485,6 +560,9 @@ def reset_learning_tutor_progress(user_id, grade, subject, topic):
         from models.chat_history import ChatHistory
         from models.problem_progress import ProblemProgress
         
+        # Queued chat-turn saves must land before the reset, not after it
+        progress_service.flush_queued_progress()
+        
         # Delete existing records
         chat_history = ChatHistory.get_chat_history(user_id, tutor_session_id)
         if chat_history:
@@ -1,12 +1,16 @@
 """
 Progress tracking routes blueprint.
 """
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from routes.auth import token_required
+from models.base import DEFAULT_PAGE_SIZE
 from services.progress_service import progress_service
 
 progress_bp = Blueprint('progress', __name__, url_prefix='/api/progress')
 
+# Largest page /all returns when paginated
+MAX_PAGE_SIZE = 500
+
 @progress_bp.route('/<problem_id>', methods=['GET'])
 @token_required
 def get_progress(current_user_id, problem_id):
@@ -21,8 +25,24 @@ def get_progress(current_user_id, problem_id):
 @progress_bp.route('/all', methods=['GET'])
 @token_required
 def get_all_progress(current_user_id):
-    """Fetch all problem statuses for the current user."""
+    """
+    Fetch all problem statuses for the current user.
+    
+    Without query parameters the full problem_id -> status map is returned.
+    With ?page_size=N (and ?cursor= from the previous page) one page is
+    returned as {"progress": {...}, "next_cursor": "..." or null}.
+    """
+    page_size = request.args.get('page_size', type=int)
+    cursor = request.args.get('cursor')
+    if page_size is not None and not 1 <= page_size <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"page_size must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    
     try:
+        if page_size or cursor:
+            progress_page, next_cursor = progress_service.get_user_progress_page(
+                current_user_id, page_size or DEFAULT_PAGE_SIZE, cursor)
+            return jsonify({"progress": progress_page, "next_cursor": next_cursor})
+        
         progress_map = progress_service.get_all_user_progress(current_user_id)
         return jsonify(progress_map)
     except Exception as e:
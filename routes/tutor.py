@@ -1,12 +1,13 @@
 """
 AI Tutor routes blueprint.
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from routes.auth import token_required
 from config.settings import Config
 from services.problem_service import problem_service
 from services.tutor_service import tutor_service
 from services.progress_service import progress_service
+from services.streaming import SSE_HEADERS, stream_events
 
 tutor_bp = Blueprint('tutor', __name__, url_prefix='/api/grades')
 
@@ -40,27 +41,67 @@ def submit_answer(current_user_id, grade, subject):
         # Evaluate answer using tutor service with emotional intelligence
         result = tutor_service.evaluate_answer(problem, chat_history, emotional_intelligence)
         
-        # Save progress if we have feedback
-        if result.get("feedback"):
-            is_correct = result.get("is_correct", False)
-            status = 'mastered' if is_correct else 'in_progress'
-            
-            # Format response for chat history
-            model_response = tutor_service.format_feedback_for_history(
-                result['feedback'], is_correct
-            )
-            updated_history = chat_history + [model_response]
-            
-            # Save to database
-            progress_service.save_progress(
-                user_id=current_user_id,
-                problem_id=problem_id,
-                status=status,
-                chat_history=updated_history
-            )
+        _save_answer_progress(current_user_id, problem_id, chat_history, result, problem.get('topic'))
 
         return jsonify(result)
         
     except Exception as e:
         print(f"An error occurred in submit_answer: {e}")
-        return jsonify({"error": "Could not process answer submission"}), 500
\ No newline at end of file
+        return jsonify({"error": "Could not process answer submission"}), 500
+
+@tutor_bp.route('/<grade>/subjects/<subject>/tutor/submit_answer/stream', methods=['POST'])
+@token_required
+def submit_answer_stream(current_user_id, grade, subject):
+    """
+    Streaming variant of submit_answer: takes the same request and answers
+    with server-sent events, `delta` events with pieces of the feedback
+    ({"text", "field"}) as the examiner generates it, then a `done` event with
+    the body submit_answer returns. Progress is saved after the stream is closed.
+    """
+    # Validate grade and subject
+    if not Config.validate_grade_subject(grade, subject):
+        return jsonify({"error": "Grade/subject combination not supported"}), 400
+    
+    try:
+        data = request.get_json()
+        problem_id = data.get("problem_id")
+        chat_history = data.get("chat_history", [])
+        emotional_intelligence = data.get('emotional_intelligence', {})
+        
+        problem = problem_service.get_practice_problem(problem_id)
+        if not problem:
+            return jsonify({"error": "Problem not found"}), 404
+        
+        def evaluate(emit):
+            return tutor_service.evaluate_answer(problem, chat_history, emotional_intelligence, on_delta=emit)
+        
+        def save(result):
+            _save_answer_progress(current_user_id, problem_id, chat_history, result, problem.get('topic'))
+        
+        return Response(stream_events(evaluate, on_complete=save), mimetype='text/event-stream',
+                        headers=SSE_HEADERS)
+        
+    except Exception as e:
+        print(f"An error occurred in submit_answer_stream: {e}")
+        return jsonify({"error": "Could not process answer submission"}), 500
+
+def _save_answer_progress(user_id, problem_id, chat_history, result, topic=None):
+    """Save the progress and chat history of an evaluated answer, if it got feedback."""
+    if result.get("feedback"):
+        is_correct = result.get("is_correct", False)
+        status = 'mastered' if is_correct else 'in_progress'
+        
+        # Format response for chat history
+        model_response = tutor_service.format_feedback_for_history(
+            result['feedback'], is_correct
+        )
+        updated_history = chat_history + [model_response]
+        
+        # Save to database
+        progress_service.save_progress(
+            user_id=user_id,
+            problem_id=problem_id,
+            status=status,
+            chat_history=updated_history,
+            topic=topic
+        )
\ No newline at end of file
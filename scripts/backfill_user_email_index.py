@@ -0,0 +1,59 @@
+"""
+Create UserEmailIndex entries for users that signed up before the index existed.
+
+Login falls back to an email query for users without an entry and indexes
+them on first use; run this to index everyone ahead of time. Users sharing
+a normalized email are reported and left for manual cleanup. Safe to re-run.
+
+Usage:
+    python -m scripts.backfill_user_email_index [--batch-size 200] [--dry-run]
+"""
+import argparse
+
+from models.base import MAX_BATCH_SIZE, put_multi_models
+from models.user import User
+from models.user_email_index import UserEmailIndex, normalize_email
+
+
+def plan_entries(rows):
+    """Return (index entries to write, normalized emails used by several users)."""
+    user_ids = {}
+    for row in rows:
+        if row.get('email'):
+            user_ids.setdefault(normalize_email(row['email']), []).append((row['id'], row['email']))
+    
+    entries = [UserEmailIndex.for_user(users[0][1], users[0][0]) for users in user_ids.values() if len(users) == 1]
+    duplicates = sorted(email for email, users in user_ids.items() if len(users) > 1)
+    return entries, duplicates
+
+
+def backfill(batch_size: int, dry_run: bool) -> None:
+    rows = User.fetch_projection(User.query(), ['email'])
+    entries, duplicates = plan_entries(rows)
+    
+    # Skip entries that already exist
+    existing = []
+    for start in range(0, len(entries), MAX_BATCH_SIZE):
+        existing.extend(UserEmailIndex.get_multi([entry.id for entry in entries[start:start + MAX_BATCH_SIZE]]))
+    entries = [entry for entry, found in zip(entries, existing) if found is None]
+    print(f"{len(rows)} users: {len(entries)} index entries to create, {len(duplicates)} duplicated emails")
+    for email in duplicates:
+        print(f"  duplicate: {email}")
+    if dry_run:
+        return
+    
+    for start in range(0, len(entries), batch_size):
+        put_multi_models(entries[start:start + batch_size])
+    print("Done")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=200, help='entries written per put_multi')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would change')
+    args = parser.parse_args()
+    backfill(args.batch_size, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Run the schema migrations in models/migrations.py against the live data.
+
+Walks every entity of a kind with query cursors and upgrades the ones stored
+with an older schema_version. Upgrades are written in put_multi batches, by a
+bounded pool of workers, each batch in a transaction that re-reads its
+entities first, so concurrent writes by the app are never overwritten with
+stale data. The app keeps running throughout: readers accept both versions
+and new writes already use the current one.
+
+Progress is recorded in migrate-<Kind>.checkpoint (in --checkpoint-dir) after
+every page whose batches have all been written; rerunning the same command
+after an interruption resumes from there. Safe to re-run.
+
+Usage:
+    python -m scripts.migrate [KIND ...] [--page-size 500] [--batch-size 100] [--workers 4]
+        [--checkpoint-dir .] [--dry-run]
+"""
+import argparse
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.cloud import datastore
+
+from models.base import MAX_BATCH_SIZE, get_datastore_client, next_page_cursor, run_in_transaction
+from models.migrations import MIGRATIONS, Migration, entity_version, migrate_entity, migrations_for
+from scripts.transfer_user_data import load_checkpoint, save_checkpoint
+
+
+def read_page(client, kind: str, page_size: int,
+              cursor: Optional[str]) -> Tuple[List[datastore.Entity], Optional[str]]:
+    """Read one page of a kind and return (entities, next_cursor or None when done)."""
+    iterator = client.query(kind=kind).fetch(limit=page_size, start_cursor=cursor)
+    entities = list(next(iterator.pages, []))
+    return entities, next_page_cursor(iterator)
+
+
+def migrate_batch(client, keys: List[datastore.Key], steps: List[Migration]) -> int:
+    """Upgrade the entities of keys in one transaction and return how many were written."""
+    def read_modify_write():
+        # Re-read inside the transaction: the page may be stale by now
+        changed = [entity for entity in client.get_multi(keys) if migrate_entity(entity, steps)]
+        if changed:
+            client.put_multi(changed)
+        return len(changed)
+    
+    return run_in_transaction(read_modify_write)
+
+
+def migrate_kind(model_cls: type, page_size: int, batch_size: int, workers: int,
+                 checkpoint_dir: str, dry_run: bool) -> None:
+    client = get_datastore_client()
+    kind = model_cls._kind
+    steps = migrations_for(model_cls)
+    target = model_cls._schema_version
+    print(f"{kind}: schema version {target}")
+    for step in steps:
+        print(f"  v{step.version}: {step.description}")
+    
+    if dry_run:
+        versions: Dict[int, int] = Counter()
+        cursor = None
+        while True:
+            entities, cursor = read_page(client, kind, page_size, cursor)
+            versions.update(entity_version(entity) for entity in entities)
+            if cursor is None:
+                break
+        stale = sum(count for version, count in versions.items() if version < target)
+        print(f"  {sum(versions.values())} entities by version {dict(sorted(versions.items()))}; {stale} to migrate")
+        return
+    
+    checkpoint_path = os.path.join(checkpoint_dir, f"migrate-{kind}.checkpoint")
+    state: Dict[str, Any] = load_checkpoint(checkpoint_path) or {}
+    if state.get('version') != target:
+        state = {'kind': kind, 'version': target, 'cursor': None, 'scanned': 0, 'migrated': 0}
+    elif state['scanned']:
+        print(f"  Resuming after {state['scanned']} entities ({state['migrated']} migrated)")
+    
+    started = time.monotonic()
+    # Pages whose batches are still being written: (futures, cursor after the page, entities in it)
+    in_flight = deque()
+    
+    def complete_oldest_page():
+        futures, page_cursor, scanned = in_flight.popleft()
+        # A failed batch raises here, before the checkpoint can move past its page
+        state['migrated'] += sum(future.result() for future in futures)
+        state['scanned'] += scanned
+        state['cursor'] = page_cursor
+        save_checkpoint(checkpoint_path, state)
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'migrate-{kind}') as executor:
+        cursor = state['cursor']
+        while True:
+            entities, cursor = read_page(client, kind, page_size, cursor)
+            stale = [entity.key for entity in entities if entity_version(entity) < target]
+            futures = [executor.submit(migrate_batch, client, stale[start:start + batch_size], steps)
+                       for start in range(0, len(stale), batch_size)]
+            in_flight.append((futures, cursor, len(entities)))
+            
+            # Keep reading ahead only while the workers have no more than one batch each queued
+            while in_flight and (cursor is None or sum(len(page[0]) for page in in_flight) > workers
+                                 or all(future.done() for future in in_flight[0][0])):
+                complete_oldest_page()
+            if cursor is None:
+                break
+    
+    os.remove(checkpoint_path)
+    print(f"  Migrated {state['migrated']} of {state['scanned']} entities in {time.monotonic() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('kinds', nargs='*', metavar='KIND',
+                        help=f"kinds to migrate (default: all of {', '.join(sorted(MIGRATIONS))})")
+    parser.add_argument('--page-size', type=int, default=500, help='entities read per query page')
+    parser.add_argument('--batch-size', type=int, default=100, help='entities written per transaction')
+    parser.add_argument('--workers', type=int, default=4, help='batches written concurrently')
+    parser.add_argument('--checkpoint-dir', default='.', help='where progress is recorded')
+    parser.add_argument('--dry-run', action='store_true', help='only count entities by schema version')
+    args = parser.parse_args()
+    unknown = sorted(set(args.kinds) - set(MIGRATIONS))
+    if unknown:
+        parser.error(f"no migrations for {', '.join(unknown)}")
+    
+    for kind in args.kinds or sorted(MIGRATIONS):
+        model_cls = next(iter(MIGRATIONS[kind].values())).model_cls
+        migrate_kind(model_cls, args.page_size, min(args.batch_size, MAX_BATCH_SIZE), max(1, args.workers),
+                     args.checkpoint_dir, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
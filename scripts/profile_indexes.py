@@ -0,0 +1,417 @@
+"""
+Profile Datastore index usage and generate index.yaml.
+
+Parses the code for every query it builds (Model.query() / cls.query()
+followed by add_filter, order and projections) and compares the properties
+those queries use with the properties each model stores and indexes. For
+every kind it reports the properties indexed but never queried, the minimal
+_get_excluded_indexes list and the composite indexes the queries need, then
+counts the index entries a sample chat turn writes with the current and the
+minimal exclusions.
+
+Usage:
+    python -m scripts.profile_indexes [--write-index-yaml] [--check]
+
+--check exits with status 1 when a model indexes a property no query uses,
+excludes one a query needs, or index.yaml differs from the generated file.
+"""
+import argparse
+import ast
+import inspect
+import os
+import sys
+import textwrap
+from typing import Dict, List, Optional, Set, Tuple
+
+from models import BaseModel
+from models.base import SCHEMA_VERSION_FIELD, VERSION_FIELD
+from models.concept import Concept, ConceptProgress  # noqa: F401 (registers the models)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIRS = ['models', 'services', 'routes', 'scripts']
+# Generic query plumbing, not query shapes
+SKIPPED_SOURCES = [os.path.join('models', 'base.py'), os.path.join('models', 'storage')]
+INDEX_YAML = os.path.join(ROOT, 'index.yaml')
+
+EQUALITY_OPERATORS = ('=', '==')
+TIMESTAMP_FIELDS = ['created_at', 'updated_at']
+
+
+def model_classes() -> Dict[str, type]:
+    """Return every model class with a kind, by class name."""
+    classes = {}
+    pending = list(BaseModel.__subclasses__())
+    while pending:
+        model_cls = pending.pop()
+        pending.extend(model_cls.__subclasses__())
+        if model_cls._kind and model_cls.__module__.startswith('models.'):
+            classes[model_cls.__name__] = model_cls
+    return classes
+
+
+def stored_properties(model_cls: type) -> List[str]:
+    """Return the properties a model writes: its declared fields or the public attributes set in __init__."""
+    if model_cls._fields is not None:
+        return sorted(set(model_cls._fields) | set(TIMESTAMP_FIELDS))
+    
+    names = set(TIMESTAMP_FIELDS)
+    tree = ast.parse(textwrap.dedent(inspect.getsource(model_cls)))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name == '__init__':
+            for target in ast.walk(node):
+                if (isinstance(target, ast.Attribute) and isinstance(target.ctx, ast.Store)
+                        and isinstance(target.value, ast.Name) and target.value.id == 'self'
+                        and not target.attr.startswith('_') and target.attr != 'id'):
+                    names.add(target.attr)
+    return sorted(names)
+
+
+def _literal_strings(node: Optional[ast.AST]) -> Optional[List[str]]:
+    """Return the strings of a literal list/tuple of strings, else None."""
+    if isinstance(node, (ast.List, ast.Tuple)) and all(
+            isinstance(item, ast.Constant) and isinstance(item.value, str) for item in node.elts):
+        return [item.value for item in node.elts]
+    return None
+
+
+class QueryCollector(ast.NodeVisitor):
+    """Collects query shapes from one module, tracking query variables within each function."""
+    
+    def __init__(self, path: str, kinds_by_class: Dict[str, str]):
+        self.path = path
+        self.kinds_by_class = kinds_by_class
+        self.shapes: List[Dict] = []
+        self._classes: List[Tuple[str, Optional[str]]] = []
+        self._function: Optional[str] = None
+        self._queries: Dict[str, Dict] = {}
+    
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        kind = None
+        for statement in node.body:
+            if (isinstance(statement, ast.Assign) and len(statement.targets) == 1
+                    and isinstance(statement.targets[0], ast.Name) and statement.targets[0].id == '_kind'
+                    and isinstance(statement.value, ast.Constant)):
+                kind = statement.value.value
+        self._classes.append((node.name, kind or self.kinds_by_class.get(node.name)))
+        self.generic_visit(node)
+        self._classes.pop()
+    
+    def visit_FunctionDef(self, node: ast.FunctionDef) -> None:
+        outer_function, outer_queries = self._function, self._queries
+        self._function = f"{self._classes[-1][0]}.{node.name}" if self._classes else node.name
+        self._queries = {}
+        # Visit in source order so assignments are seen before the calls that use them
+        for child in sorted((n for n in ast.walk(node) if n is not node and hasattr(n, 'lineno')),
+                            key=lambda n: (n.lineno, n.col_offset)):
+            if isinstance(child, ast.Assign):
+                self._assignment(child)
+            elif isinstance(child, ast.Call):
+                self._call(child)
+        self._function, self._queries = outer_function, outer_queries
+    
+    visit_AsyncFunctionDef = visit_FunctionDef
+    
+    def _new_shape(self, call: ast.AST) -> Optional[Dict]:
+        """Return a new shape if call builds a query (Model.query(), cls.query(), client.query(kind=...))."""
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == 'query'):
+            return None
+        kind = None
+        owner = call.func.value
+        for keyword in call.keywords:
+            if keyword.arg == 'kind':
+                if isinstance(keyword.value, ast.Constant):
+                    kind = keyword.value.value
+                elif (isinstance(keyword.value, ast.Attribute) and keyword.value.attr == '_kind'
+                      and isinstance(keyword.value.value, ast.Name)):
+                    kind = self._kind_of(keyword.value.value.id)
+        if kind is None and not call.args and not call.keywords and isinstance(owner, ast.Name):
+            kind = self._kind_of(owner.id)
+        if kind is None:
+            return None
+        shape = {'kind': kind, 'equality': [], 'inequality': [], 'order': [], 'projection': [],
+                 'keys_only': False, 'origin': f"{self._function} ({self.path})",
+                 'source': f"{self._function} ({self.path}:{call.lineno})"}
+        self.shapes.append(shape)
+        return shape
+    
+    def _kind_of(self, name: str) -> Optional[str]:
+        if name in ('cls', 'self'):
+            return self._classes[-1][1] if self._classes else None
+        return self.kinds_by_class.get(name)
+    
+    def _shape_of(self, node: ast.AST) -> Optional[Dict]:
+        """Return the shape of a query variable or inline query expression."""
+        if isinstance(node, ast.Name):
+            return self._queries.get(node.id)
+        return self._new_shape(node)
+    
+    def _assignment(self, node: ast.Assign) -> None:
+        target = node.targets[0]
+        if isinstance(target, ast.Name):
+            shape = self._new_shape(node.value)
+            if shape is not None:
+                self._queries[target.id] = shape
+        elif isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name):
+            shape = self._queries.get(target.value.id)
+            values = _literal_strings(node.value)
+            if shape is None or values is None:
+                return
+            if target.attr == 'order':
+                shape['order'] = [(value.lstrip('-'), 'desc' if value.startswith('-') else 'asc') for value in values]
+            elif target.attr == 'projection':
+                shape['projection'] = values
+    
+    def _call(self, node: ast.Call) -> None:
+        if not isinstance(node.func, ast.Attribute):
+            return
+        method = node.func.attr
+        if method == 'add_filter' and isinstance(node.func.value, ast.Name):
+            shape = self._queries.get(node.func.value.id)
+            if (shape is not None and len(node.args) >= 2 and isinstance(node.args[0], ast.Constant)
+                    and isinstance(node.args[1], ast.Constant)):
+                group = 'equality' if node.args[1].value in EQUALITY_OPERATORS else 'inequality'
+                shape[group].append(node.args[0].value)
+        elif method == 'keys_only' and isinstance(node.func.value, ast.Name):
+            shape = self._queries.get(node.func.value.id)
+            if shape is not None:
+                shape['keys_only'] = True
+        elif method in ('fetch_projection', 'fetch_page', 'iter_query', 'fetch_keys') and node.args:
+            shape = self._shape_of(node.args[0])
+            if shape is None:
+                return
+            if method == 'fetch_keys':
+                shape['keys_only'] = True
+                return
+            # fetch_projection(query, fields), fetch_page/iter_query(query, page_size, cursor, projection)
+            position = 1 if method == 'fetch_projection' else 3
+            projection = node.args[position] if len(node.args) > position else None
+            for keyword in node.keywords:
+                if keyword.arg in ('fields', 'projection'):
+                    projection = keyword.value
+            shape['projection'] = _literal_strings(projection) or shape['projection']
+
+
+def collect_queries(kinds_by_class: Dict[str, str]) -> List[Dict]:
+    """Parse the source tree and return every query shape with a known kind."""
+    shapes = []
+    for directory in SOURCE_DIRS:
+        for folder, _, files in os.walk(os.path.join(ROOT, directory)):
+            for name in sorted(files):
+                path = os.path.relpath(os.path.join(folder, name), ROOT)
+                if not name.endswith('.py') or any(path.startswith(skipped) for skipped in SKIPPED_SOURCES):
+                    continue
+                with open(os.path.join(ROOT, path), encoding='utf-8') as source:
+                    tree = ast.parse(source.read(), filename=path)
+                collector = QueryCollector(path, kinds_by_class)
+                collector.visit(tree)
+                shapes.extend(collector.shapes)
+    return shapes
+
+
+def queried_properties(shape: Dict) -> List[str]:
+    """Return the properties a query needs indexed."""
+    names = shape['equality'] + shape['inequality'] + [name for name, _ in shape['order']] + shape['projection']
+    return list(dict.fromkeys(names))
+
+
+def composite_index(shape: Dict) -> Optional[List[Tuple[str, str]]]:
+    """
+    Return the composite index a query needs, or None if built-in indexes serve it.
+    
+    Built-in indexes serve kind-only queries, a filter or sort on a single
+    property, and equality filters alone (merge join). Anything that combines
+    filters with a sort on another property, an inequality with other filters,
+    several sort orders, or a projection with anything else needs a composite
+    index: equality properties, then the inequality property, then the sort
+    orders, then the remaining projected properties.
+    """
+    equality, inequality, order, projection = (shape['equality'], shape['inequality'],
+                                               shape['order'], shape['projection'])
+    order_names = [name for name, _ in order]
+    needs_composite = (
+        (order and (equality or len(order) > 1 or any(name not in order_names[:1] for name in inequality)))
+        or (inequality and equality)
+        or (projection and (equality or inequality or order or len(projection) > 1))
+    )
+    if not needs_composite:
+        return None
+    
+    properties = [(name, 'asc') for name in equality]
+    properties += [(name, 'asc') for name in inequality if name not in order_names]
+    properties += order
+    properties += [(name, 'asc') for name in projection if name not in dict(properties)]
+    return list(dict.fromkeys(properties))
+
+
+def render_index_yaml(shapes: List[Dict]) -> str:
+    """Render index.yaml with one composite index per distinct shape, commented with its queries."""
+    indexes: Dict[Tuple, List[str]] = {}
+    for shape in shapes:
+        index = composite_index(shape)
+        if index is not None:
+            indexes.setdefault((shape['kind'], tuple(index)), []).append(shape['origin'])
+    
+    lines = ['# Generated by scripts/profile_indexes.py from the queries in the code; do not edit by hand.',
+             'indexes:']
+    for (kind, properties), sources in sorted(indexes.items()):
+        lines.append('')
+        lines.extend(f"# {source}" for source in sorted(set(sources)))
+        lines.append(f"- kind: {kind}")
+        lines.append('  properties:')
+        for name, direction in properties:
+            lines.append(f"  - name: {name}")
+            if direction == 'desc':
+                lines.append('    direction: desc')
+    return '\n'.join(lines) + '\n'
+
+
+def value_size(value) -> int:
+    """Approximate stored size of a property value (Datastore storage size rules)."""
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)) or hasattr(value, 'timestamp'):
+        return 8
+    if isinstance(value, (str, bytes)):
+        return len(value.encode('utf-8') if isinstance(value, str) else value) + 1
+    if isinstance(value, (list, tuple)):
+        return sum(value_size(item) for item in value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + 1 + value_size(item) for key, item in value.items())
+    return len(repr(value)) + 1
+
+
+def key_size(key) -> int:
+    """Approximate stored size of an entity key."""
+    return 16 + sum(value_size(element) for element in key.flat_path)
+
+
+def index_entries(entity, excluded: Set[str], composites: List[List[Tuple[str, str]]]) -> Tuple[int, int]:
+    """Return (index entries, approximate index bytes) written for an entity."""
+    entries = 0
+    size = 0
+    entity_key_size = key_size(entity.key)
+    for name, value in entity.items():
+        if name in excluded:
+            continue
+        values = value if isinstance(value, list) else [value]
+        # Ascending and descending built-in index per value
+        entries += 2 * len(values)
+        size += 2 * sum(entity_key_size + len(name) + 1 + value_size(item) + 32 for item in values)
+    for properties in composites:
+        if all(name in entity for name, _ in properties):
+            entries += 1
+            size += entity_key_size + sum(value_size(entity[name]) for name, _ in properties) + 32
+    return entries, size
+
+
+def sample_turn_entities() -> List:
+    """Run one learning-tutor chat turn against the memory backend and return the entities it wrote."""
+    from models.base import set_storage_backend
+    from models.storage import MemoryBackend
+    from services.progress_service import progress_service
+    
+    backend = MemoryBackend()
+    set_storage_backend(backend)
+    try:
+        user_id = 1
+        progress_service.get_progress_summary(user_id)
+        turn = [
+            {'user_id': user_id, 'problem_id': 'fractions_step1_section1', 'status': 'in_progress',
+             'chat_history': [{'sender': 'student', 'message': '3/4', 'section_id': 'fractions_step1_section1'},
+                              {'sender': 'tutor', 'message': 'Great, what is 3/4 of 12?',
+                               'section_id': 'fractions_step1_section1'}]},
+            {'user_id': user_id, 'problem_id': 'fractions_tutor_session', 'status': 'in_progress',
+             'chat_history': []},
+        ]
+        progress_service.save_multiple_progress(turn)
+        versions = dict(backend._versions)
+        progress_service.save_multiple_progress(turn)
+        return [backend.entities[path] for path, version in backend._versions.items()
+                if versions.get(path) != version]
+    finally:
+        set_storage_backend(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--write-index-yaml', action='store_true', help='rewrite index.yaml from the queries')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if anything is out of date')
+    args = parser.parse_args()
+    
+    classes = model_classes()
+    shapes = collect_queries({name: model_cls._kind for name, model_cls in classes.items()})
+    problems = []
+    minimal_exclusions: Dict[str, Set[str]] = {}
+    current_exclusions: Dict[str, Set[str]] = {}
+    
+    for model_cls in sorted(classes.values(), key=lambda model_cls: model_cls._kind):
+        kind = model_cls._kind
+        kind_shapes = [shape for shape in shapes if shape['kind'] == kind]
+        stored = stored_properties(model_cls)
+        queried = {name for shape in kind_shapes for name in queried_properties(shape)}
+        # Encoded fields and the version stamps are excluded by BaseModel itself
+        encoded = set(model_cls._get_encoded_fields())
+        if model_cls._schema_version:
+            encoded.add(SCHEMA_VERSION_FIELD)
+        if model_cls._versioned:
+            encoded.add(VERSION_FIELD)
+        excluded = set(model_cls._get_excluded_indexes()) | encoded
+        minimal = set(stored) - queried
+        current_exclusions[kind] = excluded
+        minimal_exclusions[kind] = minimal | encoded
+        
+        print(f"\n{kind} ({model_cls.__module__}.{model_cls.__name__})")
+        print(f"  stored:     {', '.join(stored)}")
+        print(f"  queried:    {', '.join(sorted(queried)) or '-'}")
+        for shape in kind_shapes:
+            index = composite_index(shape)
+            needs = ', '.join(f"{name} {direction}" for name, direction in index) if index else 'built-in'
+            print(f"    {shape['source']}: {needs}")
+        unqueried = sorted(set(stored) - excluded - queried)
+        if unqueried:
+            print(f"  indexed but never queried: {', '.join(unqueried)}")
+            problems.append(f"{kind} indexes {', '.join(unqueried)}")
+        wrongly_excluded = sorted(excluded & queried)
+        if wrongly_excluded:
+            print(f"  ERROR excluded but queried: {', '.join(wrongly_excluded)}")
+            problems.append(f"{kind} excludes queried {', '.join(wrongly_excluded)}")
+        print(f"  minimal _get_excluded_indexes: {sorted(minimal - encoded)}")
+    
+    # Index entries written by one chat turn, as excluded now and with the minimal lists
+    composites: Dict[str, List] = {}
+    for shape in shapes:
+        index = composite_index(shape)
+        if index is not None and index not in composites.setdefault(shape['kind'], []):
+            composites[shape['kind']].append(index)
+    written = sample_turn_entities()
+    totals = {'current': [0, 0], 'minimal': [0, 0]}
+    print(f"\nOne chat turn writes {len(written)} entities:")
+    for entity in written:
+        kind = entity.key.flat_path[-2]
+        row = []
+        for label, exclusions in (('current', current_exclusions), ('minimal', minimal_exclusions)):
+            entries, size = index_entries(entity, exclusions.get(kind, set()), composites.get(kind, []))
+            totals[label][0] += entries
+            totals[label][1] += size
+            row.append(f"{entries:>3} entries {size:>6,} B")
+        print(f"  {kind:<20} current {row[0]}   minimal {row[1]}")
+    print(f"  {'total':<20} current {totals['current'][0]:>3} entries {totals['current'][1]:>6,} B"
+          f"   minimal {totals['minimal'][0]:>3} entries {totals['minimal'][1]:>6,} B")
+    
+    index_yaml = render_index_yaml(shapes)
+    if args.write_index_yaml:
+        with open(INDEX_YAML, 'w', encoding='utf-8') as output:
+            output.write(index_yaml)
+        print(f"\nWrote {os.path.relpath(INDEX_YAML, ROOT)}")
+    else:
+        with open(INDEX_YAML, encoding='utf-8') as existing:
+            if existing.read() != index_yaml:
+                print("\nindex.yaml is out of date (run with --write-index-yaml)")
+                problems.append('index.yaml is out of date')
+    
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
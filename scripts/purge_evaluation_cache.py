@@ -0,0 +1,38 @@
+"""
+Purge cached learning-tutor answer evaluations.
+
+Run this when a wrong model verdict got cached (services/evaluation_cache.py)
+or a section's samples were corrected without changing its text. With
+--answer only that answer's verdict is dropped; without it, every answer to
+the section. The purge goes through the persistent store, so app workers
+drop their in-process copies within EVALUATION_CACHE_MEMORY_TTL_SECONDS.
+
+Usage:
+    python -m scripts.purge_evaluation_cache --topic fractions --section-id p6_math_fractions_step1_001 [--answer "1/2"]
+"""
+import argparse
+
+from services.evaluation_cache import evaluation_cache
+from services.tutor_factory import get_tutor_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--topic', required=True, help='tutor topic, e.g. fractions')
+    parser.add_argument('--section-id', required=True, help='section whose verdicts to drop')
+    parser.add_argument('--answer', help='drop the verdict of this answer only')
+    args = parser.parse_args()
+    
+    if evaluation_cache is None:
+        print("The evaluation cache is disabled (EVALUATION_CACHE_ENABLED); nothing to purge")
+        return
+    tutor = get_tutor_service(args.topic)
+    if not tutor.get_section_by_id(args.section_id):
+        print(f"Warning: {args.topic} has no section {args.section_id!r}; purging anyway")
+    tutor.purge_cached_evaluations(args.section_id, args.answer)
+    target = f"answer {args.answer!r}" if args.answer is not None else 'every answer'
+    print(f"Done: purged cached verdicts of {target} to {args.topic} section {args.section_id}")
+
+
+if __name__ == '__main__':
+    main()
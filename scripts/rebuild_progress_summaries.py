@@ -0,0 +1,47 @@
+"""
+Rebuild UserProgressSummary entities from ProblemProgress records.
+
+Summaries are kept up to date by ProgressService writes and are built on
+first read for users that don't have a built one yet. Run this to backfill
+existing users ahead of time or to repair a summary that drifted. Each
+summary is written with compare-and-swap and rebuilt if a progress write
+lands during its scan (see ProgressService.get_progress_summary), so the
+script is safe to run while the app is serving.
+
+Usage:
+    python -m scripts.rebuild_progress_summaries [--user-id 123]
+"""
+import argparse
+
+from models.user import User
+from services.progress_service import progress_service
+
+
+def iter_user_ids():
+    """Return the ID of every user (keys-only query)."""
+    return User.fetch_keys(User.query())
+
+
+def rebuild(user_ids) -> int:
+    """Rebuild summaries for the given users, one compare-and-swap write each."""
+    rebuilt = 0
+    for user_id in user_ids:
+        progress_service.get_progress_summary(user_id, rebuild=True)
+        rebuilt += 1
+        if rebuilt % 100 == 0:
+            print(f"Rebuilt {rebuilt} summaries")
+    return rebuilt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--user-id', type=int, help='rebuild a single user only')
+    args = parser.parse_args()
+    
+    user_ids = [args.user_id] if args.user_id else iter_user_ids()
+    rebuilt = rebuild(user_ids)
+    print(f"Done: rebuilt {rebuilt} progress summaries")
+
+
+if __name__ == '__main__':
+    main()
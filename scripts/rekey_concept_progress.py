@@ -0,0 +1,73 @@
+"""
+Move ConceptProgress entities to deterministic "{user_id}-{concept_id}" keys.
+
+ConceptProgress used to be stored under auto-allocated IDs and looked up with
+a (user_id, concept_id) query; it is now read by key. This copies every
+entity that is not yet under its key name to the new key and deletes the old
+one. When a user has several records for the same concept, the most recently
+updated one wins. Safe to re-run.
+
+Usage:
+    python -m scripts.rekey_concept_progress [--batch-size 200] [--dry-run]
+"""
+import argparse
+
+from google.cloud import datastore
+
+from models.base import MAX_BATCH_SIZE, get_datastore_client
+from models.concept import ConceptProgress
+
+
+def plan_rekey(entities):
+    """Return (entities to write under new keys, old keys to delete)."""
+    latest = {}
+    old_keys = []
+    for entity in entities:
+        key_name = ConceptProgress._generate_key_name(entity.get('user_id'), entity.get('concept_id'))
+        if entity.key.name != key_name:
+            old_keys.append(entity.key)
+        
+        # Already migrated entities still compete with leftovers of the same pair
+        current = latest.get(key_name)
+        if current is None or str(entity.get('updated_at') or '') > str(current.get('updated_at') or ''):
+            latest[key_name] = entity
+    
+    to_write = [entity for key_name, entity in latest.items() if entity.key.name != key_name]
+    return to_write, old_keys
+
+
+def rekey(batch_size: int, dry_run: bool) -> None:
+    client = get_datastore_client()
+    entities = list(client.query(kind=ConceptProgress._kind).fetch())
+    to_write, old_keys = plan_rekey(entities)
+    print(f"{len(entities)} ConceptProgress entities: {len(to_write)} to rekey, {len(old_keys)} old keys to delete")
+    if dry_run:
+        return
+    
+    new_entities = []
+    for entity in to_write:
+        key_name = ConceptProgress._generate_key_name(entity.get('user_id'), entity.get('concept_id'))
+        new_entity = datastore.Entity(key=client.key(ConceptProgress._kind, key_name),
+                                      exclude_from_indexes=ConceptProgress._get_excluded_indexes())
+        new_entity.update(entity)
+        new_entities.append(new_entity)
+    
+    batch_size = min(batch_size, MAX_BATCH_SIZE)
+    # Write the new keys before deleting the old ones so nothing is lost if interrupted
+    for start in range(0, len(new_entities), batch_size):
+        client.put_multi(new_entities[start:start + batch_size])
+    for start in range(0, len(old_keys), batch_size):
+        client.delete_multi(old_keys[start:start + batch_size])
+    print("Done")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch-size', type=int, default=200, help='entities written or deleted per commit')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would change')
+    args = parser.parse_args()
+    rekey(args.batch_size, args.dry_run)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""
+Export and import user learning data as gzip-compressed NDJSON.
+
+Exports ProblemProgress, ChatHistory (with its ChatHistoryChunk children),
+ConceptProgress and UserProgressSummary entities for some users or for every
+user. Entities are read a page at a time with query cursors and each page is
+written as its own gzip member, so memory stays constant and a checkpoint
+file next to the output (<output>.checkpoint) can record where to continue:
+rerunning the same command after an interruption truncates the output to
+the last completed page and resumes from its cursor. Imports stream the file
+back and write with put_multi, checkpointing the number of records written.
+
+The first line of an export is a header; every other line is one entity:
+    {"key": ["ProblemProgress", "12-p6_001"], "exclude_from_indexes": [...],
+     "properties": {"status": "mastered", "updated_at": {"$datetime": "..."}}}
+
+Usage:
+    python -m scripts.transfer_user_data export OUTPUT.ndjson.gz (--user-id 12 [--user-id 13 ...] | --all)
+        [--page-size 200]
+    python -m scripts.transfer_user_data import INPUT.ndjson.gz [--batch-size 500]
+"""
+import argparse
+import base64
+import datetime
+import gzip
+import json
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.cloud import datastore
+
+from models.base import MAX_BATCH_SIZE, get_datastore_client, next_page_cursor
+from models.chat_history import ChatHistory, ChatHistoryChunk
+from models.concept import ConceptProgress
+from models.problem_progress import ProblemProgress
+from models.user_progress_summary import UserProgressSummary
+
+EXPORT_FORMAT = 'ai-tutor-user-data'
+EXPORT_VERSION = 1
+# Chunks are exported right after the ChatHistory page that owns them
+EXPORTED_MODELS = [ProblemProgress, ChatHistory, ConceptProgress, UserProgressSummary]
+
+
+def encode_property(value: Any) -> Any:
+    """Convert a property value to JSON, tagging types JSON has no literal for."""
+    if isinstance(value, datetime.datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, datastore.Key):
+        return {'$key': list(value.flat_path)}
+    if isinstance(value, dict):
+        return {'$entity': {name: encode_property(item) for name, item in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return [encode_property(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f"Cannot export property value of type {type(value).__name__}")
+
+
+def decode_property(client, value: Any) -> Any:
+    """Inverse of encode_property."""
+    if isinstance(value, list):
+        return [decode_property(client, item) for item in value]
+    if isinstance(value, dict):
+        (tag, item), = value.items()
+        if tag == '$datetime':
+            return datetime.datetime.fromisoformat(item)
+        if tag == '$bytes':
+            return base64.b64decode(item)
+        if tag == '$key':
+            return client.key(*item)
+        if tag == '$entity':
+            return {name: decode_property(client, nested) for name, nested in item.items()}
+        raise ValueError(f"Unknown property tag {tag!r}")
+    return value
+
+
+def entity_to_record(entity: datastore.Entity) -> Dict[str, Any]:
+    """Convert an entity to its export record."""
+    return {
+        'key': list(entity.key.flat_path),
+        'exclude_from_indexes': sorted(entity.exclude_from_indexes),
+        'properties': {name: encode_property(value) for name, value in entity.items()},
+    }
+
+
+def record_to_entity(client, record: Dict[str, Any]) -> datastore.Entity:
+    """Rebuild an entity from its export record."""
+    entity = datastore.Entity(key=client.key(*record['key']), exclude_from_indexes=record['exclude_from_indexes'])
+    entity.update({name: decode_property(client, value) for name, value in record['properties'].items()})
+    return entity
+
+
+def plan_passes(user_ids: Optional[List[int]]) -> List[Tuple[type, Optional[int]]]:
+    """Return the (model, user_id) passes of an export; user_id None scans the whole kind."""
+    if user_ids is None:
+        return [(model, None) for model in EXPORTED_MODELS]
+    return [(model, user_id) for user_id in user_ids for model in EXPORTED_MODELS]
+
+
+def read_page(client, model: type, user_id: Optional[int], page_size: int,
+              cursor: Optional[str]) -> Tuple[List[datastore.Entity], Optional[str]]:
+    """Read one page of a pass and return (entities, next_cursor or None when done)."""
+    if model is UserProgressSummary and user_id is not None:
+        # Summaries are keyed by user and their user_id isn't indexed
+        entity = client.get(client.key(model._kind, model._generate_key_name(user_id)))
+        return ([entity] if entity is not None else []), None
+    
+    query = client.query(kind=model._kind)
+    if user_id is not None:
+        query.add_filter('user_id', '=', user_id)
+    iterator = query.fetch(limit=page_size, start_cursor=cursor)
+    entities = list(next(iterator.pages, []))
+    return entities, next_page_cursor(iterator)
+
+
+def iter_chunk_batches(client, heads: Iterable[datastore.Entity]) -> Iterable[List[datastore.Entity]]:
+    """Yield the chunks of the given ChatHistory heads, fetched MAX_BATCH_SIZE keys at a time."""
+    keys = []
+    for head in heads:
+        for index in range(1, (head.get('chunk_count') or 0) + 1):
+            keys.append(client.key(*head.key.flat_path, ChatHistoryChunk._kind, index))
+            if len(keys) == MAX_BATCH_SIZE:
+                yield _get_in_order(client, keys)
+                keys = []
+    if keys:
+        yield _get_in_order(client, keys)
+
+
+def _get_in_order(client, keys: List[datastore.Key]) -> List[datastore.Entity]:
+    """get_multi, returning the entities that exist in the order of keys."""
+    found = {entity.key.flat_path: entity for entity in client.get_multi(keys)}
+    return [found[key.flat_path] for key in keys if key.flat_path in found]
+
+
+def write_member(output, records: Iterable[Dict[str, Any]]) -> int:
+    """Append records as one gzip member and return how many were written."""
+    lines = [json.dumps(record, separators=(',', ':')) for record in records]
+    if lines:
+        output.write(gzip.compress(('\n'.join(lines) + '\n').encode('utf-8')))
+    return len(lines)
+
+
+def load_checkpoint(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as checkpoint:
+        return json.load(checkpoint)
+
+
+def save_checkpoint(path: str, state: Dict[str, Any]) -> None:
+    """Write the checkpoint atomically."""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as checkpoint:
+        json.dump(state, checkpoint)
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+    os.replace(temporary, path)
+
+
+def export_data(output_path: str, user_ids: Optional[List[int]], page_size: int) -> None:
+    client = get_datastore_client()
+    checkpoint_path = f"{output_path}.checkpoint"
+    passes = plan_passes(user_ids)
+    state = load_checkpoint(checkpoint_path)
+    
+    if state is not None:
+        if state['user_ids'] != user_ids:
+            raise SystemExit(f"{checkpoint_path} belongs to an export of other users; remove it to start over")
+        print(f"Resuming at pass {state['pass'] + 1}/{len(passes)} after {state['records']} records")
+        output = open(output_path, 'r+b')
+        output.truncate(state['offset'])
+        output.seek(state['offset'])
+    else:
+        output = open(output_path, 'wb')
+        write_member(output, [{'format': EXPORT_FORMAT, 'version': EXPORT_VERSION, 'user_ids': user_ids,
+                               'kinds': [model._kind for model in EXPORTED_MODELS] + [ChatHistoryChunk._kind],
+                               'exported_at': datetime.datetime.now(datetime.timezone.utc).isoformat()}])
+        state = {'user_ids': user_ids, 'pass': 0, 'cursor': None, 'records': 0, 'offset': output.tell()}
+    
+    started = time.monotonic()
+    with output:
+        while state['pass'] < len(passes):
+            model, user_id = passes[state['pass']]
+            entities, cursor = read_page(client, model, user_id, page_size, state['cursor'])
+            state['records'] += write_member(output, (entity_to_record(entity) for entity in entities))
+            if model is ChatHistory:
+                for chunks in iter_chunk_batches(client, entities):
+                    state['records'] += write_member(output, (entity_to_record(chunk) for chunk in chunks))
+            
+            # The page is on disk before the checkpoint moves past it
+            output.flush()
+            os.fsync(output.fileno())
+            if cursor is None:
+                state['pass'] += 1
+            state['cursor'] = cursor
+            state['offset'] = output.tell()
+            save_checkpoint(checkpoint_path, state)
+    
+    os.remove(checkpoint_path)
+    print(f"Exported {state['records']} entities to {output_path} ({state['offset']:,} bytes) "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+def import_data(input_path: str, batch_size: int) -> None:
+    client = get_datastore_client()
+    checkpoint_path = f"{input_path}.import-checkpoint"
+    state = load_checkpoint(checkpoint_path) or {'records': 0}
+    if state['records']:
+        print(f"Resuming after {state['records']} records")
+    
+    started = time.monotonic()
+    imported = state['records']
+    with gzip.open(input_path, 'rt', encoding='utf-8') as lines:
+        header = json.loads(next(lines))
+        if header.get('format') != EXPORT_FORMAT or header.get('version') != EXPORT_VERSION:
+            raise SystemExit(f"{input_path} is not a version {EXPORT_VERSION} {EXPORT_FORMAT} export")
+        
+        batch = []
+        for number, line in enumerate(lines):
+            if number < imported:
+                continue
+            batch.append(record_to_entity(client, json.loads(line)))
+            if len(batch) >= batch_size:
+                client.put_multi(batch)
+                imported = number + 1
+                save_checkpoint(checkpoint_path, {'records': imported})
+                batch = []
+        if batch:
+            client.put_multi(batch)
+            imported += len(batch)
+    
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    print(f"Imported {imported} entities from {input_path} in {time.monotonic() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    export_parser = commands.add_parser('export', help='export user data to a .ndjson.gz file')
+    export_parser.add_argument('output')
+    scope = export_parser.add_mutually_exclusive_group(required=True)
+    scope.add_argument('--user-id', type=int, action='append', dest='user_ids', help='user to export (repeatable)')
+    scope.add_argument('--all', action='store_true', help='export every user')
+    export_parser.add_argument('--page-size', type=int, default=200, help='entities read per query page')
+    
+    import_parser = commands.add_parser('import', help='import a .ndjson.gz export')
+    import_parser.add_argument('input')
+    import_parser.add_argument('--batch-size', type=int, default=MAX_BATCH_SIZE, help='entities written per put_multi')
+    
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_data(args.output, None if args.all else args.user_ids, args.page_size)
+    else:
+        import_data(args.input, min(args.batch_size, MAX_BATCH_SIZE))
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
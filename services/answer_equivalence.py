@@ -0,0 +1,360 @@
+"""
+Deterministic equivalence checks of short math answers.
+
+check_answer(answer, verified_answer, problem_text) compares a student's
+answer with a problem's verified answer using exact rational arithmetic
+(fractions.Fraction). It understands integers, decimals, fractions, mixed
+numbers ("66 2/3", "73⅓"), percentages, ratios ("3:4"), times of day
+("11:15 a.m."), money, angles, lengths, areas, volumes and capacities,
+masses, durations and speeds, converting between units ("1.75 L" is
+"1750 ml"), and linear algebraic expressions ("-7 + 2x" is "2x - 7").
+
+It returns True or False only when the whole answer is one such value and
+the verdict is clear. Otherwise it returns None and the model decides. That
+covers explanations and working, forms it can't parse, rounded decimals,
+numbers that may be in another unit, unsimplified ratios, and answers in
+another form when the problem asks for a particular one ("simplest form",
+"as a mixed number").
+"""
+import math
+import re
+from fractions import Fraction
+from typing import Dict, List, Optional, Tuple
+
+# Unit aliases -> (dimension, size in the dimension's base unit)
+UNITS: Dict[str, Tuple[str, Fraction]] = {}
+
+
+def _add_units(dimension: str, size, *aliases: str) -> None:
+    for alias in aliases:
+        UNITS[alias] = (dimension, Fraction(size))
+
+
+_add_units('length', Fraction(1, 1000), 'mm', 'millimetre', 'millimetres', 'millimeter', 'millimeters')
+_add_units('length', Fraction(1, 100), 'cm', 'centimetre', 'centimetres', 'centimeter', 'centimeters')
+_add_units('length', 1, 'm', 'metre', 'metres', 'meter', 'meters')
+_add_units('length', 1000, 'km', 'kilometre', 'kilometres', 'kilometer', 'kilometers')
+_add_units('area', Fraction(1, 10000), 'cm²', 'cm2', 'sq cm', 'square cm', 'square centimetres')
+_add_units('area', 1, 'm²', 'm2', 'sq m', 'square m', 'square metres')
+_add_units('area', 1000000, 'km²', 'km2', 'sq km', 'square km', 'square kilometres')
+# PSLE treats cm³ and ml as the same measure
+_add_units('volume', 1, 'cm³', 'cm3', 'cubic cm', 'ml', 'mℓ', 'millilitre', 'millilitres', 'milliliter',
+           'milliliters')
+_add_units('volume', 1000, 'l', 'ℓ', 'litre', 'litres', 'liter', 'liters')
+_add_units('volume', 1000000, 'm³', 'm3', 'cubic m')
+_add_units('mass', 1, 'g', 'gram', 'grams')
+_add_units('mass', 1000, 'kg', 'kilogram', 'kilograms')
+_add_units('time', Fraction(1, 60), 's', 'sec', 'secs', 'second', 'seconds')
+_add_units('time', 1, 'min', 'mins', 'minute', 'minutes')
+_add_units('time', 60, 'h', 'hr', 'hrs', 'hour', 'hours')
+_add_units('speed', Fraction(5, 18), 'km/h', 'km/hr', 'kmh', 'kph', 'km per hour')
+_add_units('speed', Fraction(50, 3), 'km/min', 'km per min', 'km per minute')
+_add_units('speed', 1, 'm/s', 'm/sec', 'm per s', 'm per second')
+_add_units('speed', Fraction(1, 60), 'm/min', 'm per min', 'm per minute')
+_add_units('money', 1, '$', 'dollar', 'dollars')
+_add_units('money', Fraction(1, 100), '¢', 'cent', 'cents')
+_add_units('angle', 1, '°', 'º', 'deg', 'degree', 'degrees')
+_add_units('percent', 1, '%', 'percent', 'per cent')
+
+# Unicode vulgar fractions students paste or type ("73⅓")
+VULGAR_FRACTIONS = {
+    '½': Fraction(1, 2), '⅓': Fraction(1, 3), '⅔': Fraction(2, 3), '¼': Fraction(1, 4), '¾': Fraction(3, 4),
+    '⅕': Fraction(1, 5), '⅖': Fraction(2, 5), '⅗': Fraction(3, 5), '⅘': Fraction(4, 5), '⅙': Fraction(1, 6),
+    '⅚': Fraction(5, 6), '⅛': Fraction(1, 8), '⅜': Fraction(3, 8), '⅝': Fraction(5, 8), '⅞': Fraction(7, 8),
+}
+
+# Wording that asks for one form of the answer; equal values in another form are left to the model
+FORM_REQUIREMENT = re.compile(r'simplest form|lowest terms|as an? (?:fraction|decimal|mixed number|percentage)'
+                              r'|improper fraction|mixed number|decimal places?|nearest|significant',
+                              re.IGNORECASE)
+
+# Leading words that only announce the answer ("The answer is 12")
+_PREAMBLE = re.compile(r"^(?:(?:so|then),?\s+)?(?:(?:the|my|final)\s+)*(?:answer\s*(?:is|:|=)|ans\s*[:=]?|"
+                       r"it\s*is|it'?s|is|=)\s*", re.IGNORECASE)
+_NUMBER = (r'(?P<sign>-)?\s*(?:(?P<whole>\d+)\s*(?:(?P<vulgar>[' + ''.join(VULGAR_FRACTIONS) + r'])|'
+           r'\s(?P<mixed_num>\d+)\s*/\s*(?P<mixed_den>\d+))|(?P<num>\d+(?:\.\d+)?)\s*/\s*(?P<den>\d+(?:\.\d+)?)|'
+           r'(?P<decimal>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d*\.\d+|\d+)|(?P<lone_vulgar>[' + ''.join(VULGAR_FRACTIONS)
+           + r']))')
+_QUANTITY = re.compile(r'^(?P<currency>s?\$)?\s*' + _NUMBER + r'\s*(?P<unit>[^\d\s].*?)?$', re.IGNORECASE)
+_CLOCK = re.compile(r'^(?P<hour>\d{1,2})\s*[:.]\s*(?P<minute>\d{2})\s*(?:(?P<half>[ap])\.?\s*m\.?)?$',
+                    re.IGNORECASE)
+_RATIO_SPLIT = re.compile(r'\s*:\s*')
+_TERM = re.compile(r'^(?P<coefficient>\d+(?:\.\d+)?(?:\s*/\s*\d+)?)?\s*[*×]?\s*(?P<variables>[a-z]*)'
+                   r'(?:\s*/\s*(?P<divisor>\d+))?$', re.IGNORECASE)
+
+
+class Quantity:
+    """
+    A parsed answer.
+    
+    kind is 'number' (value, with dimension/unit when it has one, value in
+    the dimension's base unit), 'ratio' (value is a tuple of terms), 'clock'
+    (minutes after midnight; `twelve_hour` without a.m./p.m.) or 'expression'
+    (value maps each monomial to its coefficient). form records how a number
+    was written: 'integer', 'decimal', 'fraction' or 'mixed'.
+    """
+    
+    __slots__ = ('kind', 'value', 'dimension', 'unit', 'number', 'form', 'reduced', 'decimals', 'twelve_hour')
+    
+    def __init__(self, kind: str, value, dimension: Optional[str] = None, unit: Optional[str] = None,
+                 number: Optional[Fraction] = None, form: str = 'integer', reduced: bool = True,
+                 decimals: int = 0, twelve_hour: bool = False):
+        self.kind = kind
+        self.value = value
+        self.dimension = dimension
+        self.unit = unit
+        self.number = value if number is None else number
+        self.form = form
+        self.reduced = reduced
+        self.decimals = decimals
+        self.twelve_hour = twelve_hour
+    
+    def __repr__(self) -> str:
+        return f"Quantity({self.kind}, {self.value!r}, {self.unit or ''})"
+
+
+def _clean(text: str) -> str:
+    """Lower-case and trim an answer, dropping the preamble and closing punctuation."""
+    text = text.strip().replace('−', '-').replace(' ', ' ').replace('\xa0', ' ')
+    text = _PREAMBLE.sub('', text).strip()
+    return text.rstrip('.!').strip().strip('"\'').strip().lower()
+
+
+def _parse_number(match) -> Tuple[Fraction, str, bool, int]:
+    """Return (value, form, reduced, decimal places) of a _NUMBER match."""
+    sign = -1 if match.group('sign') else 1
+    if match.group('vulgar'):
+        return sign * (int(match.group('whole')) + VULGAR_FRACTIONS[match.group('vulgar')]), 'mixed', True, 0
+    if match.group('lone_vulgar'):
+        return sign * VULGAR_FRACTIONS[match.group('lone_vulgar')], 'fraction', True, 0
+    if match.group('mixed_num'):
+        numerator, denominator = int(match.group('mixed_num')), int(match.group('mixed_den'))
+        if denominator == 0:
+            raise ZeroDivisionError
+        value = int(match.group('whole')) + Fraction(numerator, denominator)
+        return sign * value, 'mixed', math.gcd(numerator, denominator) == 1 and numerator < denominator, 0
+    if match.group('num'):
+        numerator, denominator = Fraction(match.group('num')), Fraction(match.group('den'))
+        reduced = (numerator.denominator == denominator.denominator == 1
+                   and math.gcd(int(numerator), int(denominator)) == 1)
+        return sign * numerator / denominator, 'fraction', reduced, 0
+    text = match.group('decimal').replace(',', '')
+    decimals = len(text.partition('.')[2])
+    return sign * Fraction(text), 'decimal' if decimals else 'integer', True, decimals
+
+
+def _parse_unit(text: str) -> Optional[Tuple[str, Fraction]]:
+    unit = re.sub(r'\s+', ' ', text.strip().rstrip('.')).replace(' / ', '/')
+    return UNITS.get(unit) or UNITS.get(unit.replace('.', ''))
+
+
+def _parse_quantity(text: str) -> Optional[Quantity]:
+    """Parse a number with an optional unit (or a leading $)."""
+    match = _QUANTITY.match(text)
+    if not match:
+        return None
+    try:
+        number, form, reduced, decimals = _parse_number(match)
+    except ZeroDivisionError:
+        return None
+    unit_text = match.group('unit')
+    if match.group('currency'):
+        if unit_text:
+            return None
+        unit_text = '$'
+    if not unit_text:
+        return Quantity('number', number, form=form, reduced=reduced, decimals=decimals)
+    unit = _parse_unit(unit_text)
+    if unit is None:
+        return None
+    dimension, size = unit
+    return Quantity('number', number * size, dimension=dimension, unit=unit_text.strip(), number=number,
+                    form=form, reduced=reduced, decimals=decimals)
+
+
+def _parse_clock(text: str, twelve_hour: bool = False) -> Optional[Quantity]:
+    """
+    Parse a time of day. Without twelve_hour it needs a.m./p.m., since "3:10"
+    is more likely a ratio; parse_answer falls back to it for "11:00".
+    """
+    match = _CLOCK.match(text)
+    if not match:
+        return None
+    return _clock(int(match.group('hour')), int(match.group('minute')),
+                  (match.group('half') or '').lower(), twelve_hour)
+
+
+def _clock(hour: int, minute: int, half: str, twelve_hour: bool) -> Optional[Quantity]:
+    if minute >= 60 or hour > 23 or not (half or twelve_hour):
+        return None
+    if half:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if half == 'p' else 0)
+    return Quantity('clock', hour * 60 + minute, twelve_hour=not half and hour <= 12)
+
+
+def _parse_ratio(text: str) -> Optional[Quantity]:
+    parts = _RATIO_SPLIT.split(text)
+    if len(parts) < 2:
+        return None
+    terms = []
+    for part in parts:
+        term = _parse_quantity(part)
+        if term is None or term.dimension is not None:
+            return None
+        terms.append(term.value)
+    if any(term <= 0 for term in terms):
+        return None
+    reduced = all(term.denominator == 1 for term in terms) and math.gcd(*(int(term) for term in terms)) == 1
+    return Quantity('ratio', tuple(terms), reduced=reduced)
+
+
+def _parse_expression(text: str) -> Optional[Quantity]:
+    """Parse a sum of terms like 3x, k/8, 2xy or 14 (no brackets or products of sums)."""
+    # Runs of three or more letters are words, not products of variables
+    if re.search(r'[a-z]{3}', text):
+        return None
+    text = re.sub(r'\s+', '', text)
+    if not text or not re.search(r'[a-z]', text) or re.search(r'[^0-9a-z.+\-*×/]', text):
+        return None
+    coefficients: Dict[str, Fraction] = {}
+    for sign, term in re.findall(r'([+\-]?)([^+\-]+)', text):
+        match = _TERM.match(term)
+        if not match or not (match.group('coefficient') or match.group('variables')):
+            return None
+        coefficient = Fraction(1)
+        if match.group('coefficient'):
+            numerator, _, denominator = match.group('coefficient').partition('/')
+            if denominator and Fraction(denominator) == 0:
+                return None
+            coefficient = Fraction(numerator) / (Fraction(denominator) if denominator else 1)
+        if match.group('divisor'):
+            if int(match.group('divisor')) == 0:
+                return None
+            coefficient /= int(match.group('divisor'))
+        monomial = ''.join(sorted(match.group('variables')))
+        coefficients[monomial] = coefficients.get(monomial, Fraction(0)) + (-coefficient if sign == '-' else coefficient)
+    if ''.join(re.findall(r'[+\-]?[^+\-]+', text)) != text:
+        return None
+    return Quantity('expression', {monomial: value for monomial, value in coefficients.items() if value})
+
+
+def parse_answer(text: str) -> Optional[Quantity]:
+    """Parse a whole answer, or return None if it isn't a single value this module understands."""
+    text = _clean(text)
+    if not text or len(text) > 40:
+        return None
+    return (_parse_clock(text) or _parse_ratio(text) or _parse_quantity(text) or _parse_expression(text)
+            or _parse_clock(text, twelve_hour=True))
+
+
+def parse_verified_answer(verified_answer: str) -> List[Quantity]:
+    """Parse the accepted forms of a verified answer ("3/6 or 1/2", "73 ⅓ km/h (≈ 73.3 km/h)")."""
+    text = str(verified_answer)
+    alternatives = re.findall(r'\(\s*[≈~]?\s*([^()]*)\)', text)
+    alternatives.insert(0, re.sub(r'\([^()]*\)', '', text))
+    parsed = []
+    for alternative in alternatives:
+        for part in re.split(r'\s+or\s+', alternative):
+            quantity = parse_answer(part)
+            if quantity is None:
+                return []  # Something we don't understand; let the model judge
+            parsed.append(quantity)
+    return parsed
+
+
+def _rounds_to(given: Quantity, exact: Fraction) -> bool:
+    """True if given is exact rounded to as many decimal places as it was written with."""
+    if given.form != 'decimal':
+        return False
+    return abs(given.number - exact) * 2 * 10 ** given.decimals <= 1
+
+
+def _compare_numbers(given: Quantity, expected: Quantity, form_required: bool) -> Optional[bool]:
+    if given.dimension and expected.dimension:
+        if given.dimension != expected.dimension:
+            return False
+        given_value, expected_value = given.value, expected.value
+        # Rounding is judged in the unit the student wrote
+        expected_in_given_unit = expected.value / _parse_unit(given.unit)[1]
+    elif expected.dimension:
+        # No unit given: the number must be the one in the verified answer's unit
+        given_value, expected_value = given.number, expected.number
+        expected_in_given_unit = expected.number
+        if given_value != expected_value:
+            sizes = {size for dimension, size in UNITS.values() if dimension == expected.dimension}
+            if any(expected.value / size == given_value for size in sizes):
+                return None
+            if expected.dimension == 'percent' and given_value == expected.value / 100:
+                return None
+    else:
+        given_value, expected_value = given.number, expected.value
+        expected_in_given_unit = expected.value
+        if given.dimension == 'percent' and given_value != expected_value and given.value / 100 == expected_value:
+            return None
+    
+    if given_value == expected_value:
+        if form_required and (given.form != expected.form or not given.reduced):
+            return None
+        return True
+    if _rounds_to(given, expected_in_given_unit):
+        return None
+    return False
+
+
+def _compare(given: Quantity, expected: Quantity, form_required: bool) -> Optional[bool]:
+    """Compare one parsed answer with one accepted form."""
+    if expected.kind == 'number' and given.kind == 'number':
+        return _compare_numbers(given, expected, form_required)
+    if expected.kind == 'ratio' and given.kind == 'ratio':
+        if len(given.value) != len(expected.value):
+            return False
+        first, expected_first = given.value[0], expected.value[0]
+        if any(term * expected_first != expected_term * first
+               for term, expected_term in zip(given.value, expected.value)):
+            return False
+        return True if given.reduced or given.value == expected.value else None
+    if expected.kind == 'clock' and given.kind in ('clock', 'ratio'):
+        if given.kind == 'ratio':
+            # "11:15" parses as a ratio; read it as a time without a.m./p.m.
+            if len(given.value) != 2 or any(term.denominator != 1 for term in given.value):
+                return None
+            given = _clock(int(given.value[0]), int(given.value[1]), '', twelve_hour=True)
+            if given is None:
+                return None
+        if given.value == expected.value:
+            return True
+        if given.twelve_hour and given.value % 720 == expected.value % 720:
+            return True
+        return False
+    if expected.kind == 'expression' and given.kind == 'expression':
+        # Letters that aren't the problem's variables are words ("idk"), not an answer
+        if not set(''.join(given.value)) <= set(''.join(expected.value)):
+            return None
+        return given.value == expected.value
+    if expected.kind == 'expression' and given.kind == 'number' and given.dimension is None:
+        # A number where an expression is expected is wrong unless the expression is constant
+        return None if set(expected.value) <= {''} else False
+    return None
+
+
+def check_answer(answer: str, verified_answer: str, problem_text: str = '') -> Optional[bool]:
+    """
+    Return True if answer is clearly equivalent to verified_answer, False if
+    clearly not, and None when the model has to judge it.
+    """
+    if not answer or verified_answer is None:
+        return None
+    expected = parse_verified_answer(verified_answer)
+    given = parse_answer(answer)
+    if not expected or given is None:
+        return None
+    
+    form_required = bool(FORM_REQUIREMENT.search(problem_text or ''))
+    verdicts = [_compare(given, accepted, form_required) for accepted in expected]
+    if True in verdicts:
+        return True
+    if all(verdict is False for verdict in verdicts):
+        return False
+    return None
\ No newline at end of file
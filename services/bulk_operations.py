@@ -2,19 +2,20 @@
 Bulk operations service for performance optimization.
 """
 from typing import Dict, List, Optional, Tuple
-from models.base import get_datastore_client
 from models.problem_progress import ProblemProgress
 from models.user import User
+from services.progress_service import progress_service
 
 
 class BulkOperationsService:
     """Service for high-performance bulk operations."""
     
     def __init__(self):
-        self.client = get_datastore_client()
+        pass
     
     def get_user_dashboard_data_optimized(self, user_id: int, all_topics: List[str], 
-                                         all_problem_ids_by_topic: Dict[str, List[str]]) -> Dict:
+                                         all_problem_ids_by_topic: Dict[str, List[str]],
+                                         include_progress_map: bool = False) -> Dict:
         """
         Optimized dashboard data loading with minimal database calls.
         
@@ -22,6 +23,7 @@ class BulkOperationsService:
             user_id: The user ID
             all_topics: List of all topic names
             all_problem_ids_by_topic: Map of topic -> list of problem IDs
+            include_progress_map: Also load every progress record (a full scan)
             
         Returns:
             Dict with recommended topic and progress summary
@@ -33,24 +35,24 @@ class BulkOperationsService:
         if not recommended_topic:
             recommended_topic = all_topics[0] if all_topics else None
         
-        # 2. Get ALL user progress in single query (instead of per-topic queries)
-        query = self.client.query(kind='ProblemProgress')
-        query.add_filter('user_id', '=', user_id)
-        all_progress_entities = list(query.fetch())
+        # 2. Read the denormalized progress summary (single key lookup)
+        summary = progress_service.get_progress_summary(user_id)
         
-        # 3. Build progress map once
-        progress_map = {entity['problem_id']: entity['status'] for entity in all_progress_entities}
+        # 3. Only scan individual progress records when asked to
+        progress_map = None
+        if include_progress_map:
+            progress_map = ProblemProgress.get_status_map(user_id)
         
-        # 4. Calculate topic summaries efficiently
+        # 4. Calculate topic summaries from the per-topic counts
         topic_summaries = {}
         for topic, problem_ids in all_problem_ids_by_topic.items():
-            mastered = sum(1 for pid in problem_ids if progress_map.get(pid) == 'mastered')
-            in_progress = sum(1 for pid in problem_ids if progress_map.get(pid) == 'in_progress')
+            counts = summary.get_topic_counts(topic)
+            mastered = counts['mastered_count']
             
             topic_summaries[topic] = {
                 'total_problems': len(problem_ids),
                 'mastered_count': mastered,
-                'in_progress_count': in_progress,
+                'in_progress_count': counts['in_progress_count'],
                 'completion_percentage': round((mastered / len(problem_ids)) * 100) if problem_ids else 0
             }
         
@@ -58,6 +60,7 @@ class BulkOperationsService:
             'user': user,
             'recommended_topic': recommended_topic,
             'progress_map': progress_map,
+            'summary': summary,
             'topic_summaries': topic_summaries
         }
     
@@ -133,35 +136,36 @@ class BulkOperationsService:
         
         return topic_data
     
-    def preload_user_session_data(self, user_id: int) -> Dict:
+    def preload_user_session_data(self, user_id: int, include_progress_map: bool = False) -> Dict:
         """
         Preload all user session data in minimal database calls.
         
         Args:
             user_id: The user ID
+            include_progress_map: Also load every progress record (a full scan)
             
         Returns:
-            Dict with user data, all progress, and summary stats
+            Dict with user data, progress summary, and summary stats
         """
         # Single user query
         user = User.get_by_id(user_id)
         
-        # Single progress query for all user progress
-        query = self.client.query(kind='ProblemProgress')
-        query.add_filter('user_id', '=', user_id)
-        all_progress_entities = list(query.fetch())
+        # Overall stats come from the denormalized progress summary
+        summary = progress_service.get_progress_summary(user_id)
         
-        # Build maps
-        progress_map = {entity['problem_id']: entity['status'] for entity in all_progress_entities}
+        progress_map = None
+        if include_progress_map:
+            progress_map = ProblemProgress.get_status_map(user_id)
         
         # Calculate overall stats
-        total_problems_attempted = len(progress_map)
-        mastered_total = sum(1 for status in progress_map.values() if status == 'mastered')
-        in_progress_total = sum(1 for status in progress_map.values() if status == 'in_progress')
+        total_problems_attempted = summary.total_attempted
+        mastered_total = summary.status_counts.get('mastered', 0)
+        in_progress_total = summary.status_counts.get('in_progress', 0)
         
         return {
             'user': user,
             'progress_map': progress_map,
+            'summary': summary,
             'stats': {
                 'total_attempted': total_problems_attempted,
                 'total_mastered': mastered_total,
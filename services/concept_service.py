@@ -98,10 +98,9 @@ class ConceptService:
             return {"error": f"No concepts found for topic: {topic}"}
         
         # Get user's progress on all concepts in this topic
-        concept_progress = {}
-        for concept in concepts:
-            progress = ConceptProgress.get_user_concept_progress(user_id, concept.concept_id)
-            concept_progress[concept.concept_id] = progress
+        concept_ids = [concept.concept_id for concept in concepts]
+        progress_map = ConceptProgress.get_progress_for_concepts(user_id, concept_ids)
+        concept_progress = {concept_id: progress_map.get(concept_id) for concept_id in concept_ids}
         
         # Determine learning pathway
         pathway = self._analyze_learning_pathway(concepts, concept_progress)
@@ -247,11 +246,9 @@ class ConceptService:
             return {"error": f"Concept {concept_id} not found"}
         
         # Check prerequisites
-        all_concept_progress = {}
-        for topic_concepts in self.topic_concepts_cache.values():
-            for c in topic_concepts:
-                progress = ConceptProgress.get_user_concept_progress(user_id, c.concept_id)
-                all_concept_progress[c.concept_id] = progress
+        concept_ids = [c.concept_id for topic_concepts in self.topic_concepts_cache.values() for c in topic_concepts]
+        progress_map = ConceptProgress.get_progress_for_concepts(user_id, concept_ids)
+        all_concept_progress = {concept_id: progress_map.get(concept_id) for concept_id in concept_ids}
         
         prereq_status = self._check_prerequisites(concept, all_concept_progress)
         if not prereq_status["ready"]:
@@ -261,12 +258,13 @@ class ConceptService:
                 "suggested_action": "Complete prerequisite concepts first"
             }
         
-        # Create or update progress
+        # Create or update progress (current state was loaded above)
         progress = ConceptProgress.create_or_update_progress(
             user_id=user_id,
             concept_id=concept_id,
             understanding_level="exploring",
-            confidence_score=10  # Starting confidence
+            confidence_score=10,  # Starting confidence
+            current=all_concept_progress.get(concept_id)
         )
         
         return {
@@ -665,9 +663,10 @@ Make questions that are:
         
         # Get all user's concept progress for this topic
         concepts = self.get_concepts_for_topic(topic)
+        progress_map = ConceptProgress.get_progress_for_concepts(user_id, [c.concept_id for c in concepts])
         
         for concept in concepts:
-            progress = ConceptProgress.get_user_concept_progress(user_id, concept.concept_id)
+            progress = progress_map.get(concept.concept_id)
             
             if progress:
                 # Check for signs of struggle
@@ -4,17 +4,12 @@ Diagnostic quiz service.
 import json
 import random
 from typing import Dict, List
-import google.generativeai as genai
-from config.settings import Config
+from services.llm_gateway import llm_gateway
 
 
 class DiagnosticService:
     """Service class for managing diagnostic quizzes."""
     
-    def __init__(self):
-        genai.configure(api_key=Config.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-    
     def generate_quiz(self, grade: str = 'p6', subject: str = 'math') -> List[Dict]:
         """Generate a balanced diagnostic quiz using stratified sampling."""
         # Handle the actual filename which uses "maths" instead of "math"
@@ -113,8 +108,8 @@ class DiagnosticService:
             - "recommended_topic": string (e.g., "Speed")
             """
 
-            response = self.model.generate_content(report_generator_prompt)
-            cleaned_response_text = response.text.replace('```json', '').replace('```', '').strip()
+            response_text = llm_gateway.generate(report_generator_prompt, 'diagnostic.analyze_results')
+            cleaned_response_text = response_text.replace('```json', '').replace('```', '').strip()
             analysis_json = json.loads(cleaned_response_text)
 
             return analysis_json
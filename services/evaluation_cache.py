@@ -0,0 +1,218 @@
+"""
+Cache of learning-tutor answer evaluations.
+
+Whether an answer to a section is correct only depends on the section and
+the answer, and the common answers ("1/2", "1/6", "yes") come up for
+student after student. EvaluationCache keeps each model verdict under a key
+made of the topic, the section id, the prompt-template version (plus the
+model and a digest of the section text the prompt embeds, so editing either
+starts afresh) and the canonicalized answer, in two tiers:
+- an in-process LRU, answering repeated answers in microseconds;
+- a persistent store shared by the workers of a host and surviving restarts
+  (a SQLite file, or the cache SHARED_CACHE selects), filling the LRU on a hit.
+Only verdicts that came from the model are cached, never fallbacks, and only
+once `confirmations` calls in a row gave the same verdict for the key: a
+single wrong call would otherwise be served to every later student.
+
+A wrong verdict that got cached anyway is purged with invalidate() (one key)
+or purge_section() (every answer to a section, by bumping the section's
+generation, which is part of the key); see scripts/purge_evaluation_cache.py.
+Purges go through the persistent store. In-process entries and generations
+expire after memory_ttl seconds, so a purge reaches every worker within that
+time.
+"""
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+from cachetools import LRUCache, TTLCache
+from config.settings import Config
+from models.cache import SharedCache, SQLiteSharedCache, get_shared_cache
+
+# Longer answers are free text that practically never repeats; they aren't cached
+MAX_CACHED_ANSWER_LENGTH = 100
+
+# Names accepted by EVALUATION_CACHE_STORE
+EVALUATION_CACHE_STORES = ('', 'sqlite', 'shared')
+
+_WHITESPACE = re.compile(r'\s+')
+# Spaces around operators and separators don't change an answer ("1 / 2" is "1/2")
+_OPERATOR_SPACING = re.compile(r'\s*([/+\-*×÷=:,])\s*')
+
+
+def canonical_answer(answer: str) -> str:
+    """Normalize case, whitespace, quotes and trailing full stops of an answer."""
+    answer = _WHITESPACE.sub(' ', answer.casefold()).strip().strip('"\'').strip()
+    answer = _OPERATOR_SPACING.sub(r'\1', answer)
+    return answer.rstrip('.!').strip()
+
+
+class EvaluationCache:
+    """Two-tier (LRU, then persistent store) cache of confirmed evaluation verdicts with hit counters."""
+    
+    def __init__(self, maxsize: int = 10000, store: Optional[SharedCache] = None, ttl: Optional[float] = None,
+                 memory_ttl: float = 300, confirmations: int = 2):
+        self.store = store
+        self.ttl = ttl
+        self.confirmations = max(confirmations, 1)
+        self._entries: TTLCache = TTLCache(maxsize=maxsize, ttl=memory_ttl)
+        self._generations: TTLCache = TTLCache(maxsize=maxsize, ttl=memory_ttl)
+        # Unconfirmed verdicts when there is no store: (verdict, agreeing calls) by key
+        self._pending: LRUCache = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.unconfirmed = 0
+    
+    def _generation(self, topic: str, section_id: str) -> int:
+        if self.store is None:
+            return 0
+        with self._lock:
+            generation = self._generations.get((topic, section_id))
+        if generation is None:
+            generation = self.store.get(f"evaluation-generation:{topic}:{section_id}") or 0
+            with self._lock:
+                self._generations[(topic, section_id)] = generation
+        return generation
+    
+    def key(self, topic: str, section_id: Optional[str], prompt_version: int, answer: str,
+            prompt_inputs: Iterable[str] = ()) -> Optional[str]:
+        """
+        Return the cache key of an evaluation, or None if it shouldn't be cached.
+        
+        prompt_inputs are the section texts the prompt embeds besides the answer.
+        """
+        answer = canonical_answer(answer or '')
+        if not section_id or not answer or len(answer) > MAX_CACHED_ANSWER_LENGTH:
+            return None
+        inputs = hashlib.sha1(json.dumps(list(prompt_inputs)).encode('utf-8')).hexdigest()[:12]
+        generation = self._generation(topic, section_id)
+        return (f"evaluation:{topic}:{section_id}:g{generation}:v{prompt_version}:{Config.LLM_MODEL}:"
+                f"{inputs}:{answer}")
+    
+    def get(self, key: Optional[str]) -> Optional[Any]:
+        """Get a cached verdict, or None on a miss."""
+        if key is None:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self.memory_hits += 1
+                return value
+        
+        value = self.store.get(key) if self.store is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.store_hits += 1
+            self._entries[key] = value
+        return value
+    
+    def _get_pending(self, key: str) -> Optional[Tuple[Any, int]]:
+        if self.store is not None:
+            return self.store.get(f"pending:{key}")
+        with self._lock:
+            return self._pending.get(key)
+    
+    def _set_pending(self, key: str, pending: Optional[Tuple[Any, int]]) -> None:
+        if self.store is not None:
+            if pending is None:
+                self.store.delete(f"pending:{key}")
+            else:
+                self.store.set(f"pending:{key}", pending, ttl=self.ttl)
+            return
+        with self._lock:
+            if pending is None:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = pending
+    
+    def put(self, key: Optional[str], value: Any) -> None:
+        """Record a model verdict; it is cached in both tiers once `confirmations` calls in a row agree."""
+        if key is None:
+            return
+        if self.confirmations > 1:
+            pending = self._get_pending(key)
+            agreeing = pending[1] + 1 if pending is not None and pending[0] == value else 1
+            if agreeing < self.confirmations:
+                self._set_pending(key, (value, agreeing))
+                with self._lock:
+                    self.unconfirmed += 1
+                return
+            self._set_pending(key, None)
+        with self._lock:
+            self._entries[key] = value
+        if self.store is not None:
+            self.store.set(key, value, ttl=self.ttl)
+    
+    def invalidate(self, key: Optional[str]) -> None:
+        """Drop a verdict, and any unconfirmed one, from both tiers."""
+        if key is None:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+        self._set_pending(key, None)
+    
+    def purge_section(self, topic: str, section_id: str) -> None:
+        """Drop the verdicts of every answer to a section, confirmed or not."""
+        prefix = f"evaluation:{topic}:{section_id}:"
+        generation = self.store.incr(f"evaluation-generation:{topic}:{section_id}") if self.store is not None else 0
+        with self._lock:
+            self._generations[(topic, section_id)] = generation
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._entries.pop(key, None)
+            for key in [key for key in self._pending if key.startswith(prefix)]:
+                self._pending.pop(key, None)
+    
+    def clear(self) -> None:
+        """Drop every in-process entry and reset the counters (the store keeps its entries)."""
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = 0
+            self.store_hits = 0
+            self.misses = 0
+            self.unconfirmed = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters per tier and the current size."""
+        with self._lock:
+            lookups = self.memory_hits + self.store_hits + self.misses
+            hits = self.memory_hits + self.store_hits
+            return {
+                'memory_hits': self.memory_hits,
+                'store_hits': self.store_hits,
+                'misses': self.misses,
+                'unconfirmed': self.unconfirmed,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'size': len(self._entries),
+                'maxsize': self._entries.maxsize,
+            }
+
+
+def create_evaluation_cache() -> Optional[EvaluationCache]:
+    """Create the evaluation cache configured in config/settings.py (None when disabled)."""
+    if not Config.EVALUATION_CACHE_ENABLED:
+        return None
+    store_name = Config.EVALUATION_CACHE_STORE.lower()
+    if store_name == 'sqlite':
+        store = SQLiteSharedCache(Config.EVALUATION_CACHE_PATH)
+    elif store_name == 'shared':
+        store = get_shared_cache()
+    elif not store_name:
+        store = None
+    else:
+        raise ValueError(f"Unknown evaluation cache store {store_name!r}; "
+                         f"expected one of {', '.join(repr(name) for name in EVALUATION_CACHE_STORES)}")
+    return EvaluationCache(maxsize=Config.EVALUATION_CACHE_SIZE, store=store,
+                           ttl=Config.EVALUATION_CACHE_TTL_SECONDS,
+                           memory_ttl=Config.EVALUATION_CACHE_MEMORY_TTL_SECONDS,
+                           confirmations=Config.EVALUATION_CACHE_CONFIRMATIONS)
+
+
+# Global instance
+evaluation_cache = create_evaluation_cache()
\ No newline at end of file
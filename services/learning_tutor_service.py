@@ -5,9 +5,14 @@ Supports sequential JSON-based conversation flow where JSON controls content, AI
 
 import json
 import os
-from typing import Dict, List, Tuple, Optional
-import google.generativeai as genai
-from config.settings import Config
+from typing import Callable, Dict, List, Tuple, Optional
+from models.chat_history import message_role, message_text
+from services.evaluation_cache import evaluation_cache
+from services.llm_gateway import llm_gateway
+from services.streaming import stripped
+
+# Version of the evaluation prompts; bump it when changing them so cached verdicts are not reused
+EVALUATION_PROMPT_VERSION = 1
 
 class LearningTutorService:
     """
@@ -20,12 +25,8 @@ class LearningTutorService:
         self.subject = subject
         self.section_prefix = f"{grade}_{subject}_{topic}_step"
         
-        if not Config.GOOGLE_API_KEY:
+        if not llm_gateway.available:
             print(f"WARNING: No GOOGLE_API_KEY found. {topic.title()} tutor will not function.")
-            self.model = None
-        else:
-            genai.configure(api_key=Config.GOOGLE_API_KEY)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
         
         # Load JSON curriculum content
         self.curriculum_content = self._load_curriculum_content()
@@ -137,7 +138,7 @@ class LearningTutorService:
     
     def generate_resume_message(self, conversation_history: List[Dict], user_section_progress: Dict, current_section_id: str) -> str:
         """Generate intelligent resume message"""
-        if not self.model:
+        if not llm_gateway.available:
             raise Exception("AI model is required for resume message but not available.")
         
         section_content = self.get_section_by_id(current_section_id)
@@ -149,7 +150,7 @@ class LearningTutorService:
         conversation_context = ""
         if recent_messages:
             conversation_context = "Recent conversation:\\n" + "\\n".join([
-                f"{msg.get('sender', 'unknown')}: {msg.get('message', '')}" 
+                f"{'student' if message_role(msg) == 'user' else 'tutor'}: {message_text(msg)}" 
                 for msg in recent_messages
             ])
         
@@ -174,8 +175,7 @@ GUIDELINES:
 Generate a resume message:"""
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return llm_gateway.generate(prompt, 'learning.resume').strip()
         except Exception as e:
             print(f"❌ CRITICAL: Error generating resume message: {e}")
             raise Exception(f"AI failed to generate resume message: {e}")
@@ -183,7 +183,8 @@ Generate a resume message:"""
     def generate_tutor_response(self, student_answer: str, conversation_history: List[Dict], 
                               current_step: int = 1, emotional_intelligence: Dict = None,
                               user_progress: Dict = None, current_section_id: str = None,
-                              attempt_counting_context: List[Dict] = None) -> Tuple[str, str, bool, int]:
+                              attempt_counting_context: List[Dict] = None,
+                              on_delta: Callable[[str], None] = None) -> Tuple[str, str, bool, int]:
         """
         Generate tutor response and determine progression
         
@@ -195,11 +196,12 @@ Generate a resume message:"""
             user_progress: Dict containing section-level progress
             current_section_id: ID of the current section being worked on
             attempt_counting_context: Messages used only for counting attempts (current section only)
+            on_delta: Receives the tutor message piece by piece as it is generated (streaming mode)
             
         Returns:
             Tuple of (tutor_message, next_section_id, section_completed, new_attempt_count)
         """
-        if not self.model:
+        if not llm_gateway.available:
             raise Exception("AI model is required but not available.")
         
         # Get section-level progress if user_progress provided
@@ -229,10 +231,10 @@ Generate a resume message:"""
             # This should only count messages from PREVIOUS attempts, not the current one
             for msg in counting_context:
                 msg_section_id = msg.get('section_id')
-                msg_sender = msg.get('sender')
+                msg_role = message_role(msg)
                 
                 # Only count student messages that explicitly belong to the current section
-                if (msg_sender == 'student' and msg_section_id == current_section_id):
+                if (msg_role == 'user' and msg_section_id == current_section_id):
                     previous_attempts_in_section += 1
             
             # Current attempt number = previous attempts in this section + 1
@@ -249,15 +251,24 @@ Generate a resume message:"""
         
         # For completion sections, combine evaluation and sentiment detection in one AI call
         if section_type == 'completion':
-            is_correct, is_ready = self._evaluate_completion_response(student_answer, section_question)
+            is_correct, is_ready = self._evaluate_completion_response(student_answer, section_question,
+                                                                      current_section_id)
         else:
             # Use AI evaluation for regular sections
             is_correct = self._evaluate_student_response(
-                student_answer, sample_correct, sample_incorrect, section_question, section_type
+                student_answer, sample_correct, sample_incorrect, section_question, section_type, current_section_id
             )
             is_ready = None  # Not applicable for non-completion sections
         
         
+        # Remember what was streamed; fixed messages and the rest of the message are sent at the end
+        streamed = []
+        relay_delta = None
+        if on_delta is not None:
+            def relay_delta(text: str) -> None:
+                streamed.append(text)
+                on_delta(text)
+        
         # Initialize progression variables
         next_section_id = current_section_id  # Default to staying in same section
         section_completed = False  # Initialize as False
@@ -278,7 +289,7 @@ Generate a resume message:"""
                     # Student says yes - regular positive transition
                     if next_section_id:
                         tutor_message = self._generate_correct_response_with_transition(
-                            current_section_id, next_section_id
+                            current_section_id, next_section_id, relay_delta
                         )
                     else:
                         tutor_message = f"Excellent work! You've completed all the {self.topic} sections. You're now ready for practice problems!"
@@ -286,7 +297,7 @@ Generate a resume message:"""
                     # Student says no - encouragement then transition
                     if next_section_id:
                         tutor_message = self._generate_encouragement_and_transition(
-                            detailed_explanation, current_section_id, next_section_id
+                            detailed_explanation, current_section_id, next_section_id, relay_delta
                         )
                     else:
                         tutor_message = f"That's perfectly fine! {detailed_explanation} You've completed all the {self.topic} sections. You're now ready for practice problems!"
@@ -299,7 +310,7 @@ Generate a resume message:"""
                 # Generate encouraging response and introduce next section
                 if next_section_id:
                     tutor_message = self._generate_correct_response_with_transition(
-                        current_section_id, next_section_id
+                        current_section_id, next_section_id, relay_delta
                     )
                 else:
                     tutor_message = f"Excellent work! You've completed all the {self.topic} sections. You're now ready for practice problems!"
@@ -313,7 +324,7 @@ Generate a resume message:"""
             # Generate explanation and advance to next section
             if next_section_id:
                 tutor_message = self._generate_explanation_and_advance(
-                    detailed_explanation, current_section_id, next_section_id
+                    detailed_explanation, current_section_id, next_section_id, relay_delta
                 )
             else:
                 # Final section - just provide explanation
@@ -326,9 +337,15 @@ Generate a resume message:"""
             new_attempt_count = attempt_count + 1
             
             tutor_message = self._generate_hint_response(
-                student_answer, section_content, emotional_intelligence
+                student_answer, section_content, emotional_intelligence, relay_delta
             )
         
+        # The deltas join to tutor_message, unless a model call failed mid-stream and a fallback
+        # message replaced it; the final event's tutor_response is then the text to show
+        sent = ''.join(streamed)
+        if relay_delta is not None and tutor_message.startswith(sent) and len(tutor_message) > len(sent):
+            on_delta(tutor_message[len(sent):])
+        
         # For backward compatibility, return in expected format
         # Convert to old format: (tutor_response, new_step, shows_understanding, section_completed, current_section_id, next_section_id)
         new_step = current_step  # Keep same step for backward compatibility
@@ -337,12 +354,54 @@ Generate a resume message:"""
         return (tutor_message, new_step, shows_understanding, section_completed, 
                current_section_id, next_section_id)
     
+    @staticmethod
+    def _response_prompt_inputs(section_type: str, question: str, sample_correct: str,
+                                sample_incorrect: str) -> List[str]:
+        """Section texts the response evaluation prompt embeds (part of its cache key)"""
+        return ['response', section_type, question, sample_correct, sample_incorrect]
+    
+    @staticmethod
+    def _completion_prompt_inputs(question: str) -> List[str]:
+        """Section texts the completion evaluation prompt embeds (part of its cache key)"""
+        return ['completion', question]
+    
+    def purge_cached_evaluations(self, section_id: str, student_answer: str = None) -> None:
+        """Drop cached verdicts for every answer to a section, or only for one answer"""
+        if evaluation_cache is None:
+            return
+        if student_answer is None:
+            evaluation_cache.purge_section(self.topic, section_id)
+            return
+        
+        section_content = self.get_section_by_id(section_id)
+        section_type = section_content.get('type', '')
+        question = section_content.get('question', '')
+        if section_type == 'completion':
+            prompt_inputs = self._completion_prompt_inputs(question)
+        else:
+            prompt_inputs = self._response_prompt_inputs(section_type, question,
+                                                         section_content.get('sample_correct_response', ''),
+                                                         section_content.get('sample_incorrect_response', ''))
+        evaluation_cache.invalidate(evaluation_cache.key(self.topic, section_id, EVALUATION_PROMPT_VERSION,
+                                                         student_answer, prompt_inputs))
+    
     def _evaluate_student_response(self, student_answer: str, sample_correct: str, 
-                                 sample_incorrect: str, question: str, section_type: str = '') -> bool:
+                                 sample_incorrect: str, question: str, section_type: str = '',
+                                 section_id: str = None) -> bool:
         """Use AI to evaluate if student response matches the correct sample"""
-        if not self.model:
+        if not llm_gateway.available:
             return False
         
+        # Verdicts for the same section and answer are reused across students
+        cache_key = None
+        if evaluation_cache is not None:
+            cache_key = evaluation_cache.key(self.topic, section_id, EVALUATION_PROMPT_VERSION, student_answer,
+                                             self._response_prompt_inputs(section_type, question, sample_correct,
+                                                                          sample_incorrect))
+            cached = evaluation_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         # For completion sections, any meaningful response should be considered correct
         if section_type == 'completion':
             prompt = f"""You are evaluating a P6 student's response to a completion question.
@@ -371,22 +430,34 @@ Is the student's answer correct? Consider:
 Respond with only: "CORRECT" or "INCORRECT" """
 
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip().upper()
-            return result == "CORRECT"
+            result = llm_gateway.generate(prompt, 'learning.evaluate_response').strip().upper()
         except Exception as e:
             print(f"❌ CRITICAL: Error evaluating response: {e}")
             raise Exception(f"AI failed to evaluate student response: {e}")
+        
+        is_correct = result == "CORRECT"
+        if evaluation_cache is not None:
+            evaluation_cache.put(cache_key, is_correct)
+        return is_correct
     
-    def _evaluate_completion_response(self, student_answer: str, question: str) -> Tuple[bool, bool]:
+    def _evaluate_completion_response(self, student_answer: str, question: str,
+                                      section_id: str = None) -> Tuple[bool, bool]:
         """Combined evaluation and sentiment detection for completion sections (faster)"""
-        if not self.model:
+        if not llm_gateway.available:
             # Fallback to simple keyword detection if no AI available
             student_lower = student_answer.lower().strip()
             is_correct = any(word in student_lower for word in ['yes', 'no', 'ready', 'not ready', 'confident', 'not confident', 'sure', 'not sure'])
             is_ready = any(word in student_lower for word in ['yes', 'ready', 'confident', 'sure'])
             return is_correct, is_ready
         
+        cache_key = None
+        if evaluation_cache is not None:
+            cache_key = evaluation_cache.key(self.topic, section_id, EVALUATION_PROMPT_VERSION, student_answer,
+                                             self._completion_prompt_inputs(question))
+            cached = evaluation_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         prompt = f"""Analyze this P6 student's completion response:
 
 QUESTION: {question}
@@ -399,15 +470,17 @@ Evaluate TWO things:
 Respond with ONLY: "VALID_POSITIVE" or "VALID_NEGATIVE" or "INVALID" """
 
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip().upper()
+            result = llm_gateway.generate(prompt, 'learning.evaluate_completion').strip().upper()
             
             if result == "VALID_POSITIVE":
-                return True, True
+                evaluation = (True, True)
             elif result == "VALID_NEGATIVE":
-                return True, False
+                evaluation = (True, False)
             else:  # INVALID
-                return False, False
+                evaluation = (False, False)
+            if evaluation_cache is not None:
+                evaluation_cache.put(cache_key, evaluation)
+            return evaluation
                 
         except Exception as e:
             print(f"❌ Error evaluating completion response: {e}")
@@ -419,7 +492,7 @@ Respond with ONLY: "VALID_POSITIVE" or "VALID_NEGATIVE" or "INVALID" """
     
     def _detect_positive_sentiment(self, student_answer: str) -> bool:
         """Use AI to detect if student's completion response indicates readiness/confidence"""
-        if not self.model:
+        if not llm_gateway.available:
             # Fallback to simple keyword detection if no AI available
             student_lower = student_answer.lower().strip()
             return any(word in student_lower for word in ['yes', 'ready', 'confident', 'sure'])
@@ -436,8 +509,7 @@ Examples of NEGATIVE responses: "no", "not ready", "I need more practice", "unce
 Respond with only: "POSITIVE" or "NEGATIVE" """
 
         try:
-            response = self.model.generate_content(prompt)
-            result = response.text.strip().upper()
+            result = llm_gateway.generate(prompt, 'learning.detect_sentiment').strip().upper()
             return result == "POSITIVE"
         except Exception as e:
             print(f"❌ Error detecting sentiment: {e}")
@@ -489,9 +561,10 @@ Now it's your turn! **{section_question}**"""
             
             return f"{intro}{section_text}\\n\\n**{section_question}**"
     
-    def _generate_correct_response_with_transition(self, current_section_id: str, next_section_id: str) -> str:
+    def _generate_correct_response_with_transition(self, current_section_id: str, next_section_id: str,
+                                                   on_delta: Callable[[str], None] = None) -> str:
         """Generate response for correct answer and transition to next section"""
-        if not self.model:
+        if not llm_gateway.available:
             next_section_message = self._generate_section_message(next_section_id)
             return f"That's correct! {next_section_message}"
         
@@ -562,18 +635,20 @@ Generate a brief encouraging response (1-2 sentences) that:
 Then I'll add the next section content."""
 
         try:
-            response = self.model.generate_content(prompt)
-            encouragement = response.text.strip()
+            encouragement = llm_gateway.generate(prompt, 'learning.transition', on_delta=stripped(on_delta)).strip()
             # Include the next section content for a complete transition
+            if on_delta is not None:
+                on_delta(f"\\n\\n{next_content}")
             return f"{encouragement}\\n\\n{next_content}"
         except Exception as e:
             print(f"❌ CRITICAL: Error generating transition: {e}")
             raise Exception(f"AI failed to generate transition message: {e}")
     
     def _generate_explanation_and_advance(self, detailed_explanation: str, 
-                                        current_section_id: str, next_section_id: str) -> str:
+                                        current_section_id: str, next_section_id: str,
+                                        on_delta: Callable[[str], None] = None) -> str:
         """Generate explanation after max attempts and advance"""
-        if not self.model:
+        if not llm_gateway.available:
             raise Exception("AI model is required for explanation and advancement but not available.")
         
         current_section = self.get_section_by_id(current_section_id)
@@ -634,9 +709,10 @@ Generate a natural response that:
 Then I'll add the next section content."""
 
             try:
-                response = self.model.generate_content(prompt)
-                ai_explanation = response.text.strip()
+                ai_explanation = llm_gateway.generate(prompt, 'learning.explanation', on_delta=stripped(on_delta)).strip()
                 # Include the next section content for a complete transition
+                if on_delta is not None:
+                    on_delta(f"\\n\\n{next_content}")
                 return f"{ai_explanation}\\n\\n{next_content}"
             except Exception as e:
                 print(f"❌ CRITICAL: Error generating explanation: {e}")
@@ -656,16 +732,15 @@ Generate a natural response that:
 Keep it brief but meaningful."""
 
             try:
-                response = self.model.generate_content(prompt)
-                return response.text.strip()
+                return llm_gateway.generate(prompt, 'learning.explanation', on_delta=stripped(on_delta)).strip()
             except Exception as e:
                 print(f"❌ CRITICAL: Error generating completion: {e}")
                 raise Exception(f"AI failed to generate completion message: {e}")
     
     def _generate_hint_response(self, student_answer: str, section_content: Dict, 
-                              emotional_intelligence: Dict = None) -> str:
+                              emotional_intelligence: Dict = None, on_delta: Callable[[str], None] = None) -> str:
         """Generate helpful hint based on student's incorrect response"""
-        if not self.model:
+        if not llm_gateway.available:
             return f"That's not quite right. Let me give you a hint: {section_content.get('exact_detailed_explanation', 'Try thinking about it step by step.')}"
         
         section_question = section_content.get('question', '')
@@ -695,8 +770,7 @@ Generate a helpful hint that:
 Keep it brief and supportive."""
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return llm_gateway.generate(prompt, 'learning.hint', on_delta=stripped(on_delta)).strip()
         except Exception as e:
             print(f"❌ Error generating hint: {e}")
             return f"That's not quite right, but good try! Here's a hint: {detailed_explanation[:100]}... Can you try again?"
@@ -735,9 +809,10 @@ Keep it brief and supportive."""
         
         return "\\n".join(context_parts) + "\\n"
     
-    def _generate_encouragement_and_transition(self, detailed_explanation: str, current_section_id: str, next_section_id: str) -> str:
+    def _generate_encouragement_and_transition(self, detailed_explanation: str, current_section_id: str, next_section_id: str,
+                                               on_delta: Callable[[str], None] = None) -> str:
         """Generate encouragement for 'no' response in completion section, then transition to next step"""
-        if not self.model:
+        if not llm_gateway.available:
             next_section_message = self._generate_section_message(next_section_id)
             return f"That's perfectly fine! {detailed_explanation} {next_section_message}"
         
@@ -784,9 +859,10 @@ Generate a natural transition (2-3 sentences) that:
 Make it warm and encouraging, then I'll add the complete next section content."""
 
         try:
-            response = self.model.generate_content(prompt)
-            encouragement = response.text.strip()
+            encouragement = llm_gateway.generate(prompt, 'learning.encouragement', on_delta=stripped(on_delta)).strip()
             # Include the complete next section content for a full transition
+            if on_delta is not None:
+                on_delta(f"\\n\\n{next_content}")
             return f"{encouragement}\\n\\n{next_content}"
         except Exception as e:
             print(f"❌ Error generating encouragement transition: {e}")
@@ -795,7 +871,7 @@ Make it warm and encouraging, then I'll add the complete next section content.""
     
     def generate_practice_review_message(self, completed_count: int, in_progress_count: int, total_attempted: int) -> str:
         """Generate AI-powered practice review message based on student progress"""
-        if not self.model:
+        if not llm_gateway.available:
             raise Exception("AI model is required for practice review but not available.")
         
         prompt = f"""You are a friendly P6 math tutor reviewing a student's {self.topic} practice progress.
@@ -808,8 +884,7 @@ STUDENT'S PRACTICE PROGRESS:
 Generate a warm, encouraging message (2-3 sentences) that acknowledges their progress and motivates continued practice."""
 
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            return llm_gateway.generate(prompt, 'learning.practice_review').strip()
         except Exception as e:
             print(f"❌ CRITICAL: Error generating practice review: {e}")
             raise Exception(f"AI failed to generate practice review: {e}")
@@ -838,7 +913,7 @@ Generate a warm, encouraging message (2-3 sentences) that acknowledges their pro
         
         # Common misconceptions (can be customized per topic)
         if any(word in student_answer_lower for word in ['multiply', 'times', '*']):
-            if 'divide' in conversation_history[-1].get('message', '').lower():
+            if 'divide' in message_text(conversation_history[-1]).lower():
                 misconceptions['detected'].append("confusing_operations")
                 misconceptions['interventions'].append("Clarify division vs multiplication")
         
@@ -0,0 +1,366 @@
+"""
+Gateway for every call to the generative model.
+
+Services and routes call llm_gateway.generate(prompt, route) instead of
+holding their own GenerativeModel. The gateway shares one backend client per
+process and, for each call:
+- gives it a deadline (per route, see ROUTE_DEADLINES) covering the wait for
+  a slot, every attempt and the backoff between them;
+- retries transient errors (unavailable, overloaded, internal) with jittered
+  exponential backoff while the deadline allows;
+- holds a slot of a global semaphore and of the route's own semaphore while
+  the model works, so one slow route cannot tie up every worker thread.
+  Calls that cannot get a slot within LLM_QUEUE_TIMEOUT_SECONDS are shed
+  with LLMBusyError instead of queueing behind the slow ones.
+
+generate_stream(prompt, route) yields the text as the model produces it,
+under the same deadline, slots and retries; an attempt is only retried
+while nothing has been yielded yet.
+
+The backend is chosen by LLM_BACKEND in config/settings.py: "gemini" or
+"fake", a deterministic local stand-in for tests and load runs.
+"""
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from typing import Callable, Dict, Iterator, Optional, Union
+from google.api_core import exceptions as api_exceptions
+from config.settings import Config
+
+# Names accepted by LLM_BACKEND
+LLM_BACKENDS = ('gemini', 'fake')
+
+# Deadline in seconds of each route (call site); other routes get LLM_DEADLINE_SECONDS
+ROUTE_DEADLINES: Dict[str, float] = {
+    'tutor.evaluate_answer': 30,
+    'tutor.predict_misconceptions': 15,
+    'session.welcome_new': 15,
+    'session.welcome_returning': 15,
+    'diagnostic.analyze_results': 45,
+    'learning.resume': 20,
+    'learning.evaluate_response': 10,
+    'learning.evaluate_completion': 10,
+    'learning.detect_sentiment': 10,
+    'learning.transition': 20,
+    'learning.explanation': 20,
+    'learning.hint': 20,
+    'learning.encouragement': 20,
+    'learning.practice_review': 20,
+    'ai.analyze_confidence': 10,
+}
+
+# Errors worth another attempt; anything else (bad request, permissions) fails at once
+TRANSIENT_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    ConnectionError,
+)
+
+# Base delay of the jittered exponential backoff between attempts
+RETRY_BACKOFF_SECONDS = 0.25
+
+
+class LLMError(Exception):
+    """A model call the gateway gave up on."""
+
+
+class LLMTimeoutError(LLMError):
+    """The call's deadline passed before the model answered."""
+
+
+class LLMBusyError(LLMError):
+    """No slot freed up in time; the call was shed without reaching the model."""
+
+
+class LLMBackend(ABC):
+    """Interface of the model backends behind the gateway."""
+    
+    # False when the backend cannot make calls at all (e.g. no API key)
+    available = True
+    
+    @abstractmethod
+    def generate(self, prompt: str, route: str, timeout: float) -> str:
+        """Return the text the model generates for prompt, failing after timeout seconds."""
+    
+    def generate_stream(self, prompt: str, route: str, timeout: float) -> Iterator[str]:
+        """Yield the text for prompt in pieces as it is generated (in one piece unless overridden)."""
+        yield self.generate(prompt, route, timeout)
+
+
+class GeminiBackend(LLMBackend):
+    """Gemini through google.generativeai, with one client shared by every thread."""
+    
+    def __init__(self, api_key: Optional[str], model_name: str):
+        import google.generativeai as genai
+        
+        self.available = bool(api_key)
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name)
+    
+    def generate(self, prompt: str, route: str, timeout: float) -> str:
+        # The gateway retries, so the client library must not retry on its own
+        response = self._model.generate_content(prompt, request_options={'timeout': timeout, 'retry': None})
+        return response.text
+    
+    def generate_stream(self, prompt: str, route: str, timeout: float) -> Iterator[str]:
+        response = self._model.generate_content(prompt, stream=True,
+                                                request_options={'timeout': timeout, 'retry': None})
+        for chunk in response:
+            # Chunks without parts (e.g. only a finish reason) have no text
+            if chunk.parts:
+                yield chunk.text
+
+
+# Canned replies of the fake backend, shaped like what each route parses
+FAKE_RESPONSES: Dict[str, str] = {
+    'tutor.evaluate_answer': '{"is_final_answer_correct": false, "feedback": {"encouragement": '
+                             '"Good effort so far.", "socratic_question": "What would you do first?"}}',
+    'tutor.predict_misconceptions': '{"misconceptions_detected": [], "risk_level": "low", '
+                                    '"preventive_guidance": "", "intervention_needed": false, "student_tip": ""}',
+    'session.welcome_returning': '{"message": "Welcome back! Ready to keep going?", "recommended_topic": "Fractions"}',
+    'diagnostic.analyze_results': '{"score_text": "You answered some questions correctly.", "strengths": [], '
+                                  '"weaknesses": [], "summary_message": "A good starting point.", '
+                                  '"recommended_topic": "Fractions"}',
+    'learning.evaluate_response': 'CORRECT',
+    'learning.evaluate_completion': 'VALID_POSITIVE',
+    'learning.detect_sentiment': 'POSITIVE',
+    'ai.analyze_confidence': '{"confidence_level": "medium", "reasoning": [], "analysis": "Canned analysis"}',
+}
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic local backend for tests and load runs.
+    
+    Replies come from `responses` (route -> text, or a callable taking the
+    prompt), then FAKE_RESPONSES, then a fixed sentence naming the route.
+    Every call is counted in `calls` by route, waits `latency_ms` (timing
+    out like the real model when that exceeds the timeout), and fails with
+    ServiceUnavailable with probability `failure_rate`; inject_failure makes
+    the next calls of a route fail deterministically. Streamed replies come
+    word by word, the first after `first_token_ms` (0: the whole latency)
+    and the rest spread over the remaining latency.
+    """
+    
+    def __init__(self, latency_ms: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None,
+                 responses: Optional[Dict[str, Union[str, Callable[[str], str]]]] = None,
+                 first_token_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.first_token_ms = first_token_ms
+        self.failure_rate = failure_rate
+        self.responses = dict(responses or {})
+        self.calls: Counter = Counter()
+        self._injected: Dict[str, list] = {}
+        self._random = random.Random(seed)
+    
+    def inject_failure(self, route: str, exception: Optional[Exception] = None, times: int = 1) -> None:
+        """Make the next `times` calls of a route raise."""
+        exception = exception or api_exceptions.ServiceUnavailable(f"Injected {route} failure")
+        self._injected.setdefault(route, []).extend([exception] * times)
+    
+    def generate(self, prompt: str, route: str, timeout: float) -> str:
+        return self._respond(prompt, route, timeout, self.latency_ms)
+    
+    def generate_stream(self, prompt: str, route: str, timeout: float) -> Iterator[str]:
+        first_token_ms = min(self.first_token_ms or self.latency_ms, self.latency_ms)
+        chunks = re.findall(r'\S+\s*|\s+', self._respond(prompt, route, timeout, first_token_ms))
+        pause = (self.latency_ms - first_token_ms) / 1000 / max(1, len(chunks) - 1)
+        for index, chunk in enumerate(chunks):
+            if index and pause:
+                time.sleep(pause)
+            yield chunk
+    
+    def _respond(self, prompt: str, route: str, timeout: float, latency_ms: float) -> str:
+        self.calls[route] += 1
+        if latency_ms:
+            if latency_ms / 1000 > timeout:
+                time.sleep(timeout)
+                raise api_exceptions.DeadlineExceeded(f"Fake {route} call exceeded {timeout:.2f}s")
+            time.sleep(latency_ms / 1000)
+        if self._injected.get(route):
+            raise self._injected[route].pop(0)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise api_exceptions.ServiceUnavailable(f"Injected {route} failure")
+        
+        response = self.responses.get(route, FAKE_RESPONSES.get(route))
+        if callable(response):
+            return response(prompt)
+        return response if response is not None else f"This is the canned {route} reply."
+
+
+def create_llm_backend(name: str = None) -> LLMBackend:
+    """Create the model backend configured in config/settings.py (or the one named)."""
+    name = (name or Config.LLM_BACKEND).lower()
+    if name == 'gemini':
+        return GeminiBackend(Config.GOOGLE_API_KEY, Config.LLM_MODEL)
+    if name == 'fake':
+        return FakeLLMBackend(latency_ms=Config.LLM_FAKE_LATENCY_MS, failure_rate=Config.LLM_FAKE_FAILURE_RATE,
+                              first_token_ms=Config.LLM_FAKE_FIRST_TOKEN_MS)
+    raise ValueError(f"Unknown LLM backend {name!r}; expected one of {', '.join(LLM_BACKENDS)}")
+
+
+class LLMGateway:
+    """Deadlines, retries and concurrency limits around one shared model backend."""
+    
+    def __init__(self, backend: Optional[LLMBackend] = None,
+                 max_concurrency: int = Config.LLM_MAX_CONCURRENCY,
+                 route_max_concurrency: int = Config.LLM_ROUTE_MAX_CONCURRENCY,
+                 queue_timeout: float = Config.LLM_QUEUE_TIMEOUT_SECONDS,
+                 max_attempts: int = Config.LLM_MAX_ATTEMPTS):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._route_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self.route_max_concurrency = route_max_concurrency
+        self.queue_timeout = queue_timeout
+        self.max_attempts = max(1, max_attempts)
+        # Outcomes by (route, 'ok' | 'retry' | 'timeout' | 'busy' | 'error')
+        self.stats: Counter = Counter()
+    
+    @property
+    def backend(self) -> LLMBackend:
+        """The shared backend, created from the configuration on first use."""
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_llm_backend()
+        return self._backend
+    
+    def set_backend(self, backend: Optional[LLMBackend]) -> None:
+        """Replace the backend (None goes back to the configured one)."""
+        self._backend = backend
+    
+    @property
+    def available(self) -> bool:
+        """Whether model calls can be made at all."""
+        return self.backend.available
+    
+    def _route_semaphore(self, route: str) -> threading.BoundedSemaphore:
+        semaphore = self._route_slots.get(route)
+        if semaphore is None:
+            with self._lock:
+                semaphore = self._route_slots.setdefault(
+                    route, threading.BoundedSemaphore(self.route_max_concurrency))
+        return semaphore
+    
+    def generate(self, prompt: str, route: str, deadline: Optional[float] = None,
+                 on_delta: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Return the model's text for prompt.
+        
+        route names the call site ('tutor.evaluate_answer'); it selects the
+        deadline (unless one is given, in seconds) and the semaphore the call
+        counts against. With on_delta the text is streamed and on_delta gets
+        each piece as it arrives. Raises LLMBusyError when no slot frees up in
+        time, LLMTimeoutError when the deadline passes, and the backend's
+        error when it is not transient or the attempts run out.
+        """
+        if on_delta is not None:
+            pieces = []
+            for delta in self.generate_stream(prompt, route, deadline):
+                pieces.append(delta)
+                on_delta(delta)
+            return ''.join(pieces)
+        
+        backend = self.backend
+        deadline_at = time.monotonic() + (deadline or ROUTE_DEADLINES.get(route, Config.LLM_DEADLINE_SECONDS))
+        route_slots = self._route_semaphore(route)
+        
+        for attempt in range(1, self.max_attempts + 1):
+            self._acquire(route_slots, route, deadline_at)
+            try:
+                self._acquire(self._slots, route, deadline_at)
+                try:
+                    text = backend.generate(prompt, route, timeout=deadline_at - time.monotonic())
+                finally:
+                    self._slots.release()
+            except TRANSIENT_ERRORS as error:
+                last_error = error
+            except LLMError:
+                raise
+            except Exception:
+                self.stats[route, 'error'] += 1
+                raise
+            else:
+                self.stats[route, 'ok'] += 1
+                return text
+            finally:
+                route_slots.release()
+            
+            self._back_off(route, attempt, last_error, deadline_at)
+    
+    def generate_stream(self, prompt: str, route: str, deadline: Optional[float] = None) -> Iterator[str]:
+        """
+        Yield the model's text for prompt piece by piece as it is generated.
+        
+        Works like generate, with the slots held until the stream ends (or
+        the caller closes the generator). A transient error is retried only
+        before the first piece; after that it is raised to the caller.
+        """
+        backend = self.backend
+        deadline_at = time.monotonic() + (deadline or ROUTE_DEADLINES.get(route, Config.LLM_DEADLINE_SECONDS))
+        route_slots = self._route_semaphore(route)
+        
+        for attempt in range(1, self.max_attempts + 1):
+            streamed = False
+            self._acquire(route_slots, route, deadline_at)
+            try:
+                self._acquire(self._slots, route, deadline_at)
+                try:
+                    for delta in backend.generate_stream(prompt, route, timeout=deadline_at - time.monotonic()):
+                        streamed = True
+                        yield delta
+                finally:
+                    self._slots.release()
+            except TRANSIENT_ERRORS as error:
+                if streamed:
+                    self.stats[route, 'error'] += 1
+                    raise
+                last_error = error
+            except LLMError:
+                raise
+            except Exception:
+                self.stats[route, 'error'] += 1
+                raise
+            else:
+                self.stats[route, 'ok'] += 1
+                return
+            finally:
+                route_slots.release()
+            
+            self._back_off(route, attempt, last_error, deadline_at)
+    
+    def _back_off(self, route: str, attempt: int, error: Exception, deadline_at: float) -> None:
+        """Sleep before the next attempt, or raise if the attempts or the deadline have run out."""
+        # Back off before the next attempt, as long as the deadline leaves time for one
+        wait = random.uniform(0, RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        if time.monotonic() + wait >= deadline_at:
+            self.stats[route, 'timeout'] += 1
+            raise LLMTimeoutError(f"{route} ran out of time after {attempt} attempts: {error}") from error
+        if attempt == self.max_attempts:
+            self.stats[route, 'error'] += 1
+            raise error
+        self.stats[route, 'retry'] += 1
+        print(f"⚠️ LLM {route} attempt {attempt} failed ({error}); retrying in {wait:.2f}s")
+        time.sleep(wait)
+    
+    def _acquire(self, semaphore: threading.BoundedSemaphore, route: str, deadline_at: float) -> None:
+        """Take a slot, waiting no longer than the queue timeout or the deadline."""
+        remaining = deadline_at - time.monotonic()
+        if remaining > 0 and semaphore.acquire(timeout=min(self.queue_timeout, remaining)):
+            return
+        if remaining <= 0:
+            self.stats[route, 'timeout'] += 1
+            raise LLMTimeoutError(f"{route} ran out of time waiting for a slot")
+        self.stats[route, 'busy'] += 1
+        raise LLMBusyError(f"No {route} slot freed up within {min(self.queue_timeout, remaining):.1f}s")
+
+
+# Global instance
+llm_gateway = LLMGateway()
\ No newline at end of file
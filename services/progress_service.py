@@ -2,57 +2,154 @@
 Progress tracking service.
 """
 import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+from models.base import (CONFLICT_ATTEMPTS, ConcurrentUpdateError, get_multi_models, preload_models,
+                         put_multi_models, upsert_models)
 from models.problem_progress import ProblemProgress
 from models.chat_history import ChatHistory
+from models.user_progress_summary import UserProgressSummary
+from services.problem_service import problem_service
+from services.write_behind import create_write_behind_queue
 
 
 class ProgressService:
     """Service class for managing user progress and chat history."""
     
     def __init__(self):
-        pass
+        # Chat turns queue their saves here (None when write-behind is disabled)
+        self.write_behind = create_write_behind_queue(self.save_multiple_progress)
+    
+    def _read_with_queued_messages(self, user_id: int, problem_id: str, load):
+        """Run load() and return its result with the chat messages queued for the problem but not yet written."""
+        if self.write_behind is None:
+            return load(), []
+        result, operations = self.write_behind.read_pending(user_id, problem_id, load)
+        return result, [message for operation in operations for message in operation.get('chat_history') or []]
+    
+    def _queued_statuses(self, user_id: int) -> Dict[str, str]:
+        """Get the latest status of each problem with updates queued for the user."""
+        return self.write_behind.pending_statuses(user_id) if self.write_behind else {}
+    
+    def _with_queued_statuses(self, user_id: int, statuses: Dict[str, str], queued_before: Dict[str, str],
+                              problem_ids: Optional[List[str]] = None) -> Dict[str, str]:
+        """Overlay queued statuses (taken before and after reading statuses) on the statuses read."""
+        if self.write_behind is None:
+            return statuses
+        # Updates written while reading were queued before it; the rest are still queued after it
+        queued = dict(queued_before)
+        queued.update(self.write_behind.pending_statuses(user_id))
+        if problem_ids is not None:
+            wanted = set(problem_ids)
+            queued = {problem_id: status for problem_id, status in queued.items() if problem_id in wanted}
+        statuses.update(queued)
+        return statuses
     
     def get_chat_history(self, user_id: int, problem_id: str) -> List[Dict]:
-        """Get chat history for a specific user and problem."""
-        chat_history = ChatHistory.get_chat_history(user_id, problem_id)
+        """Get chat history for a specific user and problem, including queued messages."""
+        chat_history, queued = self._read_with_queued_messages(
+            user_id, problem_id, lambda: ChatHistory.get_chat_history(user_id, problem_id))
         if chat_history:
-            return chat_history.history
-        return []
+            return chat_history.history + queued
+        return queued
+    
+    def get_recent_chat_history(self, user_id: int, problem_id: str, limit: int) -> List[Dict]:
+        """Get the last `limit` chat messages for a specific user and problem."""
+        chat_history, queued = self._read_with_queued_messages(
+            user_id, problem_id, lambda: ChatHistory.get_chat_history(user_id, problem_id))
+        messages = chat_history.get_recent_messages(limit) if chat_history else []
+        if queued and limit > 0:
+            messages = (messages + queued)[-limit:]
+        return messages
     
-    def save_progress(self, user_id: int, problem_id: str, status: str, chat_history: List[Dict]) -> None:
+    def get_chat_message_count(self, user_id: int, problem_id: str) -> int:
+        """Get the number of chat messages saved or queued for a specific user and problem."""
+        chat_history, queued = self._read_with_queued_messages(
+            user_id, problem_id, lambda: ChatHistory.get_chat_history(user_id, problem_id))
+        return (chat_history.message_count if chat_history else 0) + len(queued)
+    
+    def save_progress(self, user_id: int, problem_id: str, status: str, chat_history: List[Dict],
+                      topic: Optional[str] = None) -> None:
         """Save user progress and chat history for a problem."""
-        # Save progress using ProblemProgress model
-        ProblemProgress.create_or_update_progress(user_id, problem_id, status)
-        
-        # Save chat history - APPEND new messages instead of replacing
-        if chat_history:  # Only save if there are new messages
-            existing_chat = ChatHistory.get_chat_history(user_id, problem_id)
-            if existing_chat and existing_chat.history:
-                # Append new messages to existing history
-                combined_history = existing_chat.history + chat_history
-                print(f"💾 APPEND: Adding {len(chat_history)} messages to existing {len(existing_chat.history)} → Total: {len(combined_history)}")
-            else:
-                # No existing history, use new messages
-                combined_history = chat_history
-                print(f"💾 CREATE: Creating new history with {len(chat_history)} messages")
-            
-            ChatHistory.create_or_update_history(user_id, problem_id, combined_history)
+        self.save_multiple_progress([{
+            'user_id': user_id,
+            'problem_id': problem_id,
+            'status': status,
+            'chat_history': chat_history,
+            'topic': topic
+        }])
     
     def get_all_user_progress(self, user_id: int) -> Dict[str, str]:
-        """Get all progress for a user as a map of problem_id -> status."""
-        progress_list = ProblemProgress.get_all_user_progress(user_id)
-        return {progress.problem_id: progress.status for progress in progress_list}
+        """Get all progress for a user as a map of problem_id -> status, including queued updates."""
+        queued = self._queued_statuses(user_id)
+        return self._with_queued_statuses(user_id, ProblemProgress.get_status_map(user_id), queued)
+    
+    def get_user_progress_page(self, user_id: int, page_size: int,
+                               cursor: Optional[str] = None) -> Tuple[Dict[str, str], Optional[str]]:
+        """Get one page of a user's problem_id -> status map and the cursor for the next page."""
+        return ProblemProgress.get_status_page(user_id, page_size, cursor)
     
     def get_user_progress_for_topic(self, user_id: int, problem_ids: List[str]) -> Dict[str, str]:
         """Get user progress for specific problem IDs."""
+        queued = self._queued_statuses(user_id)
         progress_map = ProblemProgress.get_progress_for_problems(user_id, problem_ids)
-        return {problem_id: progress.status for problem_id, progress in progress_map.items()}
+        statuses = {problem_id: progress.status for problem_id, progress in progress_map.items()}
+        return self._with_queued_statuses(user_id, statuses, queued, problem_ids)
     
-    def get_topic_summary(self, user_id: int, problem_ids: List[str]) -> Dict[str, int]:
-        """Get progress summary for a topic using optimized bulk operations."""
-        # Use bulk operations for better performance
-        from services.bulk_operations import bulk_operations
+    def get_tutor_topic_progress(self, user_id: int, topic: str, section_ids: List[str]) -> Dict[str, str]:
+        """
+        Get learning tutor progress for one topic with a single get_multi.
+        
+        Only the topic's sections (from the tutor service's get_all_section_ids)
+        and its '<topic>_tutor_session' record are read, so the cost doesn't
+        grow with the user's progress in other topics and practice problems.
+        """
+        problem_ids = list(section_ids) + [f"{topic}_tutor_session"]
+        queued = self._queued_statuses(user_id)
+        
+        # The user's summary is loaded alongside so saving the chat turn needs no reads
+        loaded = preload_models([(ProblemProgress, ProblemProgress._generate_key_name(user_id, problem_id))
+                                 for problem_id in problem_ids] +
+                                [(UserProgressSummary, UserProgressSummary._generate_key_name(user_id))])
+        statuses = {problem_id: progress.status for problem_id, progress in zip(problem_ids, loaded) if progress}
+        return self._with_queued_statuses(user_id, statuses, queued, problem_ids)
+    
+    def get_topic_for_problem(self, problem_id: str) -> Optional[str]:
+        """Get the practice topic a problem counts towards in the progress summary."""
+        problem = problem_service.get_practice_problem(problem_id)
+        return problem.get('topic') if problem else None
+    
+    def get_progress_summary(self, user_id: int, rebuild: bool = False) -> UserProgressSummary:
+        """
+        Get the user's progress summary, building it from their progress records if it isn't built yet.
+        
+        The build is written with compare-and-swap against the summary (or
+        placeholder) read before the scan. Progress writes update that entity
+        in their own transaction, so if one lands during the scan the write
+        conflicts and the build runs again. rebuild=True rebuilds a built
+        summary the same way, to repair drift.
+        """
+        summary_key = (UserProgressSummary, UserProgressSummary._generate_key_name(user_id))
+        for attempt in range(1, CONFLICT_ATTEMPTS + 1):
+            # Read from Datastore: the session may hold a copy from before a concurrent write
+            summary = get_multi_models([summary_key])[0]
+            if summary is not None and summary.built and not rebuild:
+                return summary
+            summary = UserProgressSummary.build(
+                user_id, ProblemProgress.iter_user_progress(user_id), self.get_topic_for_problem, summary)
+            try:
+                put_multi_models([summary], rebase=False)
+                return summary
+            except ConcurrentUpdateError:
+                if attempt == CONFLICT_ATTEMPTS:
+                    raise
+    
+    def get_topic_summary(self, user_id: int, problem_ids: List[str], topic: Optional[str] = None) -> Dict[str, int]:
+        """Get progress summary for a topic, from the user's progress summary when the topic is given."""
+        if topic:
+            return {
+                "total_problems": len(problem_ids),
+                **self.get_progress_summary(user_id).get_topic_counts(topic)
+            }
         
         # Get progress map efficiently
         progress_entities = ProblemProgress.get_progress_for_problems(user_id, problem_ids)
@@ -72,9 +169,36 @@ class ProgressService:
         """Get recent progress for a user."""
         return ProblemProgress.get_recent_user_progress(user_id, limit)
     
+    def queue_multiple_progress(self, save_operations: List[Dict]) -> None:
+        """
+        Queue progress updates to be written in the background.
+        
+        Takes the same operations as save_multiple_progress. They are written
+        by the write-behind queue (see services/write_behind.py), or right
+        away when write-behind is disabled (the default). Reads through this
+        service in the same process include them until they are written.
+        """
+        if self.write_behind is None:
+            self.save_multiple_progress(save_operations)
+        else:
+            self.write_behind.enqueue(save_operations)
+    
+    def flush_queued_progress(self, timeout: Optional[float] = None) -> bool:
+        """Write all queued progress updates now; True once nothing is left queued."""
+        return self.write_behind.flush(timeout) if self.write_behind else True
+    
     def save_multiple_progress(self, save_operations: List[Dict]) -> None:
         """
-        Save multiple progress updates efficiently.
+        Save multiple progress updates in a single atomic write.
+        
+        Affected ProblemProgress, ChatHistory and UserProgressSummary entities
+        the request hasn't loaded yet are read with one get_multi inside a
+        transaction (nothing is read when they are all known, see
+        upsert_models). Operations are merged in memory in order (several
+        operations on the same problem each count as an attempt, the last
+        status wins, chat messages are appended to the tail chunk of the
+        history and the summary counts follow each status change), and
+        everything is written with one put_multi.
         
         Args:
             save_operations: List of dicts with keys:
@@ -82,15 +206,64 @@ class ProgressService:
                 - problem_id: str  
                 - status: str
                 - chat_history: List[Dict] (optional)
+                - topic: str (optional) topic the problem counts towards
         """
+        if not save_operations:
+            return
+        
+        progress_keys = []
+        chat_keys = []
+        summary_keys = []
         for operation in save_operations:
-            user_id = operation['user_id']
-            problem_id = operation['problem_id']
-            status = operation['status']
-            chat_history = operation.get('chat_history', [])
+            progress_key = ProblemProgress._generate_key_name(operation['user_id'], operation['problem_id'])
+            if progress_key not in progress_keys:
+                progress_keys.append(progress_key)
+            if operation.get('chat_history'):
+                chat_key = ChatHistory._generate_key_name(operation['user_id'], operation['problem_id'])
+                if chat_key not in chat_keys:
+                    chat_keys.append(chat_key)
+            summary_key = UserProgressSummary._generate_key_name(operation['user_id'])
+            if summary_key not in summary_keys:
+                summary_keys.append(summary_key)
+        
+        def apply_operations(loaded):
+            progress_by_key = dict(zip(progress_keys, loaded[:len(progress_keys)]))
+            chat_by_key = dict(zip(chat_keys, loaded[len(progress_keys):len(progress_keys) + len(chat_keys)]))
+            summary_by_key = dict(zip(summary_keys, loaded[len(progress_keys) + len(chat_keys):]))
             
-            # Use existing save_progress method to maintain all current logic
-            self.save_progress(user_id, problem_id, status, chat_history)
+            # Appends only touch the tail chunk of each history; fetch those together
+            ChatHistory.load_tail_chunks(list(chat_by_key.values()))
+            
+            for operation in save_operations:
+                user_id = operation['user_id']
+                problem_id = operation['problem_id']
+                
+                progress_key = ProblemProgress._generate_key_name(user_id, problem_id)
+                previous = progress_by_key[progress_key]
+                previous_status = previous.status if previous else None
+                # Progress keeps its topic; practice problems saved without one get theirs
+                topic = operation.get('topic') or (previous.topic if previous else None) or \
+                    self.get_topic_for_problem(problem_id)
+                progress = ProblemProgress.record_attempt(previous, user_id, problem_id, operation['status'], topic)
+                progress_by_key[progress_key] = progress
+                
+                # Summaries that aren't built yet only have their placeholder bumped
+                summary_key = UserProgressSummary._generate_key_name(user_id)
+                summary_by_key[summary_key] = ProblemProgress.apply_to_summary(
+                    summary_by_key[summary_key], progress, previous_status)
+                
+                # Chat history is appended, never replaced
+                new_messages = operation.get('chat_history', [])
+                if new_messages:
+                    chat_key = ChatHistory._generate_key_name(user_id, problem_id)
+                    chat_by_key[chat_key] = ChatHistory.append_messages(
+                        chat_by_key[chat_key], user_id, problem_id, new_messages)
+            
+            return list(progress_by_key.values()) + list(chat_by_key.values()) + list(summary_by_key.values())
+        
+        upsert_models([(ProblemProgress, key) for key in progress_keys] +
+                      [(ChatHistory, key) for key in chat_keys] +
+                      [(UserProgressSummary, key) for key in summary_keys], apply_operations)
 
 
 # Global instance
@@ -4,20 +4,25 @@ Session management service.
 import json
 import random
 from typing import Dict, List, Optional
-import google.generativeai as genai
 from google.cloud import texttospeech
 from config.settings import Config
 from models.user import User
 from models.problem_progress import ProblemProgress
+from services.llm_gateway import llm_gateway
 
 
 class SessionService:
     """Service class for session management and personalized greetings."""
     
     def __init__(self):
-        genai.configure(api_key=Config.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
-        self.tts_client = texttospeech.TextToSpeechClient()
+        self._tts_client = None
+    
+    @property
+    def tts_client(self) -> texttospeech.TextToSpeechClient:
+        """Text-to-Speech client, created on first use so importing services needs no credentials."""
+        if self._tts_client is None:
+            self._tts_client = texttospeech.TextToSpeechClient()
+        return self._tts_client
     
     def generate_welcome_message(self, user_id: int, practice_problems: Dict) -> Dict:
         """Generate a personalized welcome message for a logged-in user."""
@@ -49,8 +54,7 @@ class SessionService:
             """
             
             # Generate AI response for new user
-            response = self.model.generate_content(ai_prompt)
-            message = response.text.strip()
+            message = llm_gateway.generate(ai_prompt, 'session.welcome_new').strip()
             
             # Mark user as no longer new
             user.mark_as_returning_user()
@@ -88,9 +92,9 @@ class SessionService:
             """
             
             # Get the personalized response from the AI
-            response = self.model.generate_content(ai_prompt)
+            response_text = llm_gateway.generate(ai_prompt, 'session.welcome_returning')
             try:
-                ai_response = json.loads(response.text.strip())
+                ai_response = json.loads(response_text.strip())
                 message = ai_response['message']
                 recommended_topic = ai_response['recommended_topic']
             except (json.JSONDecodeError, KeyError):
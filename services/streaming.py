@@ -0,0 +1,184 @@
+"""
+Server-sent events for streamed tutor responses.
+
+stream_events(work, on_complete) runs work(emit) on a worker thread and
+yields the SSE stream of it: a `delta` event for every piece of text work
+passes to emit as the model generates it, then one `done` event carrying
+the dict work returns (the same body the JSON endpoint answers with), or an
+`error` event. Comment lines are sent while nothing else is, so proxies keep
+the connection open. on_complete(result) runs after the stream is closed
+(also when the client went away early), which is where the turn's progress
+is persisted.
+
+JSONFieldStream pulls the string values of some fields out of a JSON object
+while it is still being generated, for prompts that answer in JSON.
+StrippedStream relays generated text as its stripped final form reads, for
+responses that are .strip()ed before they are returned and saved.
+"""
+import json
+import queue
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from config.settings import Config
+
+# Emits a piece of text, optionally naming the response field it belongs to
+Emit = Callable[..., None]
+
+# Response headers of event streams: no caching, and no buffering by proxies in front of the app
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+_DONE = object()
+_executor = ThreadPoolExecutor(max_workers=Config.STREAM_WORKERS, thread_name_prefix='stream')
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_events(work: Callable[[Emit], Dict],
+                  on_complete: Optional[Callable[[Dict], None]] = None) -> Iterator[str]:
+    """Yield the SSE stream of work(emit), then call on_complete with its result."""
+    events: queue.Queue = queue.Queue()
+    
+    def emit(text: str, field: Optional[str] = None) -> None:
+        if text:
+            events.put(('delta', {'text': text, 'field': field} if field else {'text': text}))
+    
+    def run() -> None:
+        try:
+            events.put(('done', work(emit)))
+        except Exception as e:
+            print(f"❌ Streamed response failed: {e}")
+            events.put(('error', {'error': 'Could not process your response'}))
+        finally:
+            events.put((_DONE, None))
+    
+    future = _executor.submit(run)
+    result = None
+    try:
+        while True:
+            try:
+                event, data = events.get(timeout=Config.STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if event is _DONE:
+                break
+            if event == 'done':
+                result = data
+            yield sse_event(event, data)
+    finally:
+        # The model's work finishes even when the client left; its turn is still saved
+        if result is None and not future.cancel():
+            future.result()
+            while not events.empty():
+                event, data = events.get_nowait()
+                if event == 'done':
+                    result = data
+        if result is not None and on_complete is not None:
+            try:
+                on_complete(result)
+            except Exception as e:
+                print(f"Save error: {e}")
+
+
+class StrippedStream:
+    """
+    Relay of generated text that joins up to the stripped text.
+    
+    feed() takes the next piece of the text and passes it to emit without the
+    leading whitespace of the text, holding back trailing whitespace until
+    more text follows it, so the emitted pieces join to text.strip().
+    """
+    
+    def __init__(self, emit: Callable[[str], None]):
+        self.emit = emit
+        self._started = False
+        self._held = ''
+    
+    def feed(self, text: str) -> None:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        text = self._held + text
+        body = text.rstrip()
+        self._held = text[len(body):]
+        if body:
+            self.emit(body)
+
+
+def stripped(emit: Optional[Callable[[str], None]]) -> Optional[Callable[[str], None]]:
+    """Wrap an on_delta callback in a StrippedStream (None stays None)."""
+    return StrippedStream(emit).feed if emit is not None else None
+
+
+class JSONFieldStream:
+    """
+    Incremental reader of string fields of a JSON object being generated.
+    
+    feed() takes the next piece of the raw JSON text and passes the newly
+    decoded characters of the listed fields' values to emit(text, field).
+    """
+    
+    def __init__(self, fields: Iterable[str], emit: Emit):
+        self.emit = emit
+        self._buffer = ''
+        self._field_starts = {field: re.compile(r'"%s"\s*:\s*"' % re.escape(field)) for field in fields}
+        self._field: Optional[str] = None
+        self._start = 0
+        self._emitted = 0
+        self._done = set()
+    
+    def feed(self, text: str) -> None:
+        self._buffer += text
+        while True:
+            if self._field is None:
+                starts = [(match.end(), field) for field, pattern in self._field_starts.items()
+                          if field not in self._done
+                          for match in [pattern.search(self._buffer, self._start)] if match]
+                if not starts:
+                    return
+                self._start, self._field = min(starts)
+                self._emitted = 0
+            
+            raw, closed = self._scan(self._buffer[self._start:])
+            try:
+                # Models put raw newlines in strings now and then; strict=False accepts them
+                value = json.loads(f'"{raw}"', strict=False)
+            except ValueError:
+                # Not JSON after all; the final event still carries the parsed response
+                self._field_starts = {}
+                self._field = None
+                return
+            if len(value) > self._emitted:
+                self.emit(value[self._emitted:], self._field)
+                self._emitted = len(value)
+            if not closed:
+                return
+            self._done.add(self._field)
+            self._start += len(raw) + 1
+            self._field = None
+    
+    @staticmethod
+    def _scan(text: str):
+        """Return the complete part of a JSON string body and whether its closing quote arrived."""
+        index = 0
+        while index < len(text):
+            char = text[index]
+            if char == '"':
+                return text[:index], True
+            if char == '\\':
+                length = 6 if text[index + 1:index + 2] == 'u' else 2
+                # A high surrogate (\ud83c) only decodes together with the low one after it
+                if length == 6 and text[index + 2:index + 4].lower() in ('d8', 'd9', 'da', 'db'):
+                    length = 12
+                if index + length > len(text):
+                    break
+                index += length
+            else:
+                index += 1
+        return text[:index], False
\ No newline at end of file
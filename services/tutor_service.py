@@ -2,19 +2,47 @@
 AI Tutor service for problem solving assistance.
 """
 import json
-from typing import Dict, List
-import google.generativeai as genai
+import random
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
 from config.settings import Config
+from models.chat_history import message_role, message_text
+from services.answer_equivalence import check_answer
+from services.llm_gateway import llm_gateway
+from services.streaming import JSONFieldStream
+
+# Congratulations for answers checked without the model
+CORRECT_ANSWER_MESSAGES = [
+    "Excellent work! That's exactly right. 🎉",
+    "Well done! You've got the correct answer. 🌟",
+    "That's correct! Great job working it out. 👏",
+    "Spot on! You solved it. 🎯",
+]
+
+# Values of TUTOR_MISCONCEPTION_MODE
+MISCONCEPTION_MODES = ('parallel', 'sequential', 'off')
 
 
 class TutorService:
     """Service class for AI tutoring functionality."""
     
-    def __init__(self):
-        genai.configure(api_key=Config.GOOGLE_API_KEY)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+    def __init__(self, misconception_mode: str = None, skip_misconceptions_if_correct: bool = None,
+                 misconception_wait: float = None, misconception_workers: int = None):
+        self.misconception_mode = (misconception_mode or Config.TUTOR_MISCONCEPTION_MODE).lower()
+        if self.misconception_mode not in MISCONCEPTION_MODES:
+            raise ValueError(f"Unknown misconception mode {self.misconception_mode!r}; "
+                             f"expected one of {', '.join(MISCONCEPTION_MODES)}")
+        self.skip_misconceptions_if_correct = (Config.TUTOR_SKIP_MISCONCEPTIONS_IF_CORRECT
+                                               if skip_misconceptions_if_correct is None
+                                               else skip_misconceptions_if_correct)
+        self.misconception_wait = (Config.TUTOR_MISCONCEPTION_WAIT_SECONDS
+                                   if misconception_wait is None else misconception_wait)
+        # Threads are started on first use, so modes other than parallel never create any
+        self._executor = ThreadPoolExecutor(max_workers=misconception_workers or Config.TUTOR_MISCONCEPTION_WORKERS,
+                                            thread_name_prefix='misconceptions')
     
-    def evaluate_answer(self, problem: Dict, chat_history: List[Dict], emotional_intelligence: Dict = None) -> Dict:
+    def evaluate_answer(self, problem: Dict, chat_history: List[Dict], emotional_intelligence: Dict = None,
+                        on_delta: Callable[..., None] = None) -> Dict:
         """
         Evaluate a student's answer using AI and provide appropriate feedback.
         
@@ -22,13 +50,11 @@ class TutorService:
             problem: The problem data including problem_text, verified_answer, etc.
             chat_history: The conversation history between student and tutor
             emotional_intelligence: Dict containing emotional state data
+            on_delta: Receives (text, field) pieces of the examiner's feedback as they are generated
             
         Returns:
             Dict containing is_correct boolean and feedback object
         """
-        if not self.model:
-            raise RuntimeError("AI Model not configured")
-
         # --- EMOTIONAL INTELLIGENCE PROCESSING ---
         print(f"\n🧠 PRACTICE MODE - EMOTIONAL INTELLIGENCE RECEIVED:")
         if emotional_intelligence:
@@ -49,14 +75,67 @@ class TutorService:
         latest_student_response = ""
         if chat_history:
             for msg in reversed(chat_history):
-                if msg.get('role') == 'user':
-                    latest_student_response = msg.get('parts', [''])[0]
+                if message_role(msg) == 'user':
+                    latest_student_response = message_text(msg)
                     break
         
-        # AI-powered misconception prediction
-        misconception_context = self._predict_misconceptions_ai(
-            latest_student_response, problem, chat_history)
+        # A bare answer that is clearly right needs neither model call; a clearly wrong one still gets
+        # the examiner's Socratic feedback, with the verdict given
+        local_verdict = self._check_locally(problem, latest_student_response)
+        if local_verdict:
+            return {
+                "is_correct": True,
+                "feedback": {"encouragement": random.choice(CORRECT_ANSWER_MESSAGES), "socratic_question": ""}
+            }
+        
+        if not llm_gateway.available:
+            raise RuntimeError("AI Model not configured")
+        
+        # In parallel mode the examiner runs without the prediction's findings, which are merged afterwards
+        prediction = None
+        misconception_context = ""
+        if self.misconception_mode == 'parallel' and latest_student_response:
+            prediction = self._executor.submit(
+                self._predict_misconceptions_ai, latest_student_response, problem, chat_history)
+        elif self.misconception_mode == 'sequential':
+            misconception_context = self._build_misconception_context(
+                self._predict_misconceptions_ai(latest_student_response, problem, chat_history))
 
+        try:
+            result = self._run_examiner(problem, chat_history, emotional_context, misconception_context, on_delta,
+                                        known_incorrect=local_verdict is False)
+        except Exception as e:
+            print(f"An error occurred during AI generation: {e}")
+            if prediction is not None:
+                prediction.cancel()
+            # Return a fallback response
+            return {
+                "is_correct": False,
+                "feedback": {
+                    "encouragement": "I'm having a little trouble thinking.",
+                    "socratic_question": "Can you try rephrasing?"
+                }
+            }
+        
+        if prediction is not None:
+            self._merge_misconceptions(result, prediction)
+        return result
+    
+    def _run_examiner(self, problem: Dict, chat_history: List[Dict], emotional_context: str,
+                      misconception_context: str, on_delta: Callable[..., None] = None,
+                      known_incorrect: bool = False) -> Dict:
+        """
+        Ask the examiner model for the verdict and feedback (raises when the call or its JSON fails).
+        
+        known_incorrect tells it the latest answer was checked and is wrong,
+        so it only has to write the Socratic feedback.
+        """
+        verdict_context = ""
+        if known_incorrect:
+            verdict_context = ("ANSWER CHECK: The student's latest answer was compared exactly with the verified "
+                               "answer and is NOT correct. Set \"is_final_answer_correct\" to false and write the "
+                               "Socratic hint for it.")
+        
         # Construct the AI examiner prompt
         examiner_prompt = f"""
         You are an expert PSLE Mathematics examiner and tutor. Your task is to analyze a student's conversation and determine if they have solved the problem correctly, then provide the appropriate response.
@@ -70,6 +149,8 @@ class TutorService:
         {emotional_context}
         
         {misconception_context}
+        
+        {verdict_context}
         --- END CONTEXT ---
 
         --- YOUR TASK ---
@@ -84,28 +165,57 @@ class TutorService:
         IMPORTANT: Your entire response must be ONLY the single, valid JSON object.
         """
 
+        # Streamed, the feedback texts are passed on while the rest of the JSON is still coming
+        feedback_stream = JSONFieldStream(('encouragement', 'socratic_question'), on_delta) if on_delta else None
+        response_text = llm_gateway.generate(examiner_prompt, 'tutor.evaluate_answer',
+                                             on_delta=feedback_stream.feed if feedback_stream else None)
+        ai_response_json = json.loads(response_text.replace('```json', '').replace('```', '').strip())
+        
+        # Trust the AI's judgment on correctness, unless the answer was checked and found wrong
+        is_correct = ai_response_json.get("is_final_answer_correct", False) and not known_incorrect
+        
+        return {
+            "is_correct": is_correct,
+            "feedback": ai_response_json.get("feedback", {})
+        }
+    
+    def _merge_misconceptions(self, result: Dict, prediction: Future) -> None:
+        """
+        Fold a prediction that ran alongside the examiner into its result.
+        
+        A correct verdict doesn't wait for it (unless configured to). For an
+        incorrect one it waits up to TUTOR_MISCONCEPTION_WAIT_SECONDS, then
+        adds the student tip about the detected misconceptions to the
+        encouragement.
+        """
+        if result["is_correct"] and self.skip_misconceptions_if_correct:
+            prediction.cancel()
+            return
         try:
-            response = self.model.generate_content(examiner_prompt)
-            ai_response_json = json.loads(response.text.replace('```json', '').replace('```', '').strip())
-            
-            # Trust the AI's judgment on correctness
-            is_correct = ai_response_json.get("is_final_answer_correct", False)
-            
-            return {
-                "is_correct": is_correct,
-                "feedback": ai_response_json.get("feedback", {})
-            }
-
-        except Exception as e:
-            print(f"An error occurred during AI generation: {e}")
-            # Return a fallback response
-            return {
-                "is_correct": False,
-                "feedback": {
-                    "encouragement": "I'm having a little trouble thinking.",
-                    "socratic_question": "Can you try rephrasing?"
-                }
-            }
+            misconceptions = prediction.result(timeout=self.misconception_wait)
+        except FutureTimeoutError:
+            print(f"⏱️ Misconception prediction still running after {self.misconception_wait}s; answering without it")
+            return
+        
+        result["misconceptions"] = misconceptions.get('misconceptions_detected', [])
+        tip = (misconceptions.get('student_tip') or '').strip()
+        if not result["is_correct"] and result["misconceptions"] and tip:
+            feedback = result["feedback"]
+            feedback["encouragement"] = f"{feedback.get('encouragement', '')} {tip}".strip()
+    
+    def _check_locally(self, problem: Dict, student_response: str) -> Optional[bool]:
+        """
+        Check the latest response against the verified answer without the model.
+        
+        Returns True or False when the response is a single value that is
+        clearly equivalent or clearly not (see services/answer_equivalence.py),
+        None when the examiner has to judge it.
+        """
+        is_correct = check_answer(student_response, problem.get('verified_answer'), problem.get('problem_text', ''))
+        if is_correct is not None:
+            print(f"🧮 LOCAL ANSWER CHECK: '{student_response}' vs '{problem.get('verified_answer')}' -> "
+                  f"{'correct' if is_correct else 'incorrect'}")
+        return is_correct
     
     def format_feedback_for_history(self, feedback: Dict, is_correct: bool) -> Dict:
         """Format feedback for saving to chat history."""
@@ -171,10 +281,10 @@ class TutorService:
         
         return "\n".join(context_parts) + "\n"
     
-    def _predict_misconceptions_ai(self, student_response: str, problem: Dict, chat_history: List[Dict]) -> str:
-        """AI-powered misconception prediction for practice problems"""
-        if not student_response or not self.model:
-            return ""
+    def _predict_misconceptions_ai(self, student_response: str, problem: Dict, chat_history: List[Dict]) -> Dict:
+        """AI-powered misconception prediction for practice problems (an empty dict when unavailable)"""
+        if not student_response or not llm_gateway.available:
+            return {}
         
         try:
             # AI prompt for misconception prediction
@@ -201,17 +311,17 @@ Respond with ONLY a JSON object:
     "misconceptions_detected": ["list of specific misconceptions"],
     "risk_level": "low" | "medium" | "high",
     "preventive_guidance": "specific advice for addressing these misconceptions",
-    "intervention_needed": true | false
+    "intervention_needed": true | false,
+    "student_tip": "one short, friendly sentence to the student about the misconception, without giving away the answer"
 }}
 
 If no concerning patterns detected, return:
-{{"misconceptions_detected": [], "risk_level": "low", "preventive_guidance": "", "intervention_needed": false}}
+{{"misconceptions_detected": [], "risk_level": "low", "preventive_guidance": "", "intervention_needed": false, "student_tip": ""}}
 """
 
-            response = self.model.generate_content(misconception_prompt)
+            response_text = llm_gateway.generate(misconception_prompt, 'tutor.predict_misconceptions').strip()
             
             # Parse response
-            response_text = response.text.strip()
             if response_text.startswith('```json'):
                 response_text = response_text[7:]
             if response_text.endswith('```'):
@@ -230,23 +340,26 @@ If no concerning patterns detected, return:
             else:
                 print(f"✅ AI MISCONCEPTION PREDICTION: No concerning patterns detected")
             
-            # Build context for main AI
-            if misconception_result.get('misconceptions_detected'):
-                context_parts = ["MISCONCEPTION PREDICTION ANALYSIS:"]
-                context_parts.append(f"🚨 DETECTED ISSUES: {', '.join(misconception_result['misconceptions_detected'])}")
-                context_parts.append(f"⚠️ RISK LEVEL: {misconception_result['risk_level'].upper()}")
-                context_parts.append(f"→ PREVENTIVE GUIDANCE: {misconception_result['preventive_guidance']}")
-                
-                if misconception_result.get('intervention_needed'):
-                    context_parts.append("🚨 INTERVENTION RECOMMENDED: Address misconceptions proactively")
-                
-                return "\n".join(context_parts) + "\n"
-            
-            return ""
+            return misconception_result
             
         except Exception as e:
             print(f"Error in AI misconception prediction: {e}")
+            return {}
+    
+    def _build_misconception_context(self, misconception_result: Dict) -> str:
+        """Build the examiner prompt's context from a misconception prediction"""
+        if not misconception_result.get('misconceptions_detected'):
             return ""
+        
+        context_parts = ["MISCONCEPTION PREDICTION ANALYSIS:"]
+        context_parts.append(f"🚨 DETECTED ISSUES: {', '.join(misconception_result['misconceptions_detected'])}")
+        context_parts.append(f"⚠️ RISK LEVEL: {str(misconception_result.get('risk_level', '')).upper()}")
+        context_parts.append(f"→ PREVENTIVE GUIDANCE: {misconception_result.get('preventive_guidance', '')}")
+        
+        if misconception_result.get('intervention_needed'):
+            context_parts.append("🚨 INTERVENTION RECOMMENDED: Address misconceptions proactively")
+        
+        return "\n".join(context_parts) + "\n"
 
 
 # Global instance
@@ -0,0 +1,475 @@
+"""
+Write-behind queue for progress saves.
+
+Chat turns hand their progress updates to a WriteBehindQueue instead of
+writing them in the request. Updates to the same user/problem are coalesced
+while they wait, worker threads write them in batches (one
+save_multiple_progress call, i.e. one put_multi, per batch), and every
+update is appended to a local journal before it is queued, so updates still
+queued when a process dies are replayed by the next process that starts.
+Delivery is at least once: a batch written just before a crash, but not yet
+marked done in the journal, is written again on replay, which appends its
+chat messages and counts its attempts a second time.
+
+Reads through ProgressService see the updates still queued in this process
+(read_pending / pending_statuses), so the next chat turn counts attempts on
+the full history. Other processes only see them once they are written, so
+the queue is only safe when every request of a user reaches the same
+process: it is off by default (WRITE_BEHIND_ENABLED) and must stay off for
+multi-worker or multi-instance deployments such as app.yaml's gunicorn
+service. The journal directory has to be on disk that outlives the process.
+
+A batch that fails is retried key by key, so an update that keeps failing
+only holds back its own user/problem. After max_retries its operations are
+dropped and recorded as dead letters instead of being replayed forever.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PendingKey = Tuple[int, str]
+
+
+class PendingWrite:
+    """Queued save operations for one user/problem, in the order they were queued."""
+    
+    __slots__ = ('operations', 'sequences', 'ready_at', 'failures', 'solo')
+    
+    def __init__(self, ready_at: float):
+        self.operations: List[Dict] = []
+        self.sequences: List[int] = []
+        self.ready_at = ready_at
+        self.failures = 0
+        # Written in a batch of its own, after a batch it was in failed
+        self.solo = False
+    
+    def add(self, operation: Dict, sequence: int) -> None:
+        self.operations.append(operation)
+        self.sequences.append(sequence)
+    
+    def extend(self, other: 'PendingWrite') -> None:
+        self.operations.extend(other.operations)
+        self.sequences.extend(other.sequences)
+
+
+class WriteJournal:
+    """
+    Append-only JSONL journal of queued operations, owned by one process.
+    
+    Lines are {"seq": first, "operations": [...]} when operations are queued
+    (numbered first, first + 1, ...) and {"done": [seq, ...]} once they are
+    written. The owner holds an exclusive flock on its file, so a journal
+    that can be locked belongs to a process that is gone.
+    """
+    
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        self._file = open(self.path, 'a', encoding='utf-8')
+        fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._lock = threading.Lock()
+    
+    def append(self, record: Dict) -> None:
+        """Append a record and sync it to disk."""
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def reset(self) -> None:
+        """Drop every record, once nothing in the journal is outstanding."""
+        with self._lock:
+            self._file.truncate(0)
+    
+    def close(self, remove: bool) -> None:
+        with self._lock:
+            if remove:
+                os.remove(self.path)
+            self._file.close()
+    
+    @staticmethod
+    def claim_orphans(directory: str) -> List[Dict]:
+        """Take over journals left by dead processes and return their unwritten operations."""
+        operations = []
+        for path in sorted(glob.glob(os.path.join(directory, '*.jsonl'))):
+            try:
+                journal = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with journal:
+                try:
+                    fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # Owned by a live process
+                # Another process may have claimed and removed it before we got the lock
+                if not os.path.exists(path) or os.stat(path).st_ino != os.fstat(journal.fileno()).st_ino:
+                    continue
+                
+                queued = {}
+                done = set()
+                for line in journal:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # Torn write at the crash
+                    if 'done' in record:
+                        done.update(record['done'])
+                    else:
+                        for offset, operation in enumerate(record['operations']):
+                            queued[record['seq'] + offset] = operation
+                operations.extend(operation for sequence, operation in sorted(queued.items())
+                                  if sequence not in done)
+                os.remove(path)
+        return operations
+
+
+class DeadLetterFile:
+    """Append-only NDJSON file of operations the queue gave up on, for inspection and manual replay."""
+    
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+    
+    def append(self, key: PendingKey, operations: List[Dict], error: Exception) -> None:
+        """Record the operations of one key with the error of their last attempt."""
+        record = {'user_id': key[0], 'problem_id': key[1], 'error': repr(error),
+                  'dropped_at': time.time(), 'operations': operations}
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as dead_letters:
+                dead_letters.write(json.dumps(record, default=str) + '\n')
+                dead_letters.flush()
+                os.fsync(dead_letters.fileno())
+
+
+class WriteBehindQueue:
+    """
+    Bounded, coalescing queue of progress updates drained by worker threads.
+    
+    Pending updates are keyed by (user_id, problem_id); a key being written
+    is not picked up again until that write finishes, so updates to one
+    problem are applied in order. Workers wait `linger` seconds after the
+    first update to a key so that a burst of updates is written together.
+    When a batch fails its keys are retried one per batch, and only a key
+    whose own write fails counts a failure and backs off. After max_retries
+    failures its updates are dropped: they go to the dead-letter file (and
+    `dead_letters`) and are marked done in the journal. If they can't be
+    recorded there, they stay in the journal for the next process.
+    """
+    
+    # Dead letters kept in memory for stats() and inspection
+    MAX_DEAD_LETTERS = 100
+    
+    def __init__(self, flush: Callable[[List[Dict]], None], workers: int = 2, max_pending: int = 1000,
+                 batch_size: int = 25, linger: float = 0.05, max_retries: int = 3,
+                 journal_dir: Optional[str] = None, dead_letter_path: Optional[str] = None):
+        self._flush = flush
+        self.workers = workers
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_retries = max_retries
+        self.journal_dir = journal_dir
+        self._dead_letter_file = DeadLetterFile(dead_letter_path) if dead_letter_path else None
+        self.dead_letters: List[Dict] = []
+        
+        self._cond = threading.Condition()
+        self._pending: 'OrderedDict[PendingKey, PendingWrite]' = OrderedDict()
+        self._in_flight: Dict[PendingKey, PendingWrite] = {}
+        # Writes started per key, to detect a write racing with a read
+        self._writes_started: Dict[PendingKey, int] = {}
+        self._next_sequence = 0
+        # Operations journaled (or about to be) and not yet written or dropped
+        self._unwritten = 0
+        self._threads: List[threading.Thread] = []
+        self._journal: Optional[WriteJournal] = None
+        self._draining = 0
+        self._stopping = False
+        self._abandoned = 0
+        self._counters = {'queued': 0, 'coalesced': 0, 'batches': 0, 'written': 0, 'retries': 0,
+                          'split_batches': 0, 'dropped': 0}
+    
+    def _start(self) -> None:
+        """Open the journal, replay orphaned journals and start the workers (once)."""
+        with self._cond:
+            if self._threads or self._stopping:
+                return
+            orphaned = []
+            if self.journal_dir:
+                orphaned = WriteJournal.claim_orphans(self.journal_dir)
+                self._journal = WriteJournal(self.journal_dir)
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"write-behind-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        atexit.register(self.shutdown)
+        if orphaned:
+            print(f"Write-behind: replaying {len(orphaned)} operations from orphaned journals")
+            self.enqueue(orphaned)
+    
+    def enqueue(self, operations: List[Dict]) -> None:
+        """
+        Queue save operations (the dicts taken by save_multiple_progress).
+        
+        Blocks while max_pending keys are waiting and an operation needs a
+        new one; operations for a key that is already pending never block.
+        """
+        if not operations:
+            return
+        if self._stopping:
+            # Shut down (e.g. during interpreter exit): write in the caller
+            self._flush(operations)
+            return
+        self._start()
+        
+        with self._cond:
+            while (not self._stopping and len(self._pending) >= self.max_pending and
+                   any((op['user_id'], op['problem_id']) not in self._pending for op in operations)):
+                self._cond.wait()
+            first = self._next_sequence
+            self._next_sequence += len(operations)
+            self._unwritten += len(operations)
+        
+        # Journal first, so a queued operation is never only in memory
+        if self._journal is not None:
+            self._journal.append({'seq': first, 'operations': operations})
+        
+        with self._cond:
+            ready_at = time.monotonic() + self.linger
+            for offset, operation in enumerate(operations):
+                key = (operation['user_id'], operation['problem_id'])
+                entry = self._pending.get(key)
+                if entry is None:
+                    entry = self._pending[key] = PendingWrite(ready_at)
+                else:
+                    self._counters['coalesced'] += 1
+                entry.add(operation, first + offset)
+            self._counters['queued'] += len(operations)
+            self._cond.notify_all()
+    
+    def _take_batch(self) -> Optional[List[Tuple[PendingKey, PendingWrite]]]:
+        """Wait for ready entries and move up to batch_size of them in flight (None to stop)."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                batch = []
+                next_ready = None
+                for key, entry in self._pending.items():
+                    if key in self._in_flight:
+                        continue
+                    if entry.ready_at <= now or self._draining or self._stopping:
+                        if entry.solo and batch:
+                            continue
+                        batch.append((key, entry))
+                        if entry.solo or len(batch) >= self.batch_size:
+                            break
+                    elif next_ready is None or entry.ready_at < next_ready:
+                        next_ready = entry.ready_at
+                
+                if batch:
+                    for key, entry in batch:
+                        del self._pending[key]
+                        self._in_flight[key] = entry
+                        self._writes_started[key] = self._writes_started.get(key, 0) + 1
+                    self._cond.notify_all()
+                    return batch
+                if self._stopping and not self._pending:
+                    return None
+                self._cond.wait(None if next_ready is None else next_ready - now)
+    
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            operations = [operation for _, entry in batch for operation in entry.operations]
+            try:
+                self._flush(operations)
+            except Exception as e:
+                self._retry(batch, e)
+                continue
+            self._finish(batch)
+    
+    def _finish(self, batch: List[Tuple[PendingKey, PendingWrite]]) -> None:
+        """Mark a written batch done."""
+        sequences = [sequence for _, entry in batch for sequence in entry.sequences]
+        if self._journal is not None:
+            self._journal.append({'done': sequences})
+        with self._cond:
+            for key, _ in batch:
+                del self._in_flight[key]
+            self._counters['batches'] += 1
+            self._counters['written'] += len(sequences)
+            self._unwritten -= len(sequences)
+            self._cond.notify_all()
+            # Everything journaled has been written; start the journal over
+            if not self._unwritten and not self._abandoned and self._journal is not None:
+                self._journal.reset()
+    
+    def _retry(self, batch: List[Tuple[PendingKey, PendingWrite]], error: Exception) -> None:
+        """
+        Put a failed batch back ahead of newer updates to the same keys.
+        
+        The keys of a failed batch are retried one by one right away; only a
+        key that fails on its own counts the failure and backs off, and after
+        max_retries failures its updates go to the dead letters.
+        """
+        split = len(batch) > 1
+        dropped = []
+        with self._cond:
+            for key, entry in batch:
+                if split:
+                    entry.solo = True
+                    entry.ready_at = time.monotonic()
+                else:
+                    entry.failures += 1
+                    if entry.failures > self.max_retries:
+                        # Stays in flight until recorded, so reads and flush() wait for it
+                        dropped.append((key, entry))
+                        continue
+                    entry.ready_at = time.monotonic() + min(0.1 * 2 ** entry.failures, 5.0)
+                    self._counters['retries'] += 1
+                del self._in_flight[key]
+                newer = self._pending.pop(key, None)
+                if newer is not None:
+                    entry.extend(newer)
+                self._pending[key] = entry
+                self._pending.move_to_end(key, last=False)
+            if split:
+                self._counters['split_batches'] += 1
+            self._cond.notify_all()
+        
+        if split:
+            print(f"Write-behind: batch of {len(batch)} failed, retrying its keys one by one: {error}")
+        else:
+            print(f"Write-behind: write of {batch[0][0]} failed: {error}")
+        for key, entry in dropped:
+            self._drop(key, entry, error)
+    
+    def _drop(self, key: PendingKey, entry: PendingWrite, error: Exception) -> None:
+        """Give up on a key's updates: record them as dead letters and mark them done in the journal."""
+        print(f"Write-behind: dropping {len(entry.operations)} operations for {key} "
+              f"after {entry.failures} attempts: {error}")
+        recorded = True
+        if self._dead_letter_file is not None:
+            try:
+                self._dead_letter_file.append(key, entry.operations, error)
+            except OSError as e:
+                recorded = False
+                print(f"Write-behind: could not record dead letters for {key}, keeping them in the journal: {e}")
+        if recorded and self._journal is not None:
+            self._journal.append({'done': entry.sequences})
+        
+        with self._cond:
+            del self._in_flight[key]
+            self.dead_letters.append({'user_id': key[0], 'problem_id': key[1], 'error': repr(error),
+                                      'operations': entry.operations})
+            del self.dead_letters[:-self.MAX_DEAD_LETTERS]
+            if not recorded:
+                self._abandoned += len(entry.operations)
+            self._unwritten -= len(entry.operations)
+            self._counters['dropped'] += len(entry.operations)
+            self._cond.notify_all()
+    
+    def _queued_operations(self, key: PendingKey) -> List[Dict]:
+        """Operations for a key not yet written, oldest first (caller holds the lock)."""
+        operations = []
+        for entries in (self._in_flight, self._pending):
+            entry = entries.get(key)
+            if entry is not None:
+                operations.extend(entry.operations)
+        return operations
+    
+    def read_pending(self, user_id: int, problem_id: str, load: Callable[[], Any]) -> Tuple[Any, List[Dict]]:
+        """
+        Run load() and return its result with the operations for the key it doesn't include yet.
+        
+        Waits for a write of the key that is already running, and runs load()
+        again if one starts meanwhile, so stored and queued updates are never
+        both missed nor both counted.
+        """
+        key = (user_id, problem_id)
+        while True:
+            with self._cond:
+                while key in self._in_flight:
+                    self._cond.wait()
+                writes_started = self._writes_started.get(key, 0)
+                operations = self._queued_operations(key)
+            result = load()
+            with self._cond:
+                if self._writes_started.get(key, 0) == writes_started:
+                    return result, operations
+    
+    def pending_statuses(self, user_id: int) -> Dict[str, str]:
+        """Get the latest queued status of each of a user's problems with updates not yet written."""
+        with self._cond:
+            statuses = {}
+            for entries in (self._in_flight, self._pending):
+                for (entry_user_id, problem_id), entry in entries.items():
+                    if entry_user_id == user_id:
+                        statuses[problem_id] = entry.operations[-1]['status']
+            return statuses
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything queued now, waiting up to timeout seconds; True if the queue emptied."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._draining += 1
+            self._cond.notify_all()
+            try:
+                while self._pending or self._in_flight:
+                    if not self._threads:
+                        return False
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._draining -= 1
+    
+    def shutdown(self, timeout: float = 10.0) -> None:
+        """Flush, stop the workers and close the journal (kept if anything is left unwritten)."""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+        if self._journal is not None:
+            self._journal.close(remove=flushed and not self._abandoned)
+            self._journal = None
+    
+    def stats(self) -> Dict[str, int]:
+        """Return queue depth and counters."""
+        with self._cond:
+            return {'pending': len(self._pending), 'in_flight': len(self._in_flight), **self._counters}
+
+
+def create_write_behind_queue(flush: Callable[[List[Dict]], None]) -> Optional[WriteBehindQueue]:
+    """Create a queue configured as in config/settings.py, or None when write-behind is disabled."""
+    from config.settings import Config
+    
+    if not Config.WRITE_BEHIND_ENABLED:
+        return None
+    dead_letter_path = Config.WRITE_BEHIND_DEAD_LETTER_PATH
+    if not dead_letter_path and Config.WRITE_BEHIND_JOURNAL_DIR:
+        dead_letter_path = os.path.join(Config.WRITE_BEHIND_JOURNAL_DIR, 'dead-letters.ndjson')
+    return WriteBehindQueue(flush, workers=Config.WRITE_BEHIND_WORKERS,
+                            max_pending=Config.WRITE_BEHIND_MAX_PENDING,
+                            batch_size=Config.WRITE_BEHIND_BATCH_SIZE,
+                            linger=Config.WRITE_BEHIND_LINGER_MS / 1000,
+                            max_retries=Config.WRITE_BEHIND_MAX_RETRIES,
+                            journal_dir=Config.WRITE_BEHIND_JOURNAL_DIR or None,
+                            dead_letter_path=dead_letter_path or None)
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""
+Shared fixtures: every test runs against a fresh in-memory storage backend.
+"""
+import pytest
+
+from models.base import end_session, set_storage_backend
+from models.storage import MemoryBackend
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    """Install a MemoryBackend as the shared storage backend for one test."""
+    memory = MemoryBackend(seed=0)
+    set_storage_backend(memory)
+    yield memory
+    end_session()
+    set_storage_backend(None)
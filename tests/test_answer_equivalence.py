@@ -0,0 +1,68 @@
+"""
+Tests for the local answer check (services/answer_equivalence.py).
+"""
+import pytest
+
+from services.answer_equivalence import check_answer, parse_verified_answer
+
+SIMPLEST_FORM = 'Express your answer as a fraction in simplest form.'
+
+
+@pytest.mark.parametrize('answer, verified', [
+    ('1/2', '1/2'),
+    ('0.5', '1/2'),
+    ('2/4', '1/2'),
+    ('1 / 2', '3/6 or 1/2'),
+    ('66 2/3', '66⅔'),
+    ('73⅓ km/h', '73 ⅓ km/h (≈ 73.3 km/h)'),
+    ('73.3 km/h', '73 ⅓ km/h (≈ 73.3 km/h)'),
+    ('1750 ml', '1.75 L'),
+    ('1.75', '1.75 L'),
+    ('450 cents', '$4.50'),
+    ('75%', '75%'),
+    ('3 : 4', '3:4'),
+    ('11:15', '11:15 a.m.'),
+    ('2x - 7', '-7 + 2x'),
+    ('The answer is 12.', '12'),
+])
+def test_equivalent_answers(answer, verified):
+    assert check_answer(answer, verified) is True
+
+
+@pytest.mark.parametrize('answer, verified', [
+    ('13', '12'),
+    ('2', '1/2'),
+    ('4:3', '3:4'),
+    ('2x + 7', '2x - 7'),
+    ('2 kg', '2 m'),
+    ('11:20 am', '11:15 a.m.'),
+    ('5', '2x - 7'),
+])
+def test_wrong_answers(answer, verified):
+    assert check_answer(answer, verified) is False
+
+
+@pytest.mark.parametrize('answer, verified', [
+    ('I multiplied 1/5 by 1/4 and got 1/20', '1/20'),
+    ('0.33', '1/3'),
+    ('1750', '1.75 L'),
+    ('6:8', '3:4'),
+    ('idk', '2x - 7'),
+    ('', '1/2'),
+    ('12', 'Twelve apples in each basket'),
+])
+def test_answers_left_to_the_model(answer, verified):
+    assert check_answer(answer, verified) is None
+
+
+def test_form_requirement_leaves_other_forms_to_the_model():
+    assert check_answer('2/4', '1/2', SIMPLEST_FORM) is None
+    assert check_answer('0.5', '1/2', SIMPLEST_FORM) is None
+    assert check_answer('1/2', '1/2', SIMPLEST_FORM) is True
+    assert check_answer('1/3', '1/2', SIMPLEST_FORM) is False
+
+
+def test_verified_answer_alternatives():
+    assert len(parse_verified_answer('3/6 or 1/2')) == 2
+    assert len(parse_verified_answer('73 ⅓ km/h (≈ 73.3 km/h)')) == 2
+    assert parse_verified_answer('Twelve apples in each basket') == []
@@ -0,0 +1,43 @@
+"""
+Tests for the blob codec of encoded model fields (models/codec.py).
+"""
+import datetime
+
+import pytest
+
+from models.codec import decode_value, encode_value, is_encoded
+
+
+def test_round_trip():
+    messages = [{'role': 'user', 'parts': ['1/2 ÷ 4 = 1/8']}, {'role': 'model', 'parts': ['Well done!'], 'n': 2}]
+    blob = encode_value(messages)
+    assert is_encoded(blob)
+    assert decode_value(blob) == messages
+
+
+def test_datetimes_round_trip():
+    at = datetime.datetime(2026, 10, 18, 9, 30, 15, 250000, tzinfo=datetime.timezone.utc)
+    messages = [{'role': 'user', 'parts': ['hi'], 'timestamp': at}]
+    decoded = decode_value(encode_value(messages))
+    assert decoded == messages
+    assert decoded[0]['timestamp'].tzinfo is not None
+
+
+def test_values_json_cannot_hold_are_rejected():
+    with pytest.raises(TypeError, match='set'):
+        encode_value([{'role': 'user', 'parts': {'a'}}])
+
+
+def test_unencoded_values_pass_through():
+    legacy = [{'sender': 'student', 'message': '12'}]
+    assert decode_value(legacy) is legacy
+    assert decode_value(None) is None
+
+
+def test_chat_messages_with_datetimes_are_saved():
+    from services.progress_service import ProgressService
+    
+    at = datetime.datetime(2026, 10, 18, 9, 30, tzinfo=datetime.timezone.utc)
+    service = ProgressService()
+    service.save_progress(1, 'P1', 'in_progress', [{'role': 'user', 'parts': ['12'], 'sent_at': at}])
+    assert service.get_chat_history(1, 'P1') == [{'role': 'user', 'parts': ['12'], 'sent_at': at}]
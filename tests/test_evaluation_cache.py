@@ -0,0 +1,105 @@
+"""
+Tests for the learning-tutor evaluation cache (services/evaluation_cache.py).
+"""
+import pytest
+
+import services.learning_tutor_service as learning_tutor_service
+from models.cache import LocalSharedCache
+from services.evaluation_cache import EvaluationCache
+from services.fractions_tutor_service import FractionsTutorService
+from services.llm_gateway import FakeLLMBackend, llm_gateway
+
+SECTION_ID = 'p6_math_fractions_step1_001'
+
+
+def test_verdict_is_cached_once_confirmed():
+    cache = EvaluationCache(store=LocalSharedCache())
+    key = cache.key('fractions', 's1', 1, '1/2')
+    cache.put(key, True)
+    assert cache.get(key) is None
+    cache.put(key, True)
+    assert cache.get(key) is True
+    assert cache.stats()['unconfirmed'] == 1
+
+
+def test_disagreeing_verdicts_start_over():
+    cache = EvaluationCache(confirmations=2)
+    key = cache.key('fractions', 's1', 1, '1/2')
+    cache.put(key, True)
+    cache.put(key, False)
+    assert cache.get(key) is None
+    cache.put(key, False)
+    assert cache.get(key) is False
+
+
+def test_confirmation_counts_across_workers():
+    store = LocalSharedCache()
+    first, second = EvaluationCache(store=store), EvaluationCache(store=store)
+    first.put(first.key('fractions', 's1', 1, '1/2'), True)
+    second.put(second.key('fractions', 's1', 1, '1/2'), True)
+    assert EvaluationCache(store=store).get(first.key('fractions', 's1', 1, '1/2')) is True
+
+
+def test_invalidate_drops_both_tiers():
+    store = LocalSharedCache()
+    cache = EvaluationCache(store=store, confirmations=1)
+    key = cache.key('fractions', 's1', 1, '1/2')
+    cache.put(key, True)
+    cache.invalidate(key)
+    assert cache.get(key) is None
+    assert EvaluationCache(store=store).get(key) is None
+
+
+def test_purge_section_drops_every_answer_of_the_section_only():
+    store = LocalSharedCache()
+    cache = EvaluationCache(store=store, confirmations=1)
+    for answer in ('1/2', '1/3'):
+        cache.put(cache.key('fractions', 's1', 1, answer), True)
+    cache.put(cache.key('fractions', 's10', 1, '1/2'), True)
+    
+    cache.purge_section('fractions', 's1')
+    worker = EvaluationCache(store=store)
+    for current in (cache, worker):
+        assert current.get(current.key('fractions', 's1', 1, '1/2')) is None
+        assert current.get(current.key('fractions', 's1', 1, '1/3')) is None
+        assert current.get(current.key('fractions', 's10', 1, '1/2')) is True
+
+
+def test_purge_section_without_store():
+    cache = EvaluationCache(confirmations=1)
+    key = cache.key('fractions', 's1', 1, '1/2')
+    cache.put(key, True)
+    cache.purge_section('fractions', 's1')
+    assert cache.get(key) is None
+
+
+@pytest.fixture
+def tutor(monkeypatch):
+    cache = EvaluationCache(store=LocalSharedCache())
+    monkeypatch.setattr(learning_tutor_service, 'evaluation_cache', cache)
+    backend = FakeLLMBackend(responses={'learning.evaluate_response': 'CORRECT'})
+    llm_gateway.set_backend(backend)
+    yield FractionsTutorService(), backend
+    llm_gateway.set_backend(None)
+
+
+def evaluate(service, answer):
+    section = service.get_section_by_id(SECTION_ID)
+    return service._evaluate_student_response(answer, section.get('sample_correct_response', ''),
+                                              section.get('sample_incorrect_response', ''),
+                                              section.get('question', ''), section.get('type', ''), SECTION_ID)
+
+
+def test_tutor_reuses_a_verdict_after_two_agreeing_calls(tutor):
+    service, backend = tutor
+    assert [evaluate(service, '1/2') for _ in range(3)] == [True, True, True]
+    assert backend.calls['learning.evaluate_response'] == 2
+
+
+def test_tutor_purges_an_answer(tutor):
+    service, backend = tutor
+    for _ in range(2):
+        evaluate(service, '1/2')
+    service.purge_cached_evaluations(SECTION_ID, '1/2')
+    evaluate(service, '1/2')
+    assert backend.calls['learning.evaluate_response'] == 3
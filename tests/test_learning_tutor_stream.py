@@ -0,0 +1,74 @@
+"""
+Tests that streamed learning-tutor responses join up to the text that is returned and saved.
+"""
+import json
+
+import pytest
+
+import services.learning_tutor_service as learning_tutor_service
+from app import app
+from services.auth_service import auth_service
+from services.fractions_tutor_service import FractionsTutorService
+from services.llm_gateway import FakeLLMBackend, llm_gateway
+from services.streaming import StrippedStream
+
+SECTION_ID = 'p6_math_fractions_step1_002'
+PADDED = '\n  Well done,  you multiplied by the reciprocal!\n\n  '
+
+
+def test_stripped_stream_joins_to_the_stripped_text():
+    pieces = []
+    stream = StrippedStream(pieces.append)
+    for piece in ['\n', '  Well ', 'done', ' \n', 'again', '\n\n', '  ']:
+        stream.feed(piece)
+    assert ''.join(pieces) == 'Well done \nagain'
+
+
+@pytest.fixture
+def tutor(monkeypatch):
+    monkeypatch.setattr(learning_tutor_service, 'evaluation_cache', None)
+    backend = FakeLLMBackend(responses={'learning.transition': PADDED, 'learning.hint': PADDED,
+                                        'learning.explanation': PADDED})
+    llm_gateway.set_backend(backend)
+    yield FractionsTutorService(), backend
+    llm_gateway.set_backend(None)
+
+
+@pytest.mark.parametrize('verdict, previous_attempts', [('CORRECT', 0), ('INCORRECT', 0), ('INCORRECT', 2)])
+def test_deltas_join_to_the_tutor_response(tutor, verdict, previous_attempts):
+    service, backend = tutor
+    backend.responses['learning.evaluate_response'] = verdict
+    previous = [{'role': 'user', 'parts': ['no idea'], 'section_id': SECTION_ID}] * previous_attempts
+    deltas = []
+    
+    tutor_message = service.generate_tutor_response('1/2', [], current_section_id=SECTION_ID,
+                                                    attempt_counting_context=previous, on_delta=deltas.append)[0]
+    
+    assert len(deltas) > 1
+    assert ''.join(deltas) == tutor_message
+    assert tutor_message.startswith('Well done,  you multiplied by the reciprocal!')
+
+
+def sse_events(body):
+    """(event, data) of each event of a server-sent event stream."""
+    events = []
+    for block in body.split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_streamed_chat_deltas_join_to_the_final_tutor_response(tutor):
+    _, backend = tutor
+    backend.responses['learning.evaluate_response'] = 'INCORRECT'
+    token = auth_service.create_user('ada@example.com', 'secret', 'Ada')['token']
+    response = app.test_client().post('/api/grades/p6/subjects/math/fractions-tutor/chat/stream',
+                                      headers={'Authorization': f'Bearer {token}'},
+                                      json={'student_answer': '1/2', 'conversation_history': []})
+    
+    events = sse_events(response.get_data(as_text=True))
+    deltas = [data['text'] for event, data in events if event == 'delta']
+    (done,) = [data for event, data in events if event == 'done']
+    assert deltas
+    assert ''.join(deltas) == done['tutor_response']
@@ -0,0 +1,67 @@
+"""
+Tests for the read-through model cache and its shared caches (models/cache.py).
+"""
+import pytest
+
+import models.cache as cache_module
+from config.settings import Config
+from models.cache import ModelCache, SQLiteSharedCache, get_shared_cache
+from models.user import User
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SQLiteSharedCache(str(tmp_path / 'shared.sqlite3'))
+
+
+def test_workers_sharing_a_store_invalidate_each_other(shared):
+    first, second = ModelCache('User', shared=shared), ModelCache('User', shared=shared)
+    first.put(1, 'old')
+    second.put(1, 'old')
+    
+    second.invalidate(1)
+    assert first.get(1) is None
+    assert second.get(1) is None
+    first.put(1, 'new')
+    assert first.get(1) == 'new'
+
+
+def test_workers_without_a_shared_cache_keep_stale_copies():
+    first, second = ModelCache('User'), ModelCache('User')
+    first.put(1, 'old')
+    second.invalidate(1)
+    assert first.get(1) == 'old'
+
+
+def test_size_zero_disables_caching():
+    cache = ModelCache('User', maxsize=0)
+    cache.put(1, 'value')
+    assert cache.get(1) is None
+
+
+def test_user_saved_in_another_worker_is_reloaded(monkeypatch, shared):
+    user = User.create_user('ada@example.com', 'secret', 'Ada')
+    first, second = ModelCache('User', shared=shared), ModelCache('User', shared=shared)
+    
+    monkeypatch.setattr(User, '_cache', first)
+    assert User.get_by_id(user.id).recommended_topic is None
+    monkeypatch.setattr(User, '_cache', second)
+    User.get_by_id(user.id).update_recommended_topic('fractions')
+    monkeypatch.setattr(User, '_cache', first)
+    assert User.get_by_id(user.id).recommended_topic == 'fractions'
+
+
+def test_sqlite_shared_cache_is_selected_by_settings(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, 'SHARED_CACHE', 'sqlite')
+    monkeypatch.setattr(Config, 'SHARED_CACHE_PATH', str(tmp_path / 'settings.sqlite3'))
+    monkeypatch.setattr(cache_module, '_shared_cache', None)
+    shared = get_shared_cache()
+    assert isinstance(shared, SQLiteSharedCache)
+    assert shared.path == str(tmp_path / 'settings.sqlite3')
+    assert get_shared_cache() is shared
+
+
+def test_unknown_shared_cache_is_rejected(monkeypatch):
+    monkeypatch.setattr(Config, 'SHARED_CACHE', 'memcached')
+    with pytest.raises(ValueError, match='memcached'):
+        get_shared_cache()
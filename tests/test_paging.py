@@ -0,0 +1,84 @@
+"""
+Tests for cursor paging (BaseModel.fetch_page / iter_query).
+"""
+from models.base import next_page_cursor
+from models.problem_progress import ProblemProgress
+from models.storage.base import decode_cursor, encode_cursor
+
+
+class ShortBatchQuery:
+    """
+    Query whose batches stop short of the limit, like Datastore's NOT_FINISHED.
+    
+    Every fetch returns at most batch_size entities of the wrapped query, and
+    next_page_token is None only once nothing follows (NO_MORE_RESULTS).
+    """
+    
+    def __init__(self, query, batch_size):
+        self._query = query
+        self._batch_size = batch_size
+        self.projection = []
+    
+    def fetch(self, limit=None, start_cursor=None):
+        self._query.projection = self.projection
+        everything = list(self._query.fetch())
+        offset = decode_cursor(start_cursor)
+        iterator = self._query.fetch(limit=min(limit, self._batch_size), start_cursor=start_cursor)
+        end = offset + len(list(iterator))
+        iterator.next_page_token = encode_cursor(end) if end < len(everything) else None
+        return iterator
+
+
+def save_progress(user_id, count):
+    for index in range(count):
+        ProblemProgress.create_or_update_progress(user_id, f"P{index:03d}", 'in_progress')
+
+
+def user_query(user_id):
+    query = ProblemProgress.query()
+    query.add_filter('user_id', '=', user_id)
+    return query
+
+
+def test_iter_query_reads_every_page():
+    save_progress(1, 25)
+    save_progress(2, 3)
+    
+    problem_ids = [progress.problem_id for progress in ProblemProgress.iter_query(user_query(1), page_size=10)]
+    assert sorted(problem_ids) == [f"P{index:03d}" for index in range(25)]
+
+
+def test_short_batch_does_not_end_paging():
+    save_progress(1, 7)
+    query = ShortBatchQuery(user_query(1), batch_size=2)
+    
+    items, cursor = ProblemProgress.fetch_page(query, page_size=5)
+    assert len(items) == 2
+    assert cursor is not None
+    
+    problem_ids = [progress.problem_id for progress in ProblemProgress.iter_query(query, page_size=5)]
+    assert sorted(problem_ids) == [f"P{index:03d}" for index in range(7)]
+
+
+def test_status_pages_cover_all_progress_with_short_batches():
+    save_progress(1, 7)
+    query = ShortBatchQuery(user_query(1), batch_size=3)
+    
+    statuses, cursor = {}, None
+    while True:
+        rows, cursor = ProblemProgress.fetch_page(query, 5, cursor, projection=['problem_id', 'status'])
+        statuses.update({row['problem_id']: row['status'] for row in rows})
+        if cursor is None:
+            break
+    assert len(statuses) == 7
+
+
+def test_next_page_cursor_follows_the_iterator_only():
+    class Iterator:
+        def __init__(self, token):
+            self.next_page_token = token
+    
+    assert next_page_cursor(Iterator(None)) is None
+    assert next_page_cursor(Iterator(b'')) is None
+    assert next_page_cursor(Iterator(b'Q1VSU09S')) == 'Q1VSU09S'
+    assert next_page_cursor(Iterator('Q1VSU09S')) == 'Q1VSU09S'
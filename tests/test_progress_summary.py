@@ -0,0 +1,98 @@
+"""
+Tests for the per-user progress summary (UserProgressSummary via ProgressService).
+"""
+from models.problem_progress import ProblemProgress
+from models.user_progress_summary import UserProgressSummary
+from services.problem_service import problem_service
+from services.progress_service import ProgressService
+
+PRACTICE_PROBLEM_ID = 'FRAC-S1-E1'
+
+
+def fresh_build(service, user_id):
+    """The summary a scan of the user's progress gives now."""
+    return UserProgressSummary.build(user_id, ProblemProgress.iter_user_progress(user_id),
+                                     service.get_topic_for_problem)
+
+
+def counts(summary):
+    """The summary's counts, without the zero counts incremental updates leave behind."""
+    def nonzero(status_counts):
+        return {status: count for status, count in status_counts.items() if count}
+    
+    topics = {topic: nonzero(status_counts) for topic, status_counts in summary.topics.items()}
+    return topics, nonzero(summary.status_counts), summary.total_attempted, summary.tutor_sessions
+
+
+def test_practice_problem_exists():
+    assert problem_service.get_practice_problem(PRACTICE_PROBLEM_ID)['topic'] == 'Fractions'
+
+
+def test_topic_is_stored_with_progress():
+    service = ProgressService()
+    service.save_multiple_progress([
+        {'user_id': 1, 'problem_id': PRACTICE_PROBLEM_ID, 'status': 'in_progress'},
+        {'user_id': 1, 'problem_id': 'p6_math_fractions_step1_001', 'status': 'completed', 'topic': 'fractions'},
+        {'user_id': 1, 'problem_id': 'fractions_tutor_session', 'status': 'in_progress'},
+    ])
+    
+    assert ProblemProgress.get_user_progress(1, PRACTICE_PROBLEM_ID).topic == 'Fractions'
+    assert ProblemProgress.get_user_progress(1, 'p6_math_fractions_step1_001').topic == 'fractions'
+    
+    summary = service.get_progress_summary(1)
+    assert summary.topics == {'Fractions': {'in_progress': 1}, 'fractions': {'completed': 1}}
+    assert summary.total_attempted == 3
+    assert summary.tutor_sessions == {'fractions_tutor_session': 'in_progress'}
+
+
+def test_first_write_creates_placeholder_then_writes_keep_built_summary_current():
+    service = ProgressService()
+    service.save_progress(1, PRACTICE_PROBLEM_ID, 'in_progress', [])
+    
+    placeholder = UserProgressSummary.get_for_user(1)
+    assert not placeholder.built
+    assert placeholder.unbuilt_writes == 1
+    
+    summary = service.get_progress_summary(1)
+    assert summary.built
+    service.save_progress(1, PRACTICE_PROBLEM_ID, 'mastered', [])
+    service.save_multiple_progress([{'user_id': 1, 'problem_id': 'p6_math_algebra_step1_001',
+                                     'status': 'in_progress', 'topic': 'algebra'}])
+    
+    stored = UserProgressSummary.get_for_user(1)
+    assert counts(stored) == counts(fresh_build(service, 1))
+    assert stored.topics['Fractions'] == {'in_progress': 0, 'mastered': 1}
+
+
+def test_build_racing_with_a_write_is_redone(monkeypatch):
+    service = ProgressService()
+    service.save_progress(1, 'P1', 'in_progress', [], topic='Algebra')
+    
+    scan = ProblemProgress.iter_user_progress
+    raced = []
+    
+    def scan_then_write(user_id, *args, **kwargs):
+        records = list(scan(user_id, *args, **kwargs))
+        if not raced:
+            # Another request saves progress after the scan, before the build is written
+            raced.append(True)
+            service.save_progress(user_id, 'P2', 'mastered', [], topic='Algebra')
+        return iter(records)
+    
+    monkeypatch.setattr(ProblemProgress, 'iter_user_progress', staticmethod(scan_then_write))
+    summary = service.get_progress_summary(1)
+    monkeypatch.undo()
+    
+    assert summary.topics == {'Algebra': {'in_progress': 1, 'mastered': 1}}
+    assert counts(UserProgressSummary.get_for_user(1)) == counts(fresh_build(service, 1))
+
+
+def test_rebuild_repairs_a_drifted_summary():
+    service = ProgressService()
+    service.save_progress(1, 'P1', 'mastered', [], topic='Algebra')
+    summary = service.get_progress_summary(1)
+    summary.topics = {'Algebra': {'mastered': 5}}
+    summary.save()
+    
+    rebuilt = service.get_progress_summary(1, rebuild=True)
+    assert rebuilt.topics == {'Algebra': {'mastered': 1}}
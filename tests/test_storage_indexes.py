@@ -0,0 +1,58 @@
+"""
+Tests that the local backends answer queries from indexes like Datastore does.
+"""
+import datetime
+
+import pytest
+from google.cloud import datastore
+
+from models.storage import MemoryBackend, SQLiteBackend
+
+UPDATED_AT = datetime.datetime(2026, 10, 18, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'entities.sqlite3'))
+    return MemoryBackend()
+
+
+def put(storage, name, exclude_from_indexes=()):
+    entity = datastore.Entity(key=storage.key('Note', name), exclude_from_indexes=exclude_from_indexes)
+    entity.update({'user_id': 1, 'updated_at': UPDATED_AT, 'status': 'open'})
+    storage.put(entity)
+
+
+def names(storage, filters=(), order=(), projection=()):
+    query = storage.query('Note')
+    for name, operator, value in filters:
+        query.add_filter(name, operator, value)
+    query.order = list(order)
+    query.projection = list(projection)
+    return [entity.key.name for entity in query.fetch()]
+
+
+def test_filter_on_excluded_property_returns_nothing(storage):
+    put(storage, 'unindexed', exclude_from_indexes=('user_id', 'status'))
+    assert names(storage, [('user_id', '=', 1)]) == []
+    assert names(storage, [('status', '=', 'open')]) == []
+    assert names(storage, [('user_id', '=', 1), ('updated_at', '<=', UPDATED_AT)]) == []
+    put(storage, 'indexed')
+    assert names(storage, [('user_id', '=', 1)]) == ['indexed']
+    assert names(storage, [('status', '=', 'open')]) == ['indexed']
+
+
+def test_order_on_excluded_property_skips_the_entity(storage):
+    put(storage, 'unindexed', exclude_from_indexes=('updated_at',))
+    put(storage, 'indexed')
+    assert names(storage, order=['-updated_at']) == ['indexed']
+    assert names(storage, [('user_id', '=', 1)], order=['-updated_at']) == ['indexed']
+    assert names(storage) == ['indexed', 'unindexed']
+
+
+def test_projection_of_excluded_property_skips_the_entity(storage):
+    put(storage, 'unindexed', exclude_from_indexes=('status',))
+    put(storage, 'indexed')
+    assert names(storage, projection=['status']) == ['indexed']
+    assert names(storage, [('user_id', '=', 1)], projection=['status']) == ['indexed']
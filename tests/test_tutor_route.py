@@ -0,0 +1,83 @@
+"""
+Tests for practice-mode answer submission (routes/tutor.py, TutorService.evaluate_answer).
+"""
+import json
+
+import pytest
+
+from app import app
+from models.problem_progress import ProblemProgress
+from services.auth_service import auth_service
+from services.llm_gateway import FakeLLMBackend, llm_gateway
+
+PROBLEM_ID = 'FRAC-S1-E1'
+SUBMIT_URL = '/api/grades/p6/subjects/math/tutor/submit_answer'
+STRUGGLING = {'consecutive_errors': 3, 'struggling_pattern': True}
+
+
+class Examiner:
+    """Fake examiner that records its prompts and answers with a fixed verdict and Socratic question."""
+    
+    def __init__(self, is_correct=False):
+        self.is_correct = is_correct
+        self.prompts = []
+    
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        return json.dumps({'is_final_answer_correct': self.is_correct,
+                           'feedback': {'encouragement': 'Good try.',
+                                        'socratic_question': 'What do you multiply 1/5 by when dividing by 4?'}})
+
+
+@pytest.fixture
+def examiner():
+    examiner = Examiner()
+    backend = FakeLLMBackend(responses={
+        'tutor.evaluate_answer': examiner,
+        'tutor.predict_misconceptions': json.dumps({'misconceptions_detected': ['Multiplied by the divisor'],
+                                                    'student_tip': 'Dividing by 4 makes a number smaller.'}),
+    })
+    llm_gateway.set_backend(backend)
+    examiner.backend = backend
+    yield examiner
+    llm_gateway.set_backend(None)
+
+
+def submit(answer, emotional_intelligence=None):
+    """Submit an answer as a new user; returns the response and the user's ID."""
+    token = auth_service.create_user('ada@example.com', 'secret', 'Ada')['token']
+    response = app.test_client().post(SUBMIT_URL, headers={'Authorization': f'Bearer {token}'}, json={
+        'problem_id': PROBLEM_ID,
+        'chat_history': [{'role': 'user', 'parts': [answer]}],
+        'emotional_intelligence': emotional_intelligence or {},
+    })
+    return response, auth_service.verify_token(token)['user_id']
+
+
+def test_wrong_answer_gets_the_examiners_socratic_feedback(examiner):
+    response, user_id = submit('4/5', STRUGGLING)
+    
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['is_correct'] is False
+    assert body['feedback']['socratic_question'] == 'What do you multiply 1/5 by when dividing by 4?'
+    assert body['feedback']['encouragement'] == 'Good try. Dividing by 4 makes a number smaller.'
+    assert body['misconceptions'] == ['Multiplied by the divisor']
+    assert examiner.backend.calls['tutor.evaluate_answer'] == 1
+    prompt, = examiner.prompts
+    assert 'is NOT correct' in prompt
+    assert 'HIGH ERROR RATE' in prompt and 'STRUGGLING PATTERN' in prompt
+    assert ProblemProgress.get_user_progress(user_id, PROBLEM_ID).status == 'in_progress'
+
+
+def test_checked_wrong_answer_stays_wrong_whatever_the_examiner_says(examiner):
+    examiner.is_correct = True
+    body = submit('4/5')[0].get_json()
+    assert body['is_correct'] is False
+
+
+def test_clearly_correct_answer_needs_no_model_call(examiner):
+    body = submit('1/20')[0].get_json()
+    assert body['is_correct'] is True
+    assert body['feedback']['encouragement']
+    assert not examiner.backend.calls
@@ -0,0 +1,98 @@
+"""
+Tests for compare-and-swap writes of versioned models (_write_models in models/base.py).
+"""
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+import models.base as base
+from models.base import CONFLICT_ATTEMPTS, ConcurrentUpdateError, put_multi_models
+from models.problem_progress import ProblemProgress
+
+
+def stored_progress():
+    """Write a progress record and return two copies loaded from it, as two concurrent requests would."""
+    put_multi_models([ProblemProgress.record_attempt(None, 1, 'FRAC-S1-E1', 'in_progress')])
+    return ProblemProgress.get_user_progress(1, 'FRAC-S1-E1'), ProblemProgress.get_user_progress(1, 'FRAC-S1-E1')
+
+
+def test_stale_write_is_rebased_on_the_stored_entity():
+    first, second = stored_progress()
+    ProblemProgress.record_attempt(first, 1, 'FRAC-S1-E1', 'mastered')
+    put_multi_models([first])
+    
+    second.attempts += 1
+    second.topic = 'Fractions'
+    put_multi_models([second])
+    
+    stored = ProblemProgress.get_user_progress(1, 'FRAC-S1-E1')
+    assert stored.status == 'mastered'
+    assert stored.topic == 'Fractions'
+    assert stored.attempts == 3
+    assert stored._version == second._version == 3
+
+
+def test_stale_write_without_rebase_raises_and_writes_nothing():
+    first, second = stored_progress()
+    ProblemProgress.record_attempt(first, 1, 'FRAC-S1-E1', 'mastered')
+    put_multi_models([first])
+    
+    ProblemProgress.record_attempt(second, 1, 'FRAC-S1-E1', 'in_progress')
+    with pytest.raises(ConcurrentUpdateError) as error:
+        put_multi_models([second], rebase=False)
+    
+    (model, entity), = error.value.conflicts
+    assert model is second
+    assert entity['status'] == 'mastered'
+    stored = ProblemProgress.get_user_progress(1, 'FRAC-S1-E1')
+    assert (stored.status, stored.attempts, stored._version) == ('mastered', 2, 2)
+
+
+def test_new_model_conflicts_with_an_entity_written_meanwhile():
+    stored_progress()
+    duplicate = ProblemProgress.record_attempt(None, 1, 'FRAC-S1-E1', 'mastered')
+    with pytest.raises(ConcurrentUpdateError):
+        put_multi_models([duplicate], rebase=False)
+    
+    put_multi_models([duplicate])
+    stored = ProblemProgress.get_user_progress(1, 'FRAC-S1-E1')
+    assert (stored.status, stored.attempts) == ('mastered', 2)
+
+
+def test_model_deleted_meanwhile_is_written_again():
+    first, second = stored_progress()
+    first.delete()
+    second.status = 'mastered'
+    put_multi_models([second])
+    
+    stored = ProblemProgress.get_user_progress(1, 'FRAC-S1-E1')
+    assert (stored.status, stored._version) == ('mastered', 1)
+
+
+def test_gives_up_after_conflict_attempts(monkeypatch):
+    first, _ = stored_progress()
+    competing = []
+    
+    def competing_write(attempt):
+        # Another writer gets in before every retry
+        other = ProblemProgress.get_user_progress(1, 'FRAC-S1-E1')
+        other.attempts += 1
+        put_multi_models([other])
+        competing.append(attempt)
+    
+    monkeypatch.setattr(base, '_wait_before_retry', competing_write)
+    first.status = 'mastered'
+    competing_write(0)
+    with pytest.raises(ConcurrentUpdateError):
+        put_multi_models([first])
+    assert competing == list(range(CONFLICT_ATTEMPTS))
+    assert ProblemProgress.get_user_progress(1, 'FRAC-S1-E1').status == 'in_progress'
+
+
+def test_aborted_commit_is_retried(backend):
+    first, _ = stored_progress()
+    backend.inject_failure('commit', api_exceptions.Aborted("contention"))
+    first.status = 'mastered'
+    put_multi_models([first])
+    
+    assert backend.rpcs['commit'] == 3
+    assert ProblemProgress.get_user_progress(1, 'FRAC-S1-E1').status == 'mastered'
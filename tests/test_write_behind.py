@@ -0,0 +1,124 @@
+"""
+Tests for the write-behind queue (services/write_behind.py).
+"""
+import json
+import os
+import threading
+
+import pytest
+
+from services.write_behind import WriteBehindQueue
+
+
+class Recorder:
+    """flush callback that records written batches and fails for some problems."""
+    
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.batches = []
+        self.lock = threading.Lock()
+    
+    def __call__(self, operations):
+        if any(operation['problem_id'] in self.failing for operation in operations):
+            raise RuntimeError("write failed")
+        with self.lock:
+            self.batches.append(list(operations))
+    
+    def written(self):
+        return [operation for batch in self.batches for operation in batch]
+
+
+def operation(user_id, problem_id, status='in_progress', message=None):
+    return {'user_id': user_id, 'problem_id': problem_id, 'status': status,
+            'chat_history': [{'role': 'user', 'parts': [message]}] if message else []}
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+    
+    def make(flush, **options):
+        options.setdefault('linger', 0.01)
+        queue = WriteBehindQueue(flush, **options)
+        queues.append(queue)
+        return queue
+    
+    yield make
+    for queue in queues:
+        queue.shutdown(timeout=5)
+
+
+def test_updates_to_one_problem_are_coalesced_in_order(make_queue):
+    recorder = Recorder()
+    queue = make_queue(recorder, linger=0.5)
+    queue.enqueue([operation(1, 'P1', message='first')])
+    queue.enqueue([operation(1, 'P1', message='second'), operation(1, 'P2')])
+    queue.enqueue([operation(1, 'P1', status='mastered', message='third')])
+    
+    assert queue.pending_statuses(1) == {'P1': 'mastered', 'P2': 'in_progress'}
+    assert queue.flush(timeout=5)
+    
+    assert len(recorder.batches) == 1
+    messages = [op['chat_history'][0]['parts'][0] for op in recorder.written() if op['problem_id'] == 'P1']
+    assert messages == ['first', 'second', 'third']
+    stats = queue.stats()
+    assert stats['coalesced'] == 2
+    assert stats['written'] == 4
+    assert queue.pending_statuses(1) == {}
+
+
+def test_read_pending_returns_operations_not_yet_written(make_queue):
+    queue = make_queue(Recorder(), linger=5)
+    queue.enqueue([operation(1, 'P1', message='queued')])
+    
+    result, operations = queue.read_pending(1, 'P1', lambda: 'stored')
+    assert result == 'stored'
+    assert [op['chat_history'][0]['parts'][0] for op in operations] == ['queued']
+    assert queue.read_pending(1, 'P2', lambda: None)[1] == []
+
+
+def test_failing_key_does_not_hold_back_its_batch(make_queue):
+    recorder = Recorder(failing={'BAD'})
+    queue = make_queue(recorder, linger=0.5, max_retries=2)
+    queue.enqueue([operation(1, 'P1'), operation(2, 'BAD'), operation(3, 'P3')])
+    
+    assert queue.flush(timeout=5)
+    
+    assert sorted((op['user_id'], op['problem_id']) for op in recorder.written()) == [(1, 'P1'), (3, 'P3')]
+    stats = queue.stats()
+    assert stats['split_batches'] == 1
+    assert stats['retries'] == 2
+    assert stats['dropped'] == 1
+    assert [(letter['user_id'], letter['problem_id']) for letter in queue.dead_letters] == [(2, 'BAD')]
+
+
+def test_dropped_operations_go_to_the_dead_letter_file(make_queue, tmp_path):
+    dead_letter_path = tmp_path / 'dead-letters.ndjson'
+    journal_dir = tmp_path / 'journal'
+    queue = make_queue(Recorder(failing={'BAD'}), max_retries=1, journal_dir=str(journal_dir),
+                       dead_letter_path=str(dead_letter_path))
+    queue.enqueue([operation(2, 'BAD', message='lost')])
+    assert queue.flush(timeout=5)
+    
+    records = [json.loads(line) for line in dead_letter_path.read_text().splitlines()]
+    assert len(records) == 1
+    assert (records[0]['user_id'], records[0]['problem_id']) == (2, 'BAD')
+    assert records[0]['operations'][0]['chat_history'][0]['parts'] == ['lost']
+    
+    # Recorded dead letters are done: the journal isn't kept for replay
+    queue.shutdown(timeout=5)
+    assert os.listdir(journal_dir) == []
+
+
+def test_orphaned_journal_is_replayed(make_queue, tmp_path):
+    journal_dir = tmp_path / 'journal'
+    journal_dir.mkdir()
+    lines = [{'seq': 0, 'operations': [operation(1, 'P1'), operation(1, 'P2')]}, {'done': [0]}]
+    (journal_dir / '1234-dead.jsonl').write_text(''.join(json.dumps(line) + '\n' for line in lines))
+    
+    recorder = Recorder()
+    queue = make_queue(recorder, journal_dir=str(journal_dir))
+    queue.enqueue([operation(1, 'P3')])
+    assert queue.flush(timeout=5)
+    
+    assert sorted(op['problem_id'] for op in recorder.written()) == ['P2', 'P3']